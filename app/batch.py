@@ -0,0 +1,381 @@
+"""
+Generate decks in bulk from a JSONL manifest.
+
+Each manifest line is an object like
+    {"deck": "chemistry", "prompt": "Noble gases", "count": 5}
+Run it from the repository root:
+    python -m app.batch manifest.jsonl --workers 8
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import sys
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import NamedTuple, Optional
+
+# The app modules import each other by bare name, as when main.py is run from app/
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import flashcard_generator  # noqa: E402
+from deck_storage import open_storage  # noqa: E402
+
+# Latency samples kept for the percentile report, whatever the manifest length
+RESERVOIR_SIZE = 10000
+
+
+class ManifestItem(NamedTuple):
+    line: int
+    deck: str
+    prompt: str
+    count: Optional[int]
+
+
+class ItemResult(NamedTuple):
+    item: ManifestItem
+    cards: list
+    usage: Optional[dict]
+    cached: bool
+    seconds: float
+    error: Optional[Exception]
+
+
+def read_manifest(path):
+    """
+    Stream (line number, parsed item or error) pairs from a JSONL manifest.
+
+    Line numbers start at 1. Blank lines are yielded as None so they can be
+    checkpointed like any other line.
+    """
+    with open(path, encoding="utf-8") as f:
+        for number, line in enumerate(f, start=1):
+            line = line.strip()
+            if not line:
+                yield number, None
+                continue
+            try:
+                entry = json.loads(line)
+                count = entry.get("count")
+                item = ManifestItem(number, str(entry["deck"]), str(entry["prompt"]),
+                                    int(count) if count is not None else None)
+            except (ValueError, KeyError, TypeError, AttributeError) as e:
+                yield number, ValueError(f"line {number}: {e}")
+                continue
+            yield number, item
+
+
+class Checkpoint:
+    """
+    Set of finished manifest lines, stored as a low-water mark plus the few
+    lines finished out of order above it, so its size is bounded by the
+    number of items in flight rather than by the manifest length.
+    """
+
+    def __init__(self, path, manifest):
+        self.path = path
+        self.manifest = os.path.abspath(manifest)
+        self.next_line = 1
+        self.done = set()
+        if os.path.exists(path):
+            with open(path, encoding="utf-8") as f:
+                state = json.load(f)
+            if state.get("manifest") != self.manifest:
+                raise ValueError(f"{path} belongs to {state.get('manifest')}, not {self.manifest}")
+            self.next_line = state["next_line"]
+            self.done = set(state["done"])
+
+    def is_done(self, line):
+        return line < self.next_line or line in self.done
+
+    def mark(self, line):
+        self.done.add(line)
+        while self.next_line in self.done:
+            self.done.remove(self.next_line)
+            self.next_line += 1
+        self.save()
+
+    def save(self):
+        state = {"manifest": self.manifest, "next_line": self.next_line, "done": sorted(self.done)}
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(state, f)
+        os.replace(tmp_path, self.path)
+
+
+class LatencyReservoir:
+    """Uniform sample of latencies (reservoir sampling) for percentile estimates"""
+
+    def __init__(self, size=RESERVOIR_SIZE, seed=0):
+        self.size = size
+        self.count = 0
+        self.samples = []
+        self._random = random.Random(seed)
+
+    def add(self, seconds):
+        self.count += 1
+        if len(self.samples) < self.size:
+            self.samples.append(seconds)
+            return
+        slot = self._random.randrange(self.count)
+        if slot < self.size:
+            self.samples[slot] = seconds
+
+    def percentile(self, p):
+        if not self.samples:
+            return None
+        ordered = sorted(self.samples)
+        return ordered[min(len(ordered) - 1, int(round(p / 100 * (len(ordered) - 1))))]
+
+
+class BatchReport:
+    """Running totals of a batch, reported at the end"""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.completed = 0
+        self.failed = 0
+        self.skipped = 0
+        self.cached = 0
+        self.cards = 0
+        self.prompt_tokens = 0
+        self.completion_tokens = 0
+        self.latency = LatencyReservoir()
+
+    def record(self, result):
+        if result.error is not None:
+            self.failed += 1
+            return
+        self.completed += 1
+        self.cards += len(result.cards)
+        self.cached += result.cached
+        self.latency.add(result.seconds)
+        if result.usage:
+            self.prompt_tokens += result.usage["prompt_tokens"]
+            self.completion_tokens += result.usage["completion_tokens"]
+
+    def summary(self):
+        elapsed = time.perf_counter() - self.started
+        return {
+            "completed": self.completed,
+            "failed": self.failed,
+            "skipped": self.skipped,
+            "cached": self.cached,
+            "cards": self.cards,
+            "elapsed_seconds": round(elapsed, 3),
+            "items_per_second": round(self.completed / elapsed, 3) if elapsed > 0 else None,
+            "latency_p50": self.latency.percentile(50),
+            "latency_p90": self.latency.percentile(90),
+            "latency_p99": self.latency.percentile(99),
+            "prompt_tokens": self.prompt_tokens,
+            "completion_tokens": self.completion_tokens,
+            "total_tokens": self.prompt_tokens + self.completion_tokens,
+        }
+
+
+def format_report(summary):
+    def ms(seconds):
+        return "-" if seconds is None else f"{seconds * 1000:.0f} ms"
+
+    return "\n".join([
+        f"Items: {summary['completed']} done, {summary['failed']} failed, "
+        f"{summary['skipped']} already done ({summary['cached']} from cache)",
+        f"Cards written: {summary['cards']}",
+        f"Throughput: {summary['items_per_second']} items/s over {summary['elapsed_seconds']} s",
+        f"Latency: p50 {ms(summary['latency_p50'])}, p90 {ms(summary['latency_p90'])}, "
+        f"p99 {ms(summary['latency_p99'])}",
+        f"Tokens: {summary['prompt_tokens']} prompt + {summary['completion_tokens']} completion "
+        f"= {summary['total_tokens']}",
+    ])
+
+
+def _generate(item, use_cache, semaphore):
+    start = time.perf_counter()
+    try:
+        if item.count:
+            # Large counts are split into parallel sub-requests, each holding one of the shared slots
+            completion = flashcard_generator.complete_deck(item.prompt, item.count, use_cache=use_cache,
+                                                           semaphore=semaphore)
+        else:
+            with semaphore:
+                completion = flashcard_generator.complete_cards(item.prompt, use_cache=use_cache)
+    except Exception as e:
+        return ItemResult(item, [], None, False, time.perf_counter() - start, e)
+    return ItemResult(item, completion.cards, completion.usage, completion.cached,
+                      time.perf_counter() - start, None)
+
+
+async def _generate_async(item, use_cache, async_client, semaphore):
+    start = time.perf_counter()
+    try:
+        if item.count:
+            completion = await flashcard_generator.complete_deck_async(
+                item.prompt, item.count, use_cache=use_cache, async_client=async_client, semaphore=semaphore)
+        else:
+            async with semaphore:
+                completion = await flashcard_generator.complete_cards_async(
+                    item.prompt, use_cache=use_cache, async_client=async_client)
+    except Exception as e:
+        return ItemResult(item, [], None, False, time.perf_counter() - start, e)
+    return ItemResult(item, completion.cards, completion.usage, completion.cached,
+                      time.perf_counter() - start, None)
+
+
+class _Runner:
+    """Shared bookkeeping of the thread and async modes"""
+
+    def __init__(self, manifest, storage, checkpoint, report, errors_path):
+        self.manifest = manifest
+        self.storage = storage
+        self.checkpoint = checkpoint
+        self.report = report
+        self.errors_path = errors_path
+
+    def pending_items(self):
+        """Yield manifest items still to do, checkpointing blank and malformed lines on the way"""
+        for line, item in read_manifest(self.manifest):
+            if self.checkpoint.is_done(line):
+                if item is not None:
+                    self.report.skipped += 1
+                continue
+            if item is None:
+                self.checkpoint.mark(line)
+            elif isinstance(item, Exception):
+                self.report.failed += 1
+                self._log_error(line, None, item)
+                self.checkpoint.mark(line)
+            else:
+                yield item
+
+    def finish(self, result):
+        """Write one finished item and checkpoint it; runs on a single thread"""
+        if result.error is None and result.cards:
+            try:
+                self.storage.append_cards(result.item.deck, result.cards)
+            except (OSError, ValueError) as e:
+                result = result._replace(error=e)
+        if result.error is not None:
+            self._log_error(result.item.line, result.item, result.error)
+        self.report.record(result)
+        self.checkpoint.mark(result.item.line)
+
+    def _log_error(self, line, item, error):
+        print(f"Line {line} failed: {error}", file=sys.stderr)
+        if self.errors_path is None:
+            return
+        record = {"line": line, "error": str(error)}
+        if item is not None:
+            record.update(deck=item.deck, prompt=item.prompt, count=item.count)
+        with open(self.errors_path, "a", encoding="utf-8") as f:
+            f.write(json.dumps(record) + "\n")
+
+
+def _run_threads(runner, workers, use_cache):
+    # Only a bounded window of items is read ahead, so memory stays flat
+    window = workers * 2
+    # Upstream requests in flight, fan-out sub-requests included, never exceed `workers`
+    semaphore = threading.BoundedSemaphore(workers)
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        in_flight = set()
+        for item in runner.pending_items():
+            if len(in_flight) >= window:
+                done, in_flight = wait(in_flight, return_when=FIRST_COMPLETED)
+                for future in done:
+                    runner.finish(future.result())
+            in_flight.add(pool.submit(_generate, item, use_cache, semaphore))
+        for future in wait(in_flight).done:
+            runner.finish(future.result())
+
+
+async def _run_async(runner, workers, use_cache):
+    async_client = flashcard_generator.get_async_openai_client()
+    semaphore = asyncio.Semaphore(workers)
+    try:
+        in_flight = set()
+        for item in runner.pending_items():
+            if len(in_flight) >= workers:
+                done, in_flight = await asyncio.wait(in_flight, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    runner.finish(task.result())
+            in_flight.add(asyncio.ensure_future(_generate_async(item, use_cache, async_client, semaphore)))
+        if in_flight:
+            done, _ = await asyncio.wait(in_flight)
+            for task in done:
+                runner.finish(task.result())
+    finally:
+        await async_client.close()
+
+
+def run_batch(manifest, storage, workers=4, mode="thread", checkpoint_path=None, errors_path=None,
+              use_cache=True):
+    """
+    Generate every deck in a manifest, resuming from its checkpoint.
+
+    Items are appended to their deck as they finish and checkpointed right
+    after; a run killed between the two can repeat at most the items that
+    were in flight.
+
+    Args:
+        manifest (str): Path of the JSONL manifest
+        storage (DeckStorage): Where the generated cards are written
+        workers (int): Upstream requests in flight at once, counting each sub-request of a large count
+        mode (str): "thread" or "async"
+        checkpoint_path (str, optional): Defaults to the manifest path plus ".checkpoint"
+        errors_path (str, optional): JSONL file collecting failed items for a later re-run
+        use_cache (bool): Set to False to bypass the response cache entirely
+
+    Returns:
+        dict: Throughput, latency percentiles (seconds) and token totals
+    """
+    if mode not in ("thread", "async"):
+        raise ValueError(f"Unknown mode: {mode!r}")
+    checkpoint = Checkpoint(checkpoint_path or f"{manifest}.checkpoint", manifest)
+    report = BatchReport()
+    runner = _Runner(manifest, storage, checkpoint, report, errors_path)
+    if mode == "thread":
+        _run_threads(runner, workers, use_cache)
+    else:
+        asyncio.run(_run_async(runner, workers, use_cache))
+    return report.summary()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Generate flashcard decks from a JSONL manifest")
+    parser.add_argument("manifest", help="JSONL file of {deck, prompt, count} entries")
+    parser.add_argument("--workers", type=int, default=4, help="Concurrent requests")
+    parser.add_argument("--mode", choices=["thread", "async"], default="thread")
+    parser.add_argument("--storage", choices=["sqlite", "csv"], help="Defaults to $FLASHCARD_STORAGE")
+    parser.add_argument("--data-dir", default="data")
+    parser.add_argument("--checkpoint", help="Defaults to MANIFEST.checkpoint")
+    parser.add_argument("--errors", help="Append failed items to this JSONL file")
+    parser.add_argument("--restart", action="store_true", help="Ignore an existing checkpoint")
+    parser.add_argument("--no-cache", action="store_true", help="Bypass the response cache")
+    parser.add_argument("--report", help="Also write the report as JSON to this file")
+    args = parser.parse_args(argv)
+
+    checkpoint_path = args.checkpoint or f"{args.manifest}.checkpoint"
+    if args.restart and os.path.exists(checkpoint_path):
+        os.remove(checkpoint_path)
+
+    storage = open_storage(args.storage, args.data_dir)
+    try:
+        summary = run_batch(args.manifest, storage, workers=args.workers, mode=args.mode,
+                            checkpoint_path=checkpoint_path, errors_path=args.errors,
+                            use_cache=not args.no_cache)
+    except KeyboardInterrupt:
+        print(f"Interrupted; run again to resume from {checkpoint_path}")
+        return 130
+    finally:
+        storage.close()
+
+    print(format_report(summary))
+    if args.report:
+        with open(args.report, "w", encoding="utf-8") as f:
+            json.dump(summary, f, indent=2)
+    return 1 if summary["failed"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,142 @@
+import csv
+import io
+from typing import NamedTuple
+
+
+class Card(NamedTuple):
+    front: str
+    back: str
+
+
+# Header rows the model emits before the cards, compared case-insensitively
+HEADERS = {("front", "back"), ("question", "answer")}
+
+
+class CardStreamParser:
+    """
+    Single-pass parser for flashcards in the CSV dialect the model produces.
+
+    Text can be fed in arbitrary chunks (a whole completion or streamed
+    deltas); feed() returns the cards whose record has ended. Handles
+    RFC-4180 quoting including doubled quotes and quoted cells spanning
+    several lines (multi-line Markdown), a leading header row, Markdown
+    code fences around the CSV, and unquoted commas in the answer.
+    """
+
+    def __init__(self):
+        self._pending = ""  # text after the last newline, not yet a full line
+        self._record = []  # lines of a quoted record that spans several lines
+        self._seen_first_row = False
+
+    def feed(self, text):
+        """
+        Args:
+            text (str): Next chunk of completion text
+
+        Returns:
+            list: Cards completed by this chunk
+        """
+        if not text:
+            return []
+        lines = (self._pending + text).split("\n")
+        self._pending = lines.pop()
+        return self._parse_lines(lines)
+
+    def close(self):
+        """Flush the last record when the text ends without a newline"""
+        cards = self._parse_lines([self._pending])
+        self._pending = ""
+        if self._record:
+            # Unterminated quote: keep what we have rather than dropping the card
+            card = self._parse_record("\n".join(self._record) + '"')
+            self._record = []
+            if card is not None:
+                cards.append(card)
+        return cards
+
+    def _parse_lines(self, lines):
+        cards = []
+        for line in lines:
+            if line.endswith("\r"):
+                line = line[:-1]
+
+            if self._record:
+                # Continuation of a quoted cell; an odd quote count closes it
+                self._record.append(line)
+                if line.count('"') % 2 == 0:
+                    continue
+                record = "\n".join(self._record)
+                self._record = []
+                card = self._parse_record(record)
+            elif '"' not in line or not (line.startswith('"') or ',"' in line):
+                # Fast path for the common unquoted line; quotes inside an
+                # unquoted cell are literal text
+                if not line.strip() or line.lstrip().startswith("```"):
+                    continue
+                front, sep, back = line.partition(",")
+                if not sep:
+                    continue
+                card = self._make_card(front, back)
+            elif line.count('"') % 2:
+                self._record = [line]
+                continue
+            else:
+                card = self._parse_record(line)
+
+            if card is not None:
+                cards.append(card)
+        return cards
+
+    def _parse_record(self, record):
+        row = next(csv.reader([record]), [])
+        if len(row) < 2:
+            return None
+        # An answer with unquoted commas arrives as extra columns
+        back = row[1] if len(row) == 2 else ",".join(row[1:])
+        return self._make_card(row[0], back)
+
+    def _make_card(self, front, back):
+        front = front.strip()
+        back = back.strip()
+        is_first_row = not self._seen_first_row
+        self._seen_first_row = True
+        if is_first_row and (front.lower(), back.lower()) in HEADERS:
+            return None
+        if not front and not back:
+            return None
+        return Card(front, back)
+
+
+def parse_cards(text):
+    """
+    Parse a completion into cards in one pass.
+
+    Args:
+        text (str): CSV formatted flashcards, optionally with header and code fences
+
+    Returns:
+        list: Card records in the order they appear
+    """
+    parser = CardStreamParser()
+    cards = parser.feed(text)
+    cards.extend(parser.close())
+    return cards
+
+
+def cards_to_csv(cards, header=True):
+    """
+    Serialize cards as RFC-4180 CSV with 'front,back' headers.
+
+    Args:
+        cards (iterable): Card records or [front, back] pairs
+        header (bool): Whether to write the header row
+
+    Returns:
+        str: CSV document
+    """
+    buffer = io.StringIO()
+    writer = csv.writer(buffer, lineterminator="\n")
+    if header:
+        writer.writerow(("front", "back"))
+    writer.writerows((card[0], card[1]) for card in cards)
+    return buffer.getvalue()
@@ -0,0 +1,251 @@
+import hashlib
+import html
+import os
+import re
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+import metrics
+
+try:
+    # Ships with Gradio; raw HTML in cards is escaped and unsafe link schemes are refused
+    from markdown_it import MarkdownIt
+except ImportError:
+    MarkdownIt = None
+
+# Rendered card sides kept in memory
+RENDER_CACHE_SIZE = int(os.getenv("FLASHCARD_RENDER_CACHE_SIZE", 4096))
+
+_SAFE_SCHEMES = ("http", "https", "mailto")
+_FENCE = re.compile(r"^\s{0,3}(```+|~~~+)\s*([\w+-]*)")
+_HEADING = re.compile(r"^\s{0,3}(#{1,6})\s+(.*?)\s*#*\s*$")
+_BULLET = re.compile(r"^\s{0,3}[-*+]\s+(.*)")
+_NUMBERED = re.compile(r"^\s{0,3}\d{1,9}[.)]\s+(.*)")
+_TABLE_RULE = re.compile(r"^\s*\|?\s*:?-+:?\s*(\|\s*:?-+:?\s*)*\|?\s*$")
+_CODE_SPAN = re.compile(r"(`+)(.+?)\1", re.S)
+_LINK = re.compile(r"\[([^\]]+)\]\(([^)\s]+)\)")
+_BOLD = re.compile(r"(\*\*|__)(?=\S)(.+?)(?<=\S)\1")
+_ITALIC = re.compile(r"(?<![\w*])([*_])(?=\S)(.+?)(?<=\S)\1(?![\w*])")
+_SCHEME = re.compile(r"^([a-zA-Z][a-zA-Z0-9+.-]*):")
+
+_markdown = None
+
+
+def _safe_url(url):
+    scheme = _SCHEME.match(html.unescape(url).strip())
+    return scheme is None or scheme.group(1).lower() in _SAFE_SCHEMES
+
+
+def _link(match):
+    text, url = match.groups()
+    if not _safe_url(url):
+        return text
+    return f'<a href="{url}" rel="noopener noreferrer" target="_blank">{text}</a>'
+
+
+def _inline(text):
+    """Escape a run of text, then apply code spans, links, bold and italic"""
+    parts = []
+    last = 0
+    for match in _CODE_SPAN.finditer(text):
+        parts.append(_format(text[last:match.start()]))
+        parts.append(f"<code>{html.escape(match.group(2).strip())}</code>")
+        last = match.end()
+    parts.append(_format(text[last:]))
+    return "".join(parts)
+
+
+def _format(text):
+    text = html.escape(text)
+    text = _LINK.sub(_link, text)
+    text = _BOLD.sub(r"<strong>\2</strong>", text)
+    return _ITALIC.sub(r"<em>\2</em>", text)
+
+
+def _cells(line):
+    line = line.strip()
+    if line.startswith("|"):
+        line = line[1:]
+    if line.endswith("|"):
+        line = line[:-1]
+    return [cell.strip() for cell in line.split("|")]
+
+
+def _render_basic(text):
+    """
+    Render the Markdown cards use most (paragraphs, headings, lists, fenced
+    code, tables, code spans, links, bold and italic) when markdown-it is
+    not installed. Everything is escaped before any tag is added, so the
+    output can only contain the tags produced here.
+    """
+    lines = text.replace("\r\n", "\n").split("\n")
+    out = []
+    paragraph = []
+
+    def flush():
+        if paragraph:
+            out.append(f"<p>{'<br>'.join(_inline(line.strip()) for line in paragraph)}</p>")
+            paragraph.clear()
+
+    i = 0
+    while i < len(lines):
+        line = lines[i]
+        fence = _FENCE.match(line)
+        if fence:
+            flush()
+            marker, language = fence.groups()
+            code = []
+            i += 1
+            while i < len(lines) and not lines[i].strip().startswith(marker):
+                code.append(lines[i])
+                i += 1
+            css = f' class="language-{html.escape(language)}"' if language else ""
+            out.append(f"<pre><code{css}>{html.escape(chr(10).join(code))}</code></pre>")
+            i += 1
+            continue
+        heading = _HEADING.match(line)
+        if heading:
+            flush()
+            level = len(heading.group(1))
+            out.append(f"<h{level}>{_inline(heading.group(2))}</h{level}>")
+            i += 1
+            continue
+        if "|" in line and i + 1 < len(lines) and _TABLE_RULE.match(lines[i + 1]):
+            flush()
+            header = "".join(f"<th>{_inline(cell)}</th>" for cell in _cells(line))
+            body = []
+            i += 2
+            while i < len(lines) and "|" in lines[i] and lines[i].strip():
+                body.append("<tr>" + "".join(f"<td>{_inline(cell)}</td>" for cell in _cells(lines[i])) + "</tr>")
+                i += 1
+            out.append(f"<table><thead><tr>{header}</tr></thead><tbody>{''.join(body)}</tbody></table>")
+            continue
+        for pattern, tag in ((_BULLET, "ul"), (_NUMBERED, "ol")):
+            if pattern.match(line):
+                flush()
+                items = []
+                while i < len(lines) and pattern.match(lines[i]):
+                    items.append(f"<li>{_inline(pattern.match(lines[i]).group(1))}</li>")
+                    i += 1
+                out.append(f"<{tag}>{''.join(items)}</{tag}>")
+                break
+        else:
+            if line.strip():
+                paragraph.append(line)
+            else:
+                flush()
+            i += 1
+    flush()
+    return "\n".join(out)
+
+
+def render_markdown(text):
+    """
+    Render one card side from Markdown to HTML that is safe to show as is.
+
+    Raw HTML in the card is escaped rather than passed through, and links
+    are kept only for http, https, mailto and relative URLs.
+    """
+    global _markdown
+    text = str(text)
+    if MarkdownIt is None:
+        return _render_basic(text)
+    if _markdown is None:
+        _markdown = MarkdownIt("commonmark", {"html": False, "breaks": True}).enable("table")
+        _markdown.validateLink = _safe_url
+    return _markdown.render(text)
+
+
+class CardRenderer:
+    """
+    Bounded LRU of rendered card sides, keyed by a hash of the Markdown.
+
+    Cards are immutable text, so a side renders once however many sessions
+    show it, and an edited card simply hashes to a new entry. `prefetch`
+    renders sides on a background thread, so the cards one click away are
+    already cached when Flip, Next or Previous asks for them.
+    """
+
+    def __init__(self, max_entries=RENDER_CACHE_SIZE, render=render_markdown):
+        """
+        Args:
+            max_entries (int): Rendered sides kept in memory
+            render (callable): Markdown text -> HTML
+        """
+        self.max_entries = max_entries
+        self._render = render
+        self._cache = OrderedDict()  # content hash -> html
+        self._pending = set()  # content hashes queued for prefetch
+        self._lock = threading.Lock()
+        self._executor = None
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        return len(self._cache)
+
+    @staticmethod
+    def make_key(text):
+        return hashlib.sha256(str(text).encode("utf-8")).hexdigest()
+
+    def _lookup(self, key):
+        with self._lock:
+            rendered = self._cache.get(key)
+            if rendered is not None:
+                self._cache.move_to_end(key)
+            return rendered
+
+    def _remember(self, key, rendered):
+        with self._lock:
+            self._cache[key] = rendered
+            self._cache.move_to_end(key)
+            while len(self._cache) > self.max_entries:
+                self._cache.popitem(last=False)
+
+    def render(self, text):
+        """Return the HTML of a card side, rendering it only if it is not cached"""
+        key = self.make_key(text)
+        rendered = self._lookup(key)
+        if rendered is not None:
+            self.hits += 1
+            metrics.RENDER_CACHE.inc(result="hit")
+            return rendered
+        self.misses += 1
+        metrics.RENDER_CACHE.inc(result="miss")
+        rendered = self._render(text)
+        self._remember(key, rendered)
+        return rendered
+
+    def prefetch(self, texts):
+        """Render card sides in the background unless they are cached or already queued"""
+        with self._lock:
+            todo = []
+            for text in texts:
+                key = self.make_key(text)
+                if key not in self._cache and key not in self._pending:
+                    self._pending.add(key)
+                    todo.append((key, text))
+            if not todo:
+                return
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="card-render")
+            executor = self._executor
+        for key, text in todo:
+            executor.submit(self._prefetch_one, key, text)
+
+    def _prefetch_one(self, key, text):
+        try:
+            self._remember(key, self._render(text))
+            metrics.RENDER_CACHE.inc(result="prefetch")
+        finally:
+            with self._lock:
+                self._pending.discard(key)
+
+    def wait(self):
+        """Block until every queued prefetch has finished; used by tests and benchmarks"""
+        with self._lock:
+            executor = self._executor
+            self._executor = None
+        if executor is not None:
+            executor.shutdown(wait=True)
@@ -0,0 +1,191 @@
+import threading
+from collections import OrderedDict
+from typing import NamedTuple
+
+from card_parser import Card
+from deck_storage import CsvDeckStorage
+
+# Rough per-card overhead of the decoded tuple and two str objects, in bytes
+CARD_OVERHEAD = 200
+
+
+class DeckChanges(NamedTuple):
+    added: list
+    changed: list
+    removed: list
+
+    def __bool__(self):
+        return bool(self.added or self.changed or self.removed)
+
+
+def deck_nbytes(cards):
+    """Estimate the memory held by a decoded deck"""
+    return sum(len(card.front) + len(card.back) for card in cards) + CARD_OVERHEAD * len(cards)
+
+
+class DeckCatalog:
+    """
+    Lazily loaded view of the decks in a storage backend.
+
+    Listing decks only reads each deck's change token (file mtime and size,
+    or a revision number in SQLite). A deck is decoded the first time it is
+    requested and kept in an LRU bounded by an estimate of its decoded size;
+    an entry is re-read when its token changes.
+    """
+
+    def __init__(self, storage=None, max_bytes=64 * 1024 * 1024):
+        """
+        Args:
+            storage (DeckStorage, optional): Where decks live; defaults to CSV files in data/
+            max_bytes (int): Memory budget for decoded decks
+        """
+        self.storage = storage if storage is not None else CsvDeckStorage("data")
+        self.max_bytes = max_bytes
+        self._tokens = {}
+        self._decoded = OrderedDict()  # name -> (token, cards, ids, nbytes)
+        self._decoded_bytes = 0
+        self._counts = {}  # name -> (token, count)
+        self._lock = threading.RLock()
+        # Bumped on every change so the UI can tell when its deck list is stale
+        self.version = 0
+        self.refresh()
+
+    def refresh(self):
+        """
+        Re-list the storage, keeping decoded decks whose token is unchanged.
+
+        Nothing is decoded here.
+
+        Returns:
+            DeckChanges: Names of the decks added, changed and removed since the last scan
+        """
+        tokens = self.storage.scan()
+        with self._lock:
+            previous = self._tokens
+            added = [name for name in tokens if name not in previous]
+            removed = [name for name in previous if name not in tokens]
+            changed = [
+                name for name, token in tokens.items()
+                if name in previous and previous[name] != token
+            ]
+            self._tokens = tokens
+            for name in removed + changed:
+                self._drop(name)
+                self._counts.pop(name, None)
+            changes = DeckChanges(sorted(added), sorted(changed), sorted(removed))
+            if changes:
+                self.version += 1
+            return changes
+
+    def names(self):
+        with self._lock:
+            return sorted(self._tokens)
+
+    def __contains__(self, name):
+        with self._lock:
+            return name in self._tokens
+
+    def __len__(self):
+        with self._lock:
+            return len(self._tokens)
+
+    def token(self, name):
+        """Change token of a deck as of the last refresh, or None if it does not exist"""
+        with self._lock:
+            return self._tokens.get(name)
+
+    def card_count(self, name):
+        """Number of cards in a deck, computed without keeping the deck in memory"""
+        with self._lock:
+            token = self._tokens.get(name)
+            if token is None:
+                return 0
+            decoded = self._decoded.get(name)
+            if decoded is not None and decoded[0] == token:
+                return len(decoded[1])
+            cached = self._counts.get(name)
+            if cached is not None and cached[0] == token:
+                return cached[1]
+        count = self.storage.card_count(name)
+        with self._lock:
+            self._counts[name] = (token, count)
+        return count
+
+    def _load(self, name):
+        with self._lock:
+            token = self._tokens.get(name)
+            if token is None:
+                return None
+            decoded = self._decoded.get(name)
+            if decoded is not None and decoded[0] == token:
+                self._decoded.move_to_end(name)
+                return decoded
+
+        stored = self.storage.load_deck(name)
+        if stored is None:
+            return None
+        cards = tuple(Card(card.front, card.back) for card in stored)
+        ids = tuple(card.id for card in stored)
+
+        nbytes = deck_nbytes(cards)
+        entry = (token, cards, ids, nbytes)
+        with self._lock:
+            self._drop(name)
+            self._decoded[name] = entry
+            self._decoded_bytes += nbytes
+            # Always keep the deck just requested, even if it alone exceeds the budget
+            while self._decoded_bytes > self.max_bytes and len(self._decoded) > 1:
+                oldest = next(iter(self._decoded))
+                self._drop(oldest)
+        return entry
+
+    def get(self, name):
+        """
+        Return the decoded cards of a deck, reading storage on a cache miss.
+
+        Returns:
+            tuple: Card records, or None if the deck does not exist or is not a deck file
+        """
+        entry = self._load(name)
+        return entry[1] if entry is not None else None
+
+    def get_ids(self, name):
+        """Return the storage ids of a deck's cards, aligned with get(name)"""
+        entry = self._load(name)
+        return entry[2] if entry is not None else None
+
+    def invalidate(self, name):
+        """
+        Re-read a single deck's token after it was written, created or deleted.
+
+        Returns:
+            DeckChanges: What happened to this deck; a deck that still exists is always reported as changed
+        """
+        token = self.storage.deck_token(name)
+        with self._lock:
+            existed = name in self._tokens
+            self._drop(name)
+            self._counts.pop(name, None)
+            if token is None:
+                if not existed:
+                    return DeckChanges([], [], [])
+                del self._tokens[name]
+                changes = DeckChanges([], [], [name])
+            else:
+                self._tokens[name] = token
+                if existed:
+                    # Our own writes always count as a change, even within one mtime tick
+                    changes = DeckChanges([], [name], [])
+                else:
+                    changes = DeckChanges([name], [], [])
+            self.version += 1
+            return changes
+
+    def decoded_bytes(self):
+        with self._lock:
+            return self._decoded_bytes
+
+    def _drop(self, name):
+        entry = self._decoded.pop(name, None)
+        if entry is not None:
+            self._decoded_bytes -= entry[3]
@@ -0,0 +1,520 @@
+"""
+Deck storage backends.
+
+Every backend stores decks as ordered cards with a stable id per card and
+supports appending and patching individual cards, so a save only writes
+what changed. SQLite (WAL mode) is the default; the CSV backend keeps the
+original one-file-per-deck layout in data/.
+
+Convert between the two layouts with:
+
+    python app/deck_storage.py import data/ data/decks.sqlite
+    python app/deck_storage.py export data/decks.sqlite exported/
+"""
+import argparse
+import csv
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+from typing import NamedTuple
+
+from card_parser import cards_to_csv
+
+
+class StoredCard(NamedTuple):
+    id: int
+    front: str
+    back: str
+
+
+def _check_deck_name(name):
+    if not name or name != os.path.basename(name) or name.startswith("."):
+        raise ValueError(f"Invalid deck name: {name!r}")
+
+
+class DeckStorage:
+    """Interface shared by the storage backends"""
+
+    # Whether a card keeps its id when other cards are deleted
+    stable_ids = True
+
+    def scan(self):
+        """
+        Returns:
+            dict: Deck name -> token that changes whenever the deck is written
+        """
+        raise NotImplementedError
+
+    def deck_token(self, name):
+        """Current change token of one deck, or None if it does not exist"""
+        raise NotImplementedError
+
+    def card_count(self, name):
+        raise NotImplementedError
+
+    def load_deck(self, name):
+        """
+        Returns:
+            list: StoredCard records in deck order, or None if there is no such deck
+        """
+        raise NotImplementedError
+
+    def create_deck(self, name):
+        raise NotImplementedError
+
+    def delete_deck(self, name):
+        raise NotImplementedError
+
+    def apply_changes(self, name, appended=(), updated=None, deleted=()):
+        """
+        Atomically patch a deck, creating it if needed.
+
+        Args:
+            name (str): Deck name
+            appended (iterable): (front, back) pairs added at the end of the deck
+            updated (dict, optional): Card id -> new (front, back)
+            deleted (iterable): Ids of the cards to remove
+
+        Returns:
+            list: Ids assigned to the appended cards
+        """
+        raise NotImplementedError
+
+    def append_cards(self, name, cards):
+        return self.apply_changes(name, appended=cards)
+
+    def update_cards(self, name, updates):
+        self.apply_changes(name, updated=updates)
+
+    def delete_cards(self, name, ids):
+        self.apply_changes(name, deleted=ids)
+
+    def replace_deck(self, name, cards):
+        """Replace every card of a deck in one transaction"""
+        current = self.load_deck(name) or []
+        return self.apply_changes(name, appended=cards, deleted=[card.id for card in current])
+
+    def close(self):
+        pass
+
+
+class CsvDeckStorage(DeckStorage):
+    """
+    One CSV file per deck with 'front,back' headers.
+
+    Card ids are row positions. Appends write only the new rows; updates and
+    deletes rewrite the file through a temporary file and an atomic rename.
+    Writes are serialized within the process.
+    """
+
+    # Ids are row positions, so deleting a card renumbers the ones after it
+    stable_ids = False
+
+    def __init__(self, data_dir="data"):
+        self.data_dir = str(data_dir)
+        self._lock = threading.Lock()
+
+    def path(self, name):
+        return os.path.join(self.data_dir, f"{name}.csv")
+
+    def scan(self):
+        tokens = {}
+        try:
+            entries = list(os.scandir(self.data_dir))
+        except FileNotFoundError:
+            return tokens
+        for entry in entries:
+            if entry.name.endswith(".csv") and entry.is_file():
+                stat = entry.stat()
+                tokens[entry.name[:-len(".csv")]] = (stat.st_mtime_ns, stat.st_size)
+        return tokens
+
+    def deck_token(self, name):
+        try:
+            stat = os.stat(self.path(name))
+        except FileNotFoundError:
+            return None
+        return (stat.st_mtime_ns, stat.st_size)
+
+    def card_count(self, name):
+        """Count the cards in a deck file without decoding it; agrees with len(load_deck(name))"""
+        try:
+            with open(self.path(name), "rb") as f:
+                data = f.read()
+        except FileNotFoundError:
+            return 0
+        if b'"' in data:
+            # Quoted cells may contain newlines, so fall back to a real parse
+            cards = self.load_deck(name)
+            return len(cards) if cards is not None else 0
+        lines = data.splitlines()
+        if not lines:
+            return 0
+        header = lines[0].decode("utf-8").split(",")
+        try:
+            width = max(header.index("front"), header.index("back")) + 1
+        except ValueError:
+            return 0
+        # Skip the same blank and short rows load_deck skips, so appended ids match its positions
+        return sum(1 for line in lines[1:] if line.count(b",") >= width - 1)
+
+    def load_deck(self, name):
+        try:
+            f = open(self.path(name), newline="", encoding="utf-8")
+        except FileNotFoundError:
+            return None
+        with f:
+            reader = csv.reader(f)
+            header = next(reader, None)
+            if header is None:
+                return None
+            try:
+                front_col = header.index("front")
+                back_col = header.index("back")
+            except ValueError:
+                return None
+            width = max(front_col, back_col) + 1
+            rows = [row for row in reader if len(row) >= width]
+        return [StoredCard(i, row[front_col], row[back_col]) for i, row in enumerate(rows)]
+
+    def _write(self, name, cards):
+        os.makedirs(self.data_dir, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(prefix=f".{name}.", suffix=".tmp", dir=self.data_dir)
+        try:
+            with os.fdopen(fd, "w", newline="", encoding="utf-8") as f:
+                f.write(cards_to_csv(cards))
+            os.replace(tmp_path, self.path(name))
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
+
+    def create_deck(self, name):
+        _check_deck_name(name)
+        with self._lock:
+            if not os.path.exists(self.path(name)):
+                self._write(name, [])
+
+    def delete_deck(self, name):
+        _check_deck_name(name)
+        with self._lock:
+            try:
+                os.remove(self.path(name))
+            except FileNotFoundError:
+                pass
+
+    def apply_changes(self, name, appended=(), updated=None, deleted=()):
+        _check_deck_name(name)
+        appended = [(front, back) for front, back in appended]
+        deleted = set(deleted)
+        with self._lock:
+            if not os.path.exists(self.path(name)):
+                self._write(name, appended)
+                return list(range(len(appended)))
+
+            if not updated and not deleted:
+                # Pure append: write only the new rows
+                first_new_id = self.card_count(name)
+                if appended:
+                    with open(self.path(name), "rb") as f:
+                        f.seek(0, os.SEEK_END)
+                        ends_with_newline = True
+                        if f.tell() > 0:
+                            f.seek(-1, os.SEEK_END)
+                            ends_with_newline = f.read(1) == b"\n"
+                    with open(self.path(name), "a", newline="", encoding="utf-8") as f:
+                        if not ends_with_newline:
+                            f.write("\n")
+                        f.write(cards_to_csv(appended, header=False))
+                return list(range(first_new_id, first_new_id + len(appended)))
+
+            current = self.load_deck(name) or []
+            updated = updated or {}
+            cards = [
+                updated.get(card.id, (card.front, card.back))
+                for card in current
+                if card.id not in deleted
+            ]
+            first_new_id = len(cards)
+            self._write(name, cards + appended)
+            return list(range(first_new_id, first_new_id + len(appended)))
+
+
+class SqliteDeckStorage(DeckStorage):
+    """
+    All decks in one SQLite database, one row per card.
+
+    Runs in WAL mode so readers never block the writer, and every change is a
+    single IMMEDIATE transaction, so concurrent saves from several tabs are
+    applied one after the other instead of overwriting each other. Each deck
+    carries a revision number taken from one counter for the whole database
+    on every write, so a revision never names two versions of a deck, even
+    when a deck is deleted and created again.
+    """
+
+    def __init__(self, path=os.path.join("data", "decks.sqlite")):
+        self.path = str(path)
+        self._local = threading.local()
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        conn = self._conn()
+        with conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS decks ("
+                " name TEXT PRIMARY KEY,"
+                " revision INTEGER NOT NULL DEFAULT 0,"
+                " card_count INTEGER NOT NULL DEFAULT 0,"
+                " updated_at REAL NOT NULL)"
+            )
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS cards ("
+                " id INTEGER PRIMARY KEY AUTOINCREMENT,"
+                " deck TEXT NOT NULL REFERENCES decks (name) ON DELETE CASCADE,"
+                " position INTEGER NOT NULL,"
+                " front TEXT NOT NULL,"
+                " back TEXT NOT NULL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS cards_deck_position ON cards (deck, position)")
+            conn.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value INTEGER NOT NULL)")
+            # Databases from before the counter start it past every revision in use
+            conn.execute(
+                "INSERT OR IGNORE INTO meta (key, value)"
+                " SELECT 'revision', COALESCE(MAX(revision), 0) FROM decks"
+            )
+
+    def _conn(self):
+        # sqlite3 connections are not shareable across threads, so keep one per thread
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute("PRAGMA foreign_keys=ON")
+            self._local.conn = conn
+        return conn
+
+    def scan(self):
+        return dict(self._conn().execute("SELECT name, revision FROM decks"))
+
+    def deck_token(self, name):
+        row = self._conn().execute("SELECT revision FROM decks WHERE name = ?", (name,)).fetchone()
+        return row[0] if row else None
+
+    def card_count(self, name):
+        row = self._conn().execute("SELECT card_count FROM decks WHERE name = ?", (name,)).fetchone()
+        return row[0] if row else 0
+
+    def load_deck(self, name):
+        conn = self._conn()
+        # One read transaction so the deck row and its cards agree
+        conn.execute("BEGIN")
+        try:
+            if conn.execute("SELECT 1 FROM decks WHERE name = ?", (name,)).fetchone() is None:
+                return None
+            rows = conn.execute(
+                "SELECT id, front, back FROM cards WHERE deck = ? ORDER BY position, id", (name,)
+            ).fetchall()
+        finally:
+            conn.execute("COMMIT")
+        return [StoredCard(*row) for row in rows]
+
+    def _ensure_deck(self, conn, name):
+        conn.execute(
+            "INSERT OR IGNORE INTO decks (name, revision, card_count, updated_at) VALUES (?, 0, 0, ?)",
+            (name, time.time()),
+        )
+
+    def _touch(self, conn, name, count_delta=0):
+        conn.execute("UPDATE meta SET value = value + 1 WHERE key = 'revision'")
+        conn.execute(
+            "UPDATE decks SET revision = (SELECT value FROM meta WHERE key = 'revision'), updated_at = ?,"
+            " card_count = card_count + ? WHERE name = ?",
+            (time.time(), count_delta, name),
+        )
+
+    def create_deck(self, name):
+        _check_deck_name(name)
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            self._ensure_deck(conn, name)
+            self._touch(conn, name)
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+
+    def delete_deck(self, name):
+        _check_deck_name(name)
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.execute("DELETE FROM cards WHERE deck = ?", (name,))
+            conn.execute("DELETE FROM decks WHERE name = ?", (name,))
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+
+    def apply_changes(self, name, appended=(), updated=None, deleted=()):
+        _check_deck_name(name)
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            self._ensure_deck(conn, name)
+            count_delta = 0
+            if deleted:
+                cursor = conn.executemany(
+                    "DELETE FROM cards WHERE deck = ? AND id = ?", ((name, card_id) for card_id in deleted)
+                )
+                count_delta -= cursor.rowcount
+            if updated:
+                conn.executemany(
+                    "UPDATE cards SET front = ?, back = ? WHERE deck = ? AND id = ?",
+                    ((front, back, name, card_id) for card_id, (front, back) in updated.items()),
+                )
+            ids = []
+            if appended:
+                position = conn.execute(
+                    "SELECT COALESCE(MAX(position), -1) FROM cards WHERE deck = ?", (name,)
+                ).fetchone()[0]
+                for front, back in appended:
+                    position += 1
+                    cursor = conn.execute(
+                        "INSERT INTO cards (deck, position, front, back) VALUES (?, ?, ?, ?)",
+                        (name, position, front, back),
+                    )
+                    ids.append(cursor.lastrowid)
+                count_delta += len(ids)
+            self._touch(conn, name, count_delta)
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        return ids
+
+    def close(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is not None:
+            conn.close()
+            self._local.conn = None
+
+
+def diff_rows(ids, cards, rows):
+    """
+    Work out the patch that turns a window of a stored deck into edited rows keyed by card id.
+
+    Only the cards in the window are compared, so the patch size depends on
+    the edit rather than on the size of the deck.
+
+    Args:
+        ids (sequence): Storage ids of the cards in the window
+        cards (sequence): Their (front, back) pairs as they were shown, aligned with ids
+        rows (sequence): Edited (id, front, back) rows; an id that is not one of `ids` (e.g. None) marks a new card
+
+    Returns:
+        tuple: (appended, updated, deleted) ready for DeckStorage.apply_changes
+    """
+    shown = {card_id: (card[0], card[1]) for card_id, card in zip(ids, cards)}
+    kept = set()
+    appended, updated = [], {}
+    for card_id, front, back in rows:
+        if card_id in shown and card_id not in kept:
+            kept.add(card_id)
+            if shown[card_id] != (front, back):
+                updated[card_id] = (front, back)
+        else:
+            # New rows, and copies of a row pasted with its id, become new cards
+            appended.append((front, back))
+    deleted = [card_id for card_id in ids if card_id not in kept]
+    return appended, updated, deleted
+
+
+def import_csv_dir(storage, data_dir):
+    """
+    Copy every deck from a directory of CSV files into a storage backend.
+
+    Returns:
+        list: Names of the imported decks
+    """
+    source = CsvDeckStorage(data_dir)
+    imported = []
+    for name in sorted(source.scan()):
+        cards = source.load_deck(name)
+        if cards is None:
+            continue
+        storage.replace_deck(name, [(card.front, card.back) for card in cards])
+        imported.append(name)
+    return imported
+
+
+def export_csv_dir(storage, data_dir):
+    """
+    Write every deck of a storage backend out as CSV files.
+
+    Returns:
+        list: Names of the exported decks
+    """
+    target = CsvDeckStorage(data_dir)
+    exported = []
+    for name in sorted(storage.scan()):
+        cards = storage.load_deck(name)
+        if cards is None:
+            continue
+        target.replace_deck(name, [(card.front, card.back) for card in cards])
+        exported.append(name)
+    return exported
+
+
+def open_storage(kind=None, data_dir="data"):
+    """
+    Open the configured deck storage.
+
+    Args:
+        kind (str, optional): "sqlite" or "csv"; defaults to $FLASHCARD_STORAGE, then "sqlite"
+        data_dir (str): Directory holding the decks
+
+    Returns:
+        DeckStorage: The opened backend
+    """
+    kind = kind or os.getenv("FLASHCARD_STORAGE", "sqlite")
+    if kind == "csv":
+        return CsvDeckStorage(data_dir)
+    if kind != "sqlite":
+        raise ValueError(f"Unknown deck storage: {kind!r}")
+
+    path = os.path.join(data_dir, "decks.sqlite")
+    is_new = not os.path.exists(path)
+    storage = SqliteDeckStorage(path)
+    if is_new:
+        # First start on SQLite: bring the existing CSV decks along
+        imported = import_csv_dir(storage, data_dir)
+        if imported:
+            print(f"Imported {len(imported)} CSV decks into {path}")
+    return storage
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Convert decks between CSV files and SQLite")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    import_parser = subparsers.add_parser("import", help="Import a directory of CSV decks into SQLite")
+    import_parser.add_argument("csv_dir")
+    import_parser.add_argument("database")
+    export_parser = subparsers.add_parser("export", help="Export SQLite decks to a directory of CSV files")
+    export_parser.add_argument("database")
+    export_parser.add_argument("csv_dir")
+    args = parser.parse_args()
+
+    storage = SqliteDeckStorage(args.database)
+    if args.command == "import":
+        names = import_csv_dir(storage, args.csv_dir)
+    else:
+        names = export_csv_dir(storage, args.csv_dir)
+    storage.close()
+    print(f"{args.command}ed {len(names)} decks")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,108 @@
+import os
+import threading
+
+try:
+    # watchdog uses inotify on Linux (and FSEvents/ReadDirectoryChangesW elsewhere)
+    from watchdog.events import FileSystemEventHandler
+    from watchdog.observers import Observer
+except ImportError:
+    FileSystemEventHandler = object
+    Observer = None
+
+
+class _DeckEventHandler(FileSystemEventHandler):
+    def __init__(self, watcher):
+        self.watcher = watcher
+
+    def on_any_event(self, event):
+        paths = [getattr(event, "src_path", None), getattr(event, "dest_path", None)]
+        for path in paths:
+            if path and str(path).endswith(".csv"):
+                self.watcher.file_changed(os.fsdecode(path))
+
+
+class DeckWatcher:
+    """
+    Keeps a DeckCatalog in sync with its data directory in the background.
+
+    For CSV storage it uses filesystem notifications when watchdog is
+    installed, so only the deck file named in an event is re-read. Otherwise
+    it polls the storage's change tokens (file stats, or deck revisions in
+    SQLite) every `interval` seconds and drops only the decks whose token
+    moved. Either way nothing is decoded until it is next requested from the
+    catalog.
+    """
+
+    def __init__(self, catalog, interval=2.0, use_notifications=True):
+        """
+        Args:
+            catalog (DeckCatalog): Catalog to keep up to date
+            interval (float): Seconds between polls when notifications are unavailable
+            use_notifications (bool): Set to False to force polling
+        """
+        self.catalog = catalog
+        self.interval = interval
+        # Only CSV storage has one file per deck to watch
+        self.data_dir = getattr(catalog.storage, "data_dir", None)
+        self.use_notifications = use_notifications and Observer is not None and self.data_dir is not None
+        self._listeners = []
+        self._stop = threading.Event()
+        self._thread = None
+        self._observer = None
+
+    def subscribe(self, listener):
+        """Call `listener(changes)` whenever decks are added, changed or removed"""
+        self._listeners.append(listener)
+
+    def _notify(self, changes):
+        if not changes:
+            return
+        for listener in self._listeners:
+            try:
+                listener(changes)
+            except Exception as e:
+                print(f"Deck watcher listener failed: {e}")
+
+    def poll(self):
+        """Re-stat the data directory once and report what changed"""
+        changes = self.catalog.refresh()
+        self._notify(changes)
+        return changes
+
+    def file_changed(self, path):
+        """Handle a notification for one deck file"""
+        if self.data_dir is None or os.path.dirname(os.path.abspath(path)) != os.path.abspath(self.data_dir):
+            return
+        name = os.path.basename(path)[:-len(".csv")]
+        self._notify(self.catalog.invalidate(name))
+
+    def start(self):
+        """Start watching in the background; safe to call more than once"""
+        if self._thread is not None or self._observer is not None:
+            return self
+        if self.use_notifications and os.path.isdir(self.data_dir):
+            self._observer = Observer()
+            self._observer.schedule(_DeckEventHandler(self), self.data_dir, recursive=False)
+            self._observer.daemon = True
+            self._observer.start()
+        else:
+            self._thread = threading.Thread(target=self._run, name="deck-watcher", daemon=True)
+            self._thread.start()
+        return self
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            try:
+                self.poll()
+            except Exception as e:
+                print(f"Deck watcher poll failed: {e}")
+
+    def stop(self):
+        self._stop.set()
+        if self._observer is not None:
+            self._observer.stop()
+            self._observer.join()
+            self._observer = None
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
@@ -0,0 +1,225 @@
+import re
+import threading
+from typing import NamedTuple
+
+import numpy as np
+
+# Multiply-shift hashing: (a * x + b) wraps around in uint64 and the top 32
+# bits are the hash, which avoids a slow 64-bit modulo per shingle
+_SHIFT = np.uint64(32)
+_MAX_HASH = np.uint32((1 << 32) - 1)
+_PUNCTUATION = re.compile(r"[^\w\s]")
+_SPACES = re.compile(r"\s+")
+
+# Shingles hashed per NumPy batch when building signatures in bulk; the
+# (num_perm x shingles) uint64 scratch matrix is 4 MB at the default 64 permutations
+BATCH_SHINGLES = 8192
+
+
+class Duplicate(NamedTuple):
+    card: tuple
+    match: object  # key of the indexed card, or the position of an earlier incoming card
+    similarity: float
+
+
+class DedupResult(NamedTuple):
+    accepted: list
+    duplicates: list
+
+
+def card_text(card):
+    """Text a card is compared on: both sides, so a reworded question with the same answer still matches"""
+    return f"{card[0]} {card[1]}"
+
+
+def normalize(text):
+    return _SPACES.sub(" ", _PUNCTUATION.sub(" ", str(text).lower())).strip()
+
+
+def shingle_hashes(texts):
+    """
+    Pack the 4-byte shingles of many normalized texts into uint32 values.
+
+    Returns:
+        tuple: (flat array of shingles for all texts, number of shingles per text)
+    """
+    encoded = []
+    for text in texts:
+        data = normalize(text).encode("utf-8")
+        if data and len(data) < 4:
+            data = data.ljust(4)
+        encoded.append(data)
+    lengths = np.array([max(len(data) - 3, 0) for data in encoded], dtype=np.int64)
+    if not lengths.sum():
+        return np.empty(0, dtype=np.uint64), lengths
+
+    buffer = np.frombuffer(b"".join(encoded), dtype=np.uint8).astype(np.uint64)
+    windows = (buffer[:-3] << 24) | (buffer[1:-2] << 16) | (buffer[2:-1] << 8) | buffer[3:]
+    # Keep only windows that start and end inside the same text
+    starts = np.concatenate(([0], np.cumsum([len(data) for data in encoded])[:-1]))
+    window_starts = np.concatenate(([0], np.cumsum(lengths)[:-1]))
+    positions = np.arange(lengths.sum()) + np.repeat(starts - window_starts, lengths)
+    return windows[positions], lengths
+
+
+class DedupIndex:
+    """
+    Near-duplicate index over flashcards using MinHash and LSH banding.
+
+    Each card is reduced to a MinHash signature of its character shingles;
+    signatures are split into bands and bucketed, so a lookup only compares
+    the few cards sharing a bucket instead of the whole deck. Similarity is
+    the estimated Jaccard similarity of the shingle sets.
+    """
+
+    def __init__(self, num_perm=64, bands=16, threshold=0.7, seed=1):
+        """
+        Args:
+            num_perm (int): MinHash signature length
+            bands (int): LSH bands; must divide num_perm
+            threshold (float): Default similarity above which a card counts as a duplicate
+            seed (int): Seed for the hash permutations, fixed so indexes are reproducible
+        """
+        if num_perm % bands:
+            raise ValueError("bands must divide num_perm")
+        rng = np.random.default_rng(seed)
+        self._a = rng.integers(0, 1 << 63, size=num_perm, dtype=np.uint64) * np.uint64(2) + np.uint64(1)
+        self._b = rng.integers(0, 1 << 63, size=num_perm, dtype=np.uint64)
+        self.num_perm = num_perm
+        self.bands = bands
+        self.rows = num_perm // bands
+        self.threshold = threshold
+        self._signatures = {}
+        self._buckets = [dict() for _ in range(bands)]
+        self._lock = threading.RLock()
+
+    def __len__(self):
+        return len(self._signatures)
+
+    def __contains__(self, key):
+        return key in self._signatures
+
+    def signatures(self, texts):
+        """
+        Compute MinHash signatures for many texts at once.
+
+        Returns:
+            np.ndarray: uint32 array of shape (len(texts), num_perm)
+        """
+        texts = list(texts)
+        # Permuted hashes are 32-bit, so signatures are stored as uint32.
+        # Texts without shingles keep the all-max signature (see _is_empty)
+        result = np.full((len(texts), self.num_perm), _MAX_HASH, dtype=np.uint32)
+        flat, lengths = shingle_hashes(texts)
+        ends = np.cumsum(lengths)
+        starts = ends - lengths
+        # Hash the shingles in fixed-size slices, whatever the length of each text;
+        # a text spanning several slices takes the minimum over all of them
+        for low in range(0, len(flat), BATCH_SHINGLES):
+            high = min(low + BATCH_SHINGLES, len(flat))
+            in_slice = np.arange(np.searchsorted(ends, low, side="right"), np.searchsorted(starts, high))
+            in_slice = in_slice[lengths[in_slice] > 0]
+            # (num_perm, slice shingles) permuted hashes, reduced per text
+            permuted = (self._a[:, None] * flat[None, low:high] + self._b[:, None]) >> _SHIFT
+            offsets = np.maximum(starts[in_slice], low) - low
+            minimums = np.minimum.reduceat(permuted, offsets, axis=1).T.astype(np.uint32)
+            result[in_slice] = np.minimum(result[in_slice], minimums)
+        return result
+
+    @staticmethod
+    def _is_empty(signature):
+        # Empty or punctuation-only text has no shingles; such cards are never indexed or matched
+        return bool((signature == _MAX_HASH).all())
+
+    def _band_keys(self, signature):
+        return [signature[i * self.rows:(i + 1) * self.rows].tobytes() for i in range(self.bands)]
+
+    def add(self, key, card):
+        """Index one card under `key`, replacing any previous card with that key"""
+        self.add_many([(key, card)])
+
+    def add_many(self, items):
+        """Index many (key, card) pairs, hashing them in vectorized batches"""
+        items = list(items)
+        if not items:
+            return
+        signatures = self.signatures(card_text(card) for _, card in items)
+        with self._lock:
+            for (key, _), signature in zip(items, signatures):
+                self._remove(key)
+                if self._is_empty(signature):
+                    continue
+                self._signatures[key] = signature
+                for band, band_key in zip(self._buckets, self._band_keys(signature)):
+                    band.setdefault(band_key, set()).add(key)
+
+    def remove(self, key):
+        with self._lock:
+            self._remove(key)
+
+    def _remove(self, key):
+        signature = self._signatures.pop(key, None)
+        if signature is None:
+            return
+        for band, band_key in zip(self._buckets, self._band_keys(signature)):
+            bucket = band.get(band_key)
+            if bucket is not None:
+                bucket.discard(key)
+                if not bucket:
+                    del band[band_key]
+
+    def _query_signature(self, signature, threshold):
+        if self._is_empty(signature):
+            return []
+        with self._lock:
+            candidates = set()
+            for band, band_key in zip(self._buckets, self._band_keys(signature)):
+                candidates.update(band.get(band_key, ()))
+            if not candidates:
+                return []
+            keys = list(candidates)
+            stacked = np.stack([self._signatures[key] for key in keys])
+        similarities = (stacked == signature).mean(axis=1)
+        matches = [(key, float(sim)) for key, sim in zip(keys, similarities) if sim >= threshold]
+        return sorted(matches, key=lambda match: -match[1])
+
+    def query(self, card, threshold=None):
+        """
+        Find indexed cards similar to `card`.
+
+        Returns:
+            list: (key, similarity) pairs at or above the threshold, most similar first
+        """
+        threshold = self.threshold if threshold is None else threshold
+        return self._query_signature(self.signatures([card_text(card)])[0], threshold)
+
+    def check(self, cards, threshold=None):
+        """
+        Split incoming cards into new ones and near-duplicates.
+
+        Cards are compared against the index and against the incoming cards
+        accepted before them; the index itself is not modified.
+
+        Returns:
+            DedupResult: Accepted cards and Duplicate records for the rest
+        """
+        threshold = self.threshold if threshold is None else threshold
+        cards = list(cards)
+        signatures = self.signatures(card_text(card) for card in cards)
+        accepted, duplicates = [], []
+        accepted_signatures = []
+        for position, (card, signature) in enumerate(zip(cards, signatures)):
+            matches = self._query_signature(signature, threshold)
+            if matches:
+                duplicates.append(Duplicate(card, matches[0][0], matches[0][1]))
+                continue
+            if accepted_signatures:
+                similarities = (np.stack([s for _, s in accepted_signatures]) == signature).mean(axis=1)
+                best = int(similarities.argmax())
+                if similarities[best] >= threshold:
+                    duplicates.append(Duplicate(card, accepted_signatures[best][0], float(similarities[best])))
+                    continue
+            accepted.append(card)
+            if not self._is_empty(signature):
+                accepted_signatures.append((position, signature))
+        return DedupResult(accepted, duplicates)
@@ -0,0 +1,542 @@
+import os
+import sys
+import threading
+import time
+from typing import NamedTuple
+import metrics
+from card_renderer import CardRenderer
+from deck_catalog import DeckCatalog
+from deck_storage import CsvDeckStorage, diff_rows, open_storage
+from deck_watcher import DeckWatcher
+from flashcard_generator import CARDS_PER_REQUEST, generate_cards, generate_flashcards_stream
+from job_scheduler import JobScheduler
+from scheduler import Scheduler
+from search_index import SearchIndex
+from session_store import SessionStore, StudyState
+
+# Session used when a handler is called without a Gradio request, e.g. from a script
+DEFAULT_SESSION = "default"
+
+# Generation holds an upstream request for seconds, so it gets its own, small pool of workers
+GENERATE_CONCURRENCY = int(os.getenv("FLASHCARD_GENERATE_CONCURRENCY", 4))
+
+# Cards shown per page in the Create Mode editor
+EDITOR_PAGE_SIZE = int(os.getenv("FLASHCARD_EDITOR_PAGE_SIZE", 100))
+
+class EditorPage(NamedTuple):
+    """One page of a deck as shown in the editor; kept server-side in a gr.State"""
+    deck_name: str
+    number: int  # 1-based
+    pages: int
+    start: int  # position of the first card on the page
+    total: int
+    token: object  # catalog token of the deck when the page was read
+    ids: tuple
+    cards: tuple
+
+    def rows(self):
+        return [[card_id, card[0], card[1]] for card_id, card in zip(self.ids, self.cards)]
+
+class StalePageError(RuntimeError):
+    """The deck changed since an editor page was read and its row ids may point at other cards"""
+
+def load_decks(data_dir="data"):
+    """Load all CSV files from data/ directory as flashcard decks"""
+    with metrics.DECK_IO_SECONDS.time(op="load_decks"):
+        catalog = DeckCatalog(CsvDeckStorage(data_dir), max_bytes=0)
+        decks = {}
+        for deck_name in catalog.names():
+            cards = catalog.get(deck_name)
+            if cards is not None:
+                decks[deck_name] = [list(card) for card in cards]
+
+    return decks
+
+class FlashcardApp:
+    def __init__(self, storage=None, scheduler=None):
+        # Storage is opened and decks are listed on first use (or by start_watching
+        # in the background), so building the app does not wait on disk
+        self._storage = storage
+        self._catalog = None
+        self._scheduler = scheduler
+        self._load_lock = threading.Lock()
+        self.watcher = None
+        # Near-duplicate index per deck, built on first use: deck -> (catalog token, DedupIndex)
+        self._dedup = {}
+        self._dedup_lock = threading.Lock()
+        # Study position per browser session; decks are shared, read-only tuples
+        self.sessions = SessionStore()
+        # Review keys per deck: deck -> (catalog token, keys aligned with the cards, key -> position)
+        self._review_keys = {}
+        # Full-text index over every deck, and the catalog token each deck was indexed at
+        self._search = SearchIndex()
+        self._search_tokens = {}
+        self._search_lock = threading.Lock()
+        # Upstream generation calls, shared by identical requests and queued fairly per session
+        self.generation_jobs = JobScheduler(workers=GENERATE_CONCURRENCY)
+        # Card sides rendered from Markdown to sanitized HTML, shared by every session
+        self.renderer = CardRenderer()
+    
+    def load(self):
+        """Open the storage and list the decks, once; concurrent callers wait for the first"""
+        with self._load_lock:
+            if self._catalog is None:
+                if self._storage is None:
+                    self._storage = open_storage()
+                # Decks are listed up front but only decoded when selected
+                self._catalog = DeckCatalog(self._storage)
+                if self._scheduler is None:
+                    self._scheduler = Scheduler()
+                    # Keep only the latest line per card, so the next start replays less
+                    self._scheduler.compact()
+        return self._catalog
+
+    @property
+    def storage(self):
+        self.load()
+        return self._storage
+
+    @property
+    def catalog(self):
+        return self._catalog if self._catalog is not None else self.load()
+
+    @property
+    def scheduler(self):
+        self.load()
+        return self._scheduler
+
+    def start_watching(self):
+        """Load the decks, then pick up decks added, edited or removed outside the app"""
+        self.watcher = DeckWatcher(self.catalog).start()
+        return self.watcher
+
+    def refresh(self):
+        if self.watcher is not None:
+            self.watcher.poll()
+        else:
+            self.catalog.refresh()
+
+    def get_deck_names(self):
+        return self.catalog.names()
+    
+    def get_deck(self, deck_name):
+        """Return the cards of a deck, or None if there is no such deck"""
+        # Ensure deck_name is a string, not a list
+        if isinstance(deck_name, list) and deck_name:
+            deck_name = deck_name[0]
+        if not deck_name:
+            return None
+        with metrics.DECK_IO_SECONDS.time(op="load_deck"):
+            return self.catalog.get(deck_name)
+    
+    def card_html(self, text):
+        """Show one card side, rendered from Markdown (from the cache when it was shown or prefetched before)"""
+        return f"<div class='card-container'><div class='card-content'>{self.renderer.render(text)}</div></div>"
+
+    def prefetch_around(self, deck, card_index):
+        """Render the sides one click away (Flip, Next, Previous) in the background"""
+        n = len(deck)
+        self.renderer.prefetch([deck[card_index][1], deck[(card_index + 1) % n][0], deck[(card_index - 1) % n][0],
+                                deck[(card_index + 1) % n][1]])
+
+    def load_card(self, deck_name, session_id=DEFAULT_SESSION):
+        current_deck = self.get_deck(deck_name)
+        if current_deck is None:
+            return "<div class='card-container'>Please select a deck</div>", "0/0"
+        
+        state = self.sessions.update(session_id, deck_name=deck_name, card_index=0, showing_front=True,
+                                     deck_token=self.catalog.token(deck_name))
+        
+        # Handle empty deck case
+        if len(current_deck) == 0:
+            return "<div class='card-container'>This deck is empty. Add cards in Create Mode.</div>", "0/0"
+            
+        self.prefetch_around(current_deck, 0)
+        return (self.card_html(current_deck[0][0]),
+                f"{state.card_index + 1}/{len(current_deck)}")
+    
+    def flip_card(self, deck_name, session_id=DEFAULT_SESSION):
+        current_deck = self.get_deck(deck_name)
+        if current_deck is None:
+            return "<div class='card-container'>Please select a deck</div>", "0/0"
+        
+        # Handle empty deck case
+        if len(current_deck) == 0:
+            return "<div class='card-container'>This deck is empty. Add cards in Create Mode.</div>", "0/0"
+        
+        state = self.sessions.get(session_id)
+        if state.deck_name != deck_name:
+            state = StudyState(deck_name)
+        # The deck may have shrunk since the index was set
+        card_index = state.card_index % len(current_deck)
+        state = self.sessions.update(session_id, deck_name=deck_name, card_index=card_index,
+                                     showing_front=not state.showing_front, deck_token=self.catalog.token(deck_name))
+        current_card = current_deck[card_index]
+        
+        content = current_card[0] if state.showing_front else current_card[1]
+        self.prefetch_around(current_deck, card_index)
+        return (self.card_html(content),
+                f"{card_index + 1}/{len(current_deck)}")
+    
+    def review_keys(self, deck_name):
+        """
+        Keys the scheduler knows a deck's cards by, synced with the scheduler after every change.
+
+        Storage ids when they are stable; otherwise the card front, since CSV
+        ids are row positions that shift when cards are deleted.
+
+        Returns:
+            tuple: (keys aligned with the deck's cards, dict of key -> position)
+        """
+        token = self.catalog.token(deck_name)
+        entry = self._review_keys.get(deck_name)
+        if entry is not None and entry[0] == token:
+            return entry[1], entry[2]
+        cards = self.get_deck(deck_name) or ()
+        if self.storage.stable_ids:
+            keys = tuple(self.catalog.get_ids(deck_name) or ())
+        else:
+            keys = tuple(card[0] for card in cards)
+        positions = {}
+        for position, key in enumerate(keys):
+            positions.setdefault(key, position)
+        self.scheduler.sync_deck(deck_name, list(positions))
+        self._review_keys[deck_name] = (token, keys, positions)
+        return keys, positions
+
+    def next_due_card(self, deck_name, session_id=DEFAULT_SESSION):
+        """Show the deck's card with the earliest due time"""
+        current_deck = self.get_deck(deck_name)
+        if current_deck is None:
+            return "<div class='card-container'>Please select a deck</div>", "0/0"
+        if len(current_deck) == 0:
+            return "<div class='card-container'>This deck is empty. Add cards in Create Mode.</div>", "0/0"
+
+        _, positions = self.review_keys(deck_name)
+        due = self.scheduler.next_due(deck_name)
+        card_index = positions.get(due.key, 0) if due is not None else 0
+        self.sessions.update(session_id, deck_name=deck_name, card_index=card_index, showing_front=True,
+                             deck_token=self.catalog.token(deck_name))
+
+        status = "due now"
+        if due is not None and due.due > time.time():
+            status = f"next due {time.strftime('%Y-%m-%d %H:%M', time.localtime(due.due))}"
+        self.prefetch_around(current_deck, card_index)
+        return (self.card_html(current_deck[card_index][0]),
+                f"{card_index + 1}/{len(current_deck)} · {status}")
+
+    def grade_card(self, deck_name, grade, session_id=DEFAULT_SESSION):
+        """
+        Record a review grade for the card on screen and move on to the next due card.
+
+        The grade is dropped if the deck changed since the card was shown, as
+        its position may now hold another card; the next due card is shown instead.
+        """
+        current_deck = self.get_deck(deck_name)
+        state = self.sessions.get(session_id)
+        if current_deck and state.deck_name == deck_name and state.deck_token == self.catalog.token(deck_name):
+            keys, _ = self.review_keys(deck_name)
+            self.scheduler.record(deck_name, keys[state.card_index], grade)
+        return self.next_due_card(deck_name, session_id)
+
+    def deck_page(self, deck_name, number=1, page_size=EDITOR_PAGE_SIZE):
+        """
+        Read one page of a deck for the editor.
+
+        Args:
+            deck_name (str): Deck to read
+            number (int, optional): 1-based page number, clamped to the deck; None for the last page
+            page_size (int): Cards per page
+
+        Returns:
+            EditorPage: The page, or None if there is no such deck
+        """
+        token = self.catalog.token(deck_name)
+        cards = self.get_deck(deck_name)
+        if cards is None:
+            return None
+        ids = self.catalog.get_ids(deck_name)
+        pages = max(1, -(-len(cards) // page_size))
+        number = pages if number is None else min(max(1, int(number)), pages)
+        start = (number - 1) * page_size
+        return EditorPage(deck_name, number, pages, start, len(cards), token,
+                          tuple(ids[start:start + page_size]), tuple(cards[start:start + page_size]))
+
+    def save_page(self, deck_name, page, rows):
+        """
+        Save the edited rows of one editor page; cards on other pages are left alone.
+
+        Args:
+            deck_name (str): Deck the rows belong to
+            page (EditorPage, optional): The page as it was shown; None when nothing was loaded, so every row is new
+            rows (list): (id, front, back) rows; rows without a known id are added at the end of the deck
+
+        Raises:
+            StalePageError: The page's ids are row positions and the deck changed since it was read
+        """
+        if page is None or page.deck_name != deck_name:
+            ids, cards = (), ()
+        else:
+            if not self.storage.stable_ids and self.catalog.token(deck_name) != page.token:
+                raise StalePageError(f"{deck_name} changed since this page was loaded")
+            ids, cards = page.ids, page.cards
+        return self.apply_changes(deck_name, *diff_rows(ids, cards, rows))
+
+    def append_cards(self, deck_name, rows):
+        """Add cards at the end of a deck without reading or rewriting the rest of it"""
+        return self.apply_changes(deck_name, appended=[(front, back) for front, back in rows])
+
+    def apply_changes(self, deck_name, appended=(), updated=None, deleted=()):
+        """Patch a deck in storage and bring the catalog and the per-deck indexes up to date"""
+        updated = updated or {}
+        token = self.catalog.token(deck_name)
+        with metrics.DECK_IO_SECONDS.time(op="save_deck"):
+            new_ids = []
+            if appended or updated or deleted or deck_name not in self.catalog:
+                new_ids = self.storage.apply_changes(deck_name, appended=appended, updated=updated, deleted=deleted)
+            changes = self.catalog.invalidate(deck_name)
+        upserted = list(zip(new_ids, appended)) + list(updated.items())
+        self._update_dedup_index(deck_name, upserted, deleted)
+        self._update_search_index(deck_name, token, upserted, deleted)
+        return changes
+    
+    def delete_deck(self, deck_name):
+        """Delete a deck and drop its search entries, near-duplicate index, review keys and schedules"""
+        with metrics.DECK_IO_SECONDS.time(op="delete_deck"):
+            self.storage.delete_deck(deck_name)
+            changes = self.catalog.invalidate(deck_name)
+        self.scheduler.drop_deck(deck_name)
+        self._review_keys.pop(deck_name, None)
+        with self._dedup_lock:
+            self._dedup.pop(deck_name, None)
+        with self._search_lock:
+            self._search.remove_deck(deck_name)
+            self._search_tokens.pop(deck_name, None)
+        return changes
+
+    def dedup_index(self, deck_name):
+        """Return the near-duplicate index of a deck, building it on first use or after outside changes"""
+        token = self.catalog.token(deck_name)
+        with self._dedup_lock:
+            entry = self._dedup.get(deck_name)
+            if entry is not None and entry[0] == token:
+                return entry[1]
+        # NumPy is only imported once a deck's near-duplicates are first checked, not at startup
+        from dedup_index import DedupIndex
+
+        index = DedupIndex()
+        ids = self.catalog.get_ids(deck_name) or ()
+        index.add_many(zip(ids, self.catalog.get(deck_name) or ()))
+        with self._dedup_lock:
+            self._dedup[deck_name] = (token, index)
+        return index
+    
+    def _update_dedup_index(self, deck_name, upserted, deleted):
+        # Patch the index with just the saved cards instead of rebuilding it
+        with self._dedup_lock:
+            entry = self._dedup.pop(deck_name, None)
+            if entry is None or (deleted and not self.storage.stable_ids):
+                return
+            index = entry[1]
+            for card_id in deleted:
+                index.remove(card_id)
+            index.add_many(upserted)
+            self._dedup[deck_name] = (self.catalog.token(deck_name), index)
+    
+    def search_index(self):
+        """
+        Return the full-text index over every deck.
+
+        Decks created, changed or deleted since the last call (including by
+        other processes) are re-indexed one at a time; the rest are untouched.
+        """
+        with self._search_lock:
+            catalog = self.catalog
+            tokens = {name: catalog.token(name) for name in catalog.names()}
+            for name in [name for name in self._search_tokens if name not in tokens]:
+                self._search.remove_deck(name)
+                del self._search_tokens[name]
+            for name, token in tokens.items():
+                if self._search_tokens.get(name) != token:
+                    self._index_deck(name, token)
+        return self._search
+
+    def _index_deck(self, deck_name, token):
+        # Read storage directly so indexing every deck does not churn the catalog's LRU
+        stored = self.storage.load_deck(deck_name) or ()
+        self._search.index_deck(deck_name, ((card.id, (card.front, card.back)) for card in stored))
+        self._search_tokens[deck_name] = token
+
+    def _update_search_index(self, deck_name, token, upserted, deleted):
+        # Patch the saved cards in place; fall back to re-indexing the deck when
+        # it was not indexed at the token we saved over, or CSV row ids shifted
+        with self._search_lock:
+            if self._search_tokens.get(deck_name) != token or token is None:
+                return
+            new_token = self.catalog.token(deck_name)
+            if deleted and not self.storage.stable_ids:
+                self._index_deck(deck_name, new_token)
+            else:
+                self._search.update_deck(deck_name, upserted, deleted)
+                self._search_tokens[deck_name] = new_token
+
+    def search(self, query, limit=50):
+        """
+        Search the front and back of every card.
+
+        Returns:
+            list: [deck, front, back] rows, best match first
+        """
+        with metrics.DECK_IO_SECONDS.time(op="search"):
+            hits = self.search_index().search(query, limit=limit)
+        return [[hit.deck, hit.front, hit.back] for hit in hits]
+
+    def submit_generation(self, prompt, deck_name=None, count=None, session_id=DEFAULT_SESSION):
+        """
+        Queue a generation for a session, or join an identical one already queued or running.
+
+        Args:
+            prompt (str): User prompt for generating cards
+            deck_name (str, optional): Deck the cards are for; its saved cards are read here and sent as examples,
+                so the browser never uploads the deck
+            count (int, optional): Number of cards to generate; by default the prompt decides
+
+        Returns:
+            Job: Publishes each card as it arrives
+
+        Raises:
+            QueueFullError: Too many generations are waiting, or this session already has its share
+        """
+        # The catalog token stands in for the deck's cards: equal until the deck is saved again
+        key = (prompt.strip(), count, deck_name, self.catalog.token(deck_name) if deck_name else None)
+
+        def run(publish):
+            rows = [[card[0], card[1]] for card in (self.get_deck(deck_name) or ())] if deck_name else []
+            if count and count > CARDS_PER_REQUEST:
+                # Too many for one completion: fan out over parallel requests
+                cards = generate_cards(prompt, existing_cards=rows, count=count)
+            else:
+                cards = generate_flashcards_stream(prompt, existing_cards=rows, count=count)
+            for card in cards:
+                publish(card)
+
+        return self.generation_jobs.submit(session_id, key, run)
+
+    def navigate_card(self, deck_name, direction, session_id=DEFAULT_SESSION):
+        current_deck = self.get_deck(deck_name)
+        if current_deck is None:
+            return "<div class='card-container'>Please select a deck</div>", "0/0"
+        
+        # Handle empty deck case
+        if len(current_deck) == 0:
+            return "<div class='card-container'>This deck is empty. Add cards in Create Mode.</div>", "0/0"
+            
+        state = self.sessions.get(session_id)
+        card_index = state.card_index if state.deck_name == deck_name else 0
+        if direction == "next":
+            card_index = (card_index + 1) % len(current_deck)
+        else:  # previous
+            card_index = (card_index - 1) % len(current_deck)
+        
+        self.sessions.update(session_id, deck_name=deck_name, card_index=card_index, showing_front=True,
+                             deck_token=self.catalog.token(deck_name))
+        self.prefetch_around(current_deck, card_index)
+        return (self.card_html(current_deck[card_index][0]),
+                f"{card_index + 1}/{len(current_deck)}")
+    
+
+def deck_rows(deck_data):
+    """Normalize Dataframe input (pandas or list of lists) to a list of [front, back] rows"""
+    if deck_data is None:
+        return []
+    # Only Gradio hands us DataFrames, and by then it has imported pandas itself
+    pd = sys.modules.get("pandas")
+    if pd is not None and isinstance(deck_data, pd.DataFrame):
+        return deck_data.values.tolist()
+    return list(deck_data)
+
+def _card_id(value):
+    # Ids come back from the table as ints, floats or strings; a blank id means a new row
+    try:
+        return int(float(value))
+    except (TypeError, ValueError):
+        return None
+
+def _side(value):
+    return value if isinstance(value, str) else ""
+
+def card_rows(deck_data):
+    """Normalize table input to (front, back) rows, dropping empty ones"""
+    rows = []
+    for row in deck_rows(deck_data):
+        row = list(row) + [None] * (2 - len(row))
+        if _has_content(row):
+            rows.append((_side(row[0]), _side(row[1])))
+    return rows
+
+def editor_rows(deck_data):
+    """Normalize editor table input to (id, front, back) rows, dropping empty ones"""
+    rows = []
+    for row in deck_rows(deck_data):
+        row = list(row) + [None] * (3 - len(row))
+        if _has_content(row[1:3]):
+            rows.append((_card_id(row[0]), _side(row[1]), _side(row[2])))
+    return rows
+
+def _has_content(card):
+    # Filter out rows where both front and back are empty or just whitespace
+    return ((isinstance(card[0], str) and card[0].strip()) or
+            (isinstance(card[1], str) and card[1].strip()))
+
+def add_ai_cards_to_deck(prompt, current_deck_data, dedup_index=None, count=None):
+    """
+    Add AI-generated flashcards to the current deck
+    
+    Args:
+        prompt (str): User prompt for generating cards
+        current_deck_data (list): Current deck data as a list of lists
+        dedup_index (DedupIndex, optional): Saved cards of the deck; near-duplicates of them are skipped
+        count (int, optional): Number of cards to generate; by default the prompt decides
+    
+    Returns:
+        list: Updated deck data with new flashcards added
+    """
+    if not prompt:
+        return current_deck_data
+    
+    try:
+        updated_deck = deck_rows(current_deck_data)
+
+        # Generate flashcards with context from existing cards, already parsed into records.
+        # Only a token-budgeted sample of the deck is sent to the model.
+        with metrics.ADD_CARDS_SECONDS.time(stage="generate"):
+            new_cards = generate_cards(prompt, existing_cards=updated_deck, count=count)
+        
+        if dedup_index is not None:
+            with metrics.ADD_CARDS_SECONDS.time(stage="dedup"):
+                result = dedup_index.check(new_cards)
+            if result.duplicates:
+                print(f"Skipped {len(result.duplicates)} near-duplicate cards")
+            new_cards = result.accepted
+        
+        with metrics.ADD_CARDS_SECONDS.time(stage="merge"):
+            updated_deck.extend([card.front, card.back] for card in new_cards)
+            return [card for card in updated_deck if _has_content(card)]
+    
+    except (ValueError, TypeError) as e:
+        # Handle other conversion errors
+        print(f"Error processing flashcard data: {e}")
+        return current_deck_data
+    
+    except Exception as e:
+        # Catch any other unexpected errors
+        print(f"Unexpected error adding AI cards: {e}")
+        return current_deck_data
+
+def is_new_card(card, dedup_index, streamed):
+    """Check a generated card against the saved deck and the cards already accepted, remembering it if new"""
+    if (dedup_index is not None and dedup_index.query(card)) or streamed.query(card):
+        print(f"Skipped near-duplicate card: {card.front}")
+        return False
+    streamed.add(len(streamed), card)
+    return True
@@ -1,69 +1,694 @@
+import asyncio
+import contextlib
+import logging
 import os
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import NamedTuple, Optional
 from dotenv import load_dotenv
-from openai import OpenAI
+from card_parser import CardStreamParser, cards_to_csv, parse_cards
+import metrics
+from prompt_context import build_context, estimate_message_tokens
+from rate_limit import TokenBucket
+from response_cache import ResponseCache
 
 load_dotenv(override=True)  # take environment variables from .env.
 
-# Create a function to get the client, making it easier to mock or intercept in tests
+logger = logging.getLogger(__name__)
+
+# Create a function to get the client, making it easier to mock or intercept in tests.
+# Pool limits, timeouts, retries and the circuit breaker are set in openai_client,
+# which is imported here so that importing this module does not load the openai SDK
 def get_openai_client():
-    return OpenAI(
+    from openai_client import create_client
+
+    return create_client(
+        base_url=os.getenv("OPENAI_API_BASE"),
+        api_key=os.getenv("OPENAI_API_KEY")
+    )
+
+# Async clients hold a connection pool bound to the running event loop, so
+# callers create one per loop instead of sharing a module-level instance
+def get_async_openai_client():
+    from openai_client import create_async_client
+
+    return create_async_client(
         base_url=os.getenv("OPENAI_API_BASE"),
         api_key=os.getenv("OPENAI_API_KEY")
     )
 
-# Default client for normal usage
-client = get_openai_client()
+_client_lock = threading.Lock()
 
-def generate_flashcards(user_prompt, existing_cards_csv=None):
+def get_client():
     """
-    Make flashcards based on user prompt, with optional context from existing cards.
-    
-    Args:
-        user_prompt (str): The user's prompt for what flashcards to generate
-        existing_cards_csv (str, optional): CSV string of existing flashcards
-    
-    Returns:
-        str: CSV formatted string of generated flashcards
+    Return the default client for normal usage, creating it on first use.
+
+    Assigning `flashcard_generator.client` replaces it, e.g. in tests.
     """
-    #if there exist already flashcards provide them as an example
-    if existing_cards_csv:
-        context = (f"Use these set of flashcards as an example when generating flashcards:\n {existing_cards_csv}")
+    client = globals().get("client")
+    if client is None:
+        with _client_lock:
+            client = globals().get("client")
+            if client is None:
+                client = globals()["client"] = get_openai_client()
+    return client
+
+def __getattr__(name):
+    # `flashcard_generator.client` is built lazily so that importing this module stays cheap
+    if name == "client":
+        return get_client()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+MODEL = "gpt-35-turbo-16k"
+TEMPERATURE = 0.3
+
+# Most cards asked of a single completion; larger counts are split into
+# sub-requests that run in parallel (see complete_deck)
+CARDS_PER_REQUEST = int(os.getenv("FLASHCARD_CARDS_PER_REQUEST", 20))
+FANOUT_CONCURRENCY = int(os.getenv("FLASHCARD_FANOUT_CONCURRENCY", 10))
+# Extra rounds of requests when the merged deck comes back short
+TOP_UP_ROUNDS = 2
+
+# Cache of raw completions keyed on the full request, shared by every caller
+response_cache = ResponseCache(
+    path=os.getenv("FLASHCARD_CACHE_PATH", os.path.join(".cache", "responses.sqlite")),
+    ttl=float(os.getenv("FLASHCARD_CACHE_TTL", 7 * 24 * 3600)),
+)
+
+class GenerationResult(NamedTuple):
+    """Outcome of one prompt in a batch; exactly one of cards_csv and error is set"""
+    prompt: str
+    cards_csv: Optional[str]
+    error: Optional[Exception]
+
+def _build_messages(user_prompt, existing_cards_csv=None, existing_cards=None, count=None):
+    #if there exist already flashcards provide a budgeted, representative sample as an example
+    if existing_cards is None and existing_cards_csv:
+        existing_cards = parse_cards(existing_cards_csv)
+    context = build_context(existing_cards or [])
+
+    if count:
+        count_instruction = f"Generate exactly {count} cards for this request."
+    else:
+        # Unchanged from before counts existed, so cached responses stay valid
+        count_instruction = "Generate exactly 3 cards for each request."
 
     #assign a role to be able to generate the flashcards
     messages = [
-        {"role": "system", "content": """You are a helpful flashcard generator.
+        {"role": "system", "content": f"""You are a helpful flashcard generator.
 Generate flashcards in CSV format with 'front,back' as headers using Markdown Language.
 Each card should have a question on the front and answer on the back.
-Generate exactly 3 cards for each request.
+{count_instruction}
  Strictly follow the CSV format. With each deck user should be able to save/delete content and use them for study mode."""},
          #ask the user to give a prompt to generate the flalshcards
         {"role": "user", "content": f"Generate new flashcards based on the following prompt:\n{user_prompt}"}
     ]
+    if context.cards:
+        messages.insert(1, {"role": "system", "content": (
+            "Use these set of flashcards as an example when generating flashcards "
+            f"and do not repeat them:\n{context.text}")})
+
+    prompt_tokens = estimate_message_tokens(messages)
+    metrics.PROMPT_TOKENS.observe(prompt_tokens, part="total")
+    metrics.PROMPT_TOKENS.observe(context.tokens, part="examples")
+    logger.info("Prompt uses ~%d tokens (%d example cards, ~%d tokens)",
+                prompt_tokens, len(context.cards), context.tokens)
+    return messages
+
+class Completion(NamedTuple):
+    """Parsed cards of one request plus the token usage reported by the API"""
+    cards: list
+    usage: Optional[dict]  # prompt/completion/total tokens; None when served from the cache
+    cached: bool
+
+def _usage(response):
+    usage = getattr(response, "usage", None)
+    if usage is None:
+        return None
+    return {
+        "prompt_tokens": getattr(usage, "prompt_tokens", 0) or 0,
+        "completion_tokens": getattr(usage, "completion_tokens", 0) or 0,
+        "total_tokens": getattr(usage, "total_tokens", 0) or 0,
+    }
+
+def _finish(mode, started, csv_data, usage, cached):
+    """Parse a completion and record how long the whole request took"""
+    with metrics.PARSE_SECONDS.time():
+        cards = parse_cards(csv_data) if csv_data else []
+    if usage:
+        metrics.TOKENS.inc(usage["prompt_tokens"], kind="prompt")
+        metrics.TOKENS.inc(usage["completion_tokens"], kind="completion")
+    metrics.CARDS_GENERATED.inc(len(cards))
+    metrics.GENERATE_SECONDS.observe(time.perf_counter() - started, mode=mode,
+                                     cache="hit" if cached else "miss")
+    return Completion(cards, usage, cached)
+
+def complete_cards(user_prompt, existing_cards_csv=None, use_cache=True, refresh=False, existing_cards=None,
+                   count=None):
+    """
+    Make flashcards based on user prompt in a single request and report the tokens it used.
+
+    Args:
+        user_prompt (str): The user's prompt for what flashcards to generate
+        existing_cards_csv (str, optional): CSV string of existing flashcards
+        use_cache (bool): Set to False to bypass the response cache entirely
+        refresh (bool): Skip the cache lookup but store the fresh response
+        existing_cards (list, optional): Existing (front, back) pairs, instead of existing_cards_csv
+        count (int, optional): Number of cards to ask for; by default the prompt decides
+
+    Returns:
+        Completion: Cards parsed from the completion and its token usage
+    """
+    started = time.perf_counter()
+    messages = _build_messages(user_prompt, existing_cards_csv, existing_cards, count)
+
+    cache_key = ResponseCache.make_key(messages, MODEL, TEMPERATURE)
+    if use_cache and not refresh:
+        csv_data = response_cache.get(cache_key)
+        if csv_data is not None:
+            return _finish("sync", started, csv_data, None, True)
 
     #API call to OpenAI completition endpoint
-    response = client.chat.completions.create(
-        model="gpt-35-turbo-16k",
-        messages=messages,
-        temperature=0.3,
-    )
-    
+    try:
+        with metrics.UPSTREAM_SECONDS.time(mode="sync"):
+            response = get_client().chat.completions.create(
+                model=MODEL,
+                messages=messages,
+                temperature=TEMPERATURE,
+            )
+    except Exception:
+        metrics.GENERATE_ERRORS.inc(mode="sync")
+        raise
+
     if response.choices is None or len(response.choices) == 0:
-        return ""  # Return an empty string if the response is None or empty
+        return _finish("sync", started, None, _usage(response), False)  # Return no cards if the response is None or empty
 
     csv_data = response.choices[0].message.content.strip()
+    if use_cache:
+        response_cache.set(cache_key, csv_data)
+
+    return _finish("sync", started, csv_data, _usage(response), False)
+
+def plan_shards(count, shard_size=CARDS_PER_REQUEST):
+    """Split `count` cards into as few sub-requests of at most `shard_size` as possible, evenly sized"""
+    parts = max(1, -(-count // shard_size))
+    base, extra = divmod(count, parts)
+    return [base + 1] * extra + [base] * (parts - extra)
+
+_LIST_MARKER = re.compile(r"^\s*(?:[-*•]|\d+[.)])\s*")
+
+def _subtopic_messages(user_prompt, parts):
+    return [
+        {"role": "system", "content": (
+            f"You plan flashcard decks. Split the topic of the user's request into exactly {parts} distinct, "
+            "non-overlapping subtopics. Answer with one subtopic per line and nothing else.")},
+        {"role": "user", "content": user_prompt},
+    ]
+
+def _parse_subtopics(text, parts):
+    subtopics = []
+    for line in (text or "").splitlines():
+        line = _LIST_MARKER.sub("", line).strip()
+        if line and line not in subtopics:
+            subtopics.append(line)
+    return subtopics[:parts]
+
+def plan_subtopics(user_prompt, parts, use_cache=True, refresh=False):
+    """
+    Split a topic into `parts` distinct subtopics with one request, so fan-out shards cover different slices.
+
+    Returns:
+        list: Up to `parts` subtopics; empty if the request failed, in which case shards split the topic themselves
+    """
+    messages = _subtopic_messages(user_prompt, parts)
+    cache_key = ResponseCache.make_key(messages, MODEL, TEMPERATURE)
+    text = response_cache.get(cache_key) if use_cache and not refresh else None
+    if text is None:
+        metrics.FANOUT_REQUESTS.inc(kind="plan")
+        try:
+            response = get_client().chat.completions.create(model=MODEL, messages=messages, temperature=TEMPERATURE)
+        except Exception as e:
+            logger.warning("Planning subtopics failed: %s", e)
+            return []
+        text = response.choices[0].message.content.strip() if response.choices else ""
+        if use_cache and text:
+            response_cache.set(cache_key, text)
+    return _parse_subtopics(text, parts)
+
+async def plan_subtopics_async(user_prompt, parts, async_client, use_cache=True, refresh=False):
+    """Async version of plan_subtopics, on the caller's client"""
+    messages = _subtopic_messages(user_prompt, parts)
+    cache_key = ResponseCache.make_key(messages, MODEL, TEMPERATURE)
+    text = response_cache.get(cache_key) if use_cache and not refresh else None
+    if text is None:
+        metrics.FANOUT_REQUESTS.inc(kind="plan")
+        try:
+            response = await async_client.chat.completions.create(model=MODEL, messages=messages,
+                                                                  temperature=TEMPERATURE)
+        except Exception as e:
+            logger.warning("Planning subtopics failed: %s", e)
+            return []
+        text = response.choices[0].message.content.strip() if response.choices else ""
+        if use_cache and text:
+            response_cache.set(cache_key, text)
+    return _parse_subtopics(text, parts)
+
+def shard_prompt(user_prompt, part, parts, subtopics=()):
+    """
+    Prompt for one sub-request, steering each toward a different slice of the topic.
+
+    Args:
+        subtopics (list): Planned subtopics, one per shard (reused in turn if there are fewer);
+            without them each shard is asked to split the topic on its own
+    """
+    if parts == 1:
+        return user_prompt
+    if subtopics:
+        return f"{user_prompt}\nOnly write cards about this subtopic: {subtopics[part % len(subtopics)]}"
+    return (f"{user_prompt}\nThis request is part {part + 1} of {parts}. Divide the topic into {parts} "
+            f"distinct subtopics and only write cards about subtopic {part + 1}.")
+
+class _FanOut:
+    """
+    Plans the sub-requests of one large generation and merges their cards.
+
+    The first round splits the count into parallel shards, one per planned
+    subtopic (see plan_subtopics). Each later round
+    asks only for the cards still missing after near-duplicates were
+    dropped, with the cards kept so far as examples not to repeat. It stops
+    when the count is reached, a round adds nothing, or TOP_UP_ROUNDS run out.
+    """
+
+    def __init__(self, user_prompt, count, existing_cards, shard_size):
+        from dedup_index import DedupIndex  # NumPy is only needed once a deck is fanned out
+
+        self.user_prompt = user_prompt
+        self.count = count
+        self.existing_cards = list(existing_cards)
+        self.shard_size = shard_size
+        self.parts = len(plan_shards(count, shard_size))
+        self.subtopics = []
+        self.cards = []
+        self.usage = None
+        self.cached = None  # set from the first successful sub-request
+        self.errors = []
+        self._added = 0
+        self._index = DedupIndex()
+        self._index.add_many((-1 - i, card) for i, card in enumerate(self.existing_cards))
+
+    def rounds(self):
+        """
+        Yields:
+            list: (prompt, count, existing cards) per sub-request of the next round, run in parallel
+        """
+        shards = plan_shards(self.count, self.shard_size)
+        yield [(shard_prompt(self.user_prompt, i, len(shards), self.subtopics), n, self.existing_cards)
+               for i, n in enumerate(shards)]
+        for _ in range(TOP_UP_ROUNDS):
+            missing = self.count - len(self.cards)
+            if missing <= 0 or not self._added:
+                return
+            prompt = f"{self.user_prompt}\nOnly write cards about aspects the example cards do not cover."
+            context = self.existing_cards + self.cards
+            shards = plan_shards(missing, self.shard_size)
+            metrics.FANOUT_REQUESTS.inc(len(shards), kind="top_up")
+            yield [(shard_prompt(prompt, i, len(shards), self.subtopics), n, context)
+                   for i, n in enumerate(shards)]
+
+    def add(self, results):
+        """Merge one round of Completions (or the exceptions raised instead), dropping near-duplicates"""
+        cards = []
+        for result in results:
+            if isinstance(result, Exception):
+                # A failed shard is just short; the next round asks for its cards again
+                logger.warning("Fan-out sub-request failed: %s", result)
+                self.errors.append(result)
+                continue
+            cards.extend(result.cards)
+            self.cached = result.cached if self.cached is None else self.cached and result.cached
+            if result.usage:
+                self.usage = {key: (self.usage or {}).get(key, 0) + value for key, value in result.usage.items()}
+        accepted = self._index.check(cards).accepted[:self.count - len(self.cards)]
+        self._index.add_many((len(self.cards) + i, card) for i, card in enumerate(accepted))
+        self.cards.extend(accepted)
+        self._added = len(accepted)
+
+    def completion(self):
+        if not self.cards and self.errors:
+            raise self.errors[0]
+        return Completion(self.cards, self.usage, bool(self.cached))
+
+def _fan_out(user_prompt, count, existing_cards_csv, existing_cards, shard_size):
+    if existing_cards is None and existing_cards_csv:
+        existing_cards = parse_cards(existing_cards_csv)
+    fan_out = _FanOut(user_prompt, count, existing_cards or [], shard_size)
+    metrics.FANOUT_REQUESTS.inc(len(plan_shards(count, shard_size)), kind="shard")
+    return fan_out
+
+def complete_deck(user_prompt, count, existing_cards_csv=None, use_cache=True, refresh=False,
+                  existing_cards=None, shard_size=CARDS_PER_REQUEST, concurrency=FANOUT_CONCURRENCY,
+                  semaphore=None):
+    """
+    Make `count` flashcards, splitting large counts into parallel sub-requests.
+
+    A single completion cannot reliably hold hundreds of cards, so the count
+    is split into shards of at most `shard_size`. One planning request first
+    splits the topic into a subtopic per shard, so shards do not overlap.
+    Shards run concurrently, so the wall-clock time is
+    close to that of one sub-request. Their cards are merged without
+    near-duplicates, and missing cards are topped up.
+
+    Args:
+        user_prompt (str): The user's prompt for what flashcards to generate
+        count (int): Number of cards wanted
+        existing_cards_csv (str, optional): CSV string of existing flashcards
+        use_cache (bool): Set to False to bypass the response cache entirely
+        refresh (bool): Skip the cache lookup but store the fresh responses
+        existing_cards (list, optional): Existing (front, back) pairs, instead of existing_cards_csv
+        shard_size (int): Most cards asked of one sub-request
+        concurrency (int): Most sub-requests in flight at once
+        semaphore (threading.Semaphore, optional): Limit shared with other callers, e.g. a batch's workers;
+            the planning request and every sub-request hold it while in flight
+
+    Returns:
+        Completion: Up to `count` cards and the token usage summed over every sub-request
+    """
+    slot = semaphore if semaphore is not None else contextlib.nullcontext()
+    fan_out = _fan_out(user_prompt, count, existing_cards_csv, existing_cards, shard_size)
+    if fan_out.parts > 1:
+        with slot:
+            fan_out.subtopics = plan_subtopics(user_prompt, fan_out.parts, use_cache=use_cache, refresh=refresh)
+
+    def run_one(request):
+        prompt, n, context = request
+        with slot:
+            try:
+                return complete_cards(prompt, use_cache=use_cache, refresh=refresh, existing_cards=context,
+                                      count=n)
+            except Exception as e:
+                return e
 
-    rows = [line.split(",") for line in csv_data.split("\n") if line.strip()] # split csv string into one line
+    with ThreadPoolExecutor(max_workers=max(1, min(concurrency, len(plan_shards(count, shard_size)))),
+                            thread_name_prefix="fan-out") as pool:
+        for requests in fan_out.rounds():
+            fan_out.add(list(pool.map(run_one, requests)))
+    return fan_out.completion()
 
-    cleaned_rows = [row[:2] for row in rows if len(row) >= 2] # ensures we have only 2 columns for cards
+def generate_cards(user_prompt, existing_cards_csv=None, use_cache=True, refresh=False, existing_cards=None,
+                   count=None):
+    """
+    Make flashcards based on user prompt and return them as parsed records.
+
+    Args:
+        user_prompt (str): The user's prompt for what flashcards to generate
+        existing_cards_csv (str, optional): CSV string of existing flashcards
+        use_cache (bool): Set to False to bypass the response cache entirely
+        refresh (bool): Skip the cache lookup but store the fresh response
+        existing_cards (list, optional): Existing (front, back) pairs, instead of existing_cards_csv
+        count (int, optional): Number of cards wanted; large counts are fanned out over parallel requests
 
-    csv_data = "\n".join([",".join(row) for row in cleaned_rows]) # joins all rows into one csv document
+    Returns:
+        list: Card records parsed from the completion
+    """
+    if count:
+        return complete_deck(user_prompt, count, existing_cards_csv, use_cache=use_cache, refresh=refresh,
+                             existing_cards=existing_cards).cards
+    return complete_cards(user_prompt, existing_cards_csv, use_cache=use_cache, refresh=refresh,
+                          existing_cards=existing_cards).cards
+
+def generate_flashcards(user_prompt, existing_cards_csv=None, use_cache=True, refresh=False, existing_cards=None,
+                        count=None):
+    """
+    Make flashcards based on user prompt, with optional context from existing cards.
     
+    Args:
+        user_prompt (str): The user's prompt for what flashcards to generate
+        existing_cards_csv (str, optional): CSV string of existing flashcards
+        use_cache (bool): Set to False to bypass the response cache entirely
+        refresh (bool): Skip the cache lookup but store the fresh response
+        existing_cards (list, optional): Existing (front, back) pairs, instead of existing_cards_csv
+        count (int, optional): Number of cards wanted; large counts are fanned out over parallel requests
+    
+    Returns:
+        str: CSV formatted string of generated flashcards
+    """
+    cards = generate_cards(user_prompt, existing_cards_csv, use_cache=use_cache, refresh=refresh,
+                           existing_cards=existing_cards, count=count)
+    return cards_to_csv(cards)
+
+def generate_flashcards_stream(user_prompt, existing_cards_csv=None, use_cache=True, refresh=False,
+                               existing_cards=None, count=None):
+    """
+    Stream flashcards as the completion arrives instead of waiting for all of it.
+
+    Args:
+        user_prompt (str): The user's prompt for what flashcards to generate
+        existing_cards_csv (str, optional): CSV string of existing flashcards
+        use_cache (bool): Set to False to bypass the response cache entirely
+        refresh (bool): Skip the cache lookup but store the fresh response
+        existing_cards (list, optional): Existing (front, back) pairs, instead of existing_cards_csv
+        count (int, optional): Number of cards to ask for in this one request
+
+    Yields:
+        Card: Each (front, back) pair as soon as its line is complete
+    """
+    started = time.perf_counter()
+    messages = _build_messages(user_prompt, existing_cards_csv, existing_cards, count)
+    parser = CardStreamParser()
+
+    cache_key = ResponseCache.make_key(messages, MODEL, TEMPERATURE)
+    if use_cache and not refresh:
+        csv_data = response_cache.get(cache_key)
+        if csv_data is not None:
+            yield from parser.feed(csv_data)
+            yield from parser.close()
+            metrics.GENERATE_SECONDS.observe(time.perf_counter() - started, mode="stream", cache="hit")
+            return
+
+    # Upstream time covers the whole stream, including time spent by the consumer between cards
+    try:
+        with metrics.UPSTREAM_SECONDS.time(mode="stream"):
+            stream = get_client().chat.completions.create(
+                model=MODEL,
+                messages=messages,
+                temperature=TEMPERATURE,
+                stream=True,
+            )
+
+            chunks = []
+            n_cards = 0
+            for chunk in stream:
+                if not chunk.choices:
+                    continue
+                delta = chunk.choices[0].delta.content
+                if delta:
+                    chunks.append(delta)
+                    for card in parser.feed(delta):
+                        n_cards += 1
+                        yield card
+            for card in parser.close():
+                n_cards += 1
+                yield card
+    except Exception:
+        metrics.GENERATE_ERRORS.inc(mode="stream")
+        raise
+
+    metrics.CARDS_GENERATED.inc(n_cards)
+    metrics.GENERATE_SECONDS.observe(time.perf_counter() - started, mode="stream", cache="miss")
+
+    csv_data = "".join(chunks).strip()
+    if use_cache and csv_data:
+        response_cache.set(cache_key, csv_data)
+
+async def complete_cards_async(user_prompt, existing_cards_csv=None, use_cache=True, refresh=False,
+                               existing_cards=None, async_client=None, count=None):
+    """
+    Async version of complete_cards that shares its prompt and response cache.
+
+    Args:
+        user_prompt (str): The user's prompt for what flashcards to generate
+        existing_cards_csv (str, optional): CSV string of existing flashcards
+        use_cache (bool): Set to False to bypass the response cache entirely
+        refresh (bool): Skip the cache lookup but store the fresh response
+        existing_cards (list, optional): Existing (front, back) pairs, instead of existing_cards_csv
+        async_client (AsyncOpenAI, optional): Client to reuse; a new one is created if omitted
+        count (int, optional): Number of cards to ask for; by default the prompt decides
+
+    Returns:
+        Completion: Cards parsed from the completion and its token usage
+    """
+    started = time.perf_counter()
+    messages = _build_messages(user_prompt, existing_cards_csv, existing_cards, count)
+
+    cache_key = ResponseCache.make_key(messages, MODEL, TEMPERATURE)
+    if use_cache and not refresh:
+        csv_data = response_cache.get(cache_key)
+        if csv_data is not None:
+            return _finish("async", started, csv_data, None, True)
+
+    owns_client = async_client is None
+    if owns_client:
+        async_client = get_async_openai_client()
+    try:
+        with metrics.UPSTREAM_SECONDS.time(mode="async"):
+            response = await async_client.chat.completions.create(
+                model=MODEL,
+                messages=messages,
+                temperature=TEMPERATURE,
+            )
+    except Exception:
+        metrics.GENERATE_ERRORS.inc(mode="async")
+        raise
+    finally:
+        if owns_client:
+            await async_client.close()
+
     if response.choices is None or len(response.choices) == 0:
-        return "front,back\n"  # Return a valid CSV string with just the header
+        return _finish("async", started, None, _usage(response), False)
+
+    csv_data = response.choices[0].message.content.strip()
+    if use_cache:
+        response_cache.set(cache_key, csv_data)
+
+    return _finish("async", started, csv_data, _usage(response), False)
+
+@contextlib.asynccontextmanager
+async def _request_slot(semaphore, bucket):
+    # One upstream request: a place under the concurrency limit, then a token from the rate limit
+    async with semaphore:
+        if bucket is not None:
+            await bucket.acquire()
+        yield
+
+async def complete_deck_async(user_prompt, count, existing_cards_csv=None, use_cache=True, refresh=False,
+                              existing_cards=None, async_client=None, shard_size=CARDS_PER_REQUEST,
+                              concurrency=FANOUT_CONCURRENCY, semaphore=None, bucket=None):
+    """
+    Async version of complete_deck.
+
+    Args:
+        async_client (AsyncOpenAI, optional): Client shared by the sub-requests; a new one is created if omitted
+        semaphore (asyncio.Semaphore, optional): Limit shared with other callers, e.g. generate_many;
+            replaces `concurrency`
+        bucket (TokenBucket, optional): Rate limit charged once per upstream request
+
+    Returns:
+        Completion: Up to `count` cards and the token usage summed over every sub-request
+    """
+    fan_out = _fan_out(user_prompt, count, existing_cards_csv, existing_cards, shard_size)
+    semaphore = semaphore if semaphore is not None else asyncio.Semaphore(concurrency)
+    owns_client = async_client is None
+    if owns_client:
+        async_client = get_async_openai_client()
+
+    async def run_one(prompt, n, context):
+        async with _request_slot(semaphore, bucket):
+            try:
+                return await complete_cards_async(prompt, use_cache=use_cache, refresh=refresh,
+                                                  existing_cards=context, async_client=async_client, count=n)
+            except Exception as e:
+                return e
 
-    return csv_data 
+    try:
+        if fan_out.parts > 1:
+            async with _request_slot(semaphore, bucket):
+                fan_out.subtopics = await plan_subtopics_async(user_prompt, fan_out.parts, async_client,
+                                                               use_cache=use_cache, refresh=refresh)
+        for requests in fan_out.rounds():
+            fan_out.add(await asyncio.gather(*(run_one(*request) for request in requests)))
+    finally:
+        if owns_client:
+            await async_client.close()
+    return fan_out.completion()
+
+async def generate_flashcards_async(user_prompt, existing_cards_csv=None, use_cache=True, refresh=False,
+                                    existing_cards=None, async_client=None, count=None):
+    """
+    Async version of generate_flashcards that shares its prompt and response cache.
+
+    Args:
+        user_prompt (str): The user's prompt for what flashcards to generate
+        existing_cards_csv (str, optional): CSV string of existing flashcards
+        use_cache (bool): Set to False to bypass the response cache entirely
+        refresh (bool): Skip the cache lookup but store the fresh response
+        existing_cards (list, optional): Existing (front, back) pairs, instead of existing_cards_csv
+        async_client (AsyncOpenAI, optional): Client to reuse; a new one is created if omitted
+        count (int, optional): Number of cards wanted; large counts are fanned out over parallel requests
+
+    Returns:
+        str: CSV formatted string of generated flashcards
+    """
+    if count:
+        completion = await complete_deck_async(user_prompt, count, existing_cards_csv, use_cache=use_cache,
+                                               refresh=refresh, existing_cards=existing_cards,
+                                               async_client=async_client)
+    else:
+        completion = await complete_cards_async(user_prompt, existing_cards_csv, use_cache=use_cache,
+                                                refresh=refresh, existing_cards=existing_cards,
+                                                async_client=async_client)
+    return cards_to_csv(completion.cards)
+
+async def generate_many_async(prompts, concurrency=4, requests_per_second=None, existing_cards_csv=None,
+                              use_cache=True, count=None):
+    """
+    Generate flashcards for many prompts at once with bounded concurrency.
+
+    Args:
+        prompts (list): User prompts, one deck per prompt
+        concurrency (int): Maximum number of requests in flight at any time
+        requests_per_second (float, optional): Rate limit for starting new requests
+        existing_cards_csv (str, optional): CSV string of existing flashcards shared by every prompt
+        use_cache (bool): Set to False to bypass the response cache entirely
+        count (int, optional): Cards wanted per prompt; a large count is fanned out, and every sub-request
+            counts against `concurrency` and `requests_per_second`
+
+    Returns:
+        list: GenerationResult per prompt, in the same order as `prompts`
+    """
+    semaphore = asyncio.Semaphore(concurrency)
+    bucket = TokenBucket(requests_per_second, capacity=concurrency) if requests_per_second else None
+    async_client = get_async_openai_client()
+
+    async def run_one(prompt):
+        try:
+            if count:
+                # The fan-out takes a slot per sub-request, so this prompt holds none itself
+                completion = await complete_deck_async(prompt, count, existing_cards_csv, use_cache=use_cache,
+                                                       async_client=async_client, semaphore=semaphore, bucket=bucket)
+            else:
+                async with _request_slot(semaphore, bucket):
+                    completion = await complete_cards_async(prompt, existing_cards_csv, use_cache=use_cache,
+                                                            async_client=async_client)
+        except Exception as e:
+            # Keep going: one failed prompt should not sink the whole batch
+            return GenerationResult(prompt, None, e)
+        return GenerationResult(prompt, cards_to_csv(completion.cards), None)
+
+    try:
+        return await asyncio.gather(*(run_one(prompt) for prompt in prompts))
+    finally:
+        await async_client.close()
+
+def generate_many(prompts, concurrency=4, requests_per_second=None, existing_cards_csv=None, use_cache=True,
+                  count=None):
+    """
+    Blocking wrapper around generate_many_async for callers without an event loop.
+
+    Returns:
+        list: GenerationResult per prompt, in the same order as `prompts`
+    """
+    return asyncio.run(generate_many_async(
+        prompts,
+        concurrency=concurrency,
+        requests_per_second=requests_per_second,
+        existing_cards_csv=existing_cards_csv,
+        use_cache=use_cache,
+        count=count,
+    ))
 
 # user_prompt = "Create 5 flashcards about Chemistry"
 # existing_cards_csv = None  # Optionally provide existing cards as context
 # result = generate_flashcards(user_prompt, existing_cards_csv)
-# print(result)
\ No newline at end of file
+# print(result)
@@ -0,0 +1,263 @@
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict, deque
+from typing import NamedTuple
+
+import metrics
+
+logger = logging.getLogger(__name__)
+
+# Upstream generations run at once, across every user
+GENERATE_WORKERS = int(os.getenv("FLASHCARD_GENERATE_CONCURRENCY", 4))
+# Jobs waiting for a worker before new ones are turned away, in total and per user
+MAX_QUEUED = int(os.getenv("FLASHCARD_GENERATE_MAX_QUEUED", 64))
+MAX_JOBS_PER_USER = int(os.getenv("FLASHCARD_GENERATE_MAX_PER_USER", 2))
+
+QUEUED, RUNNING, DONE, FAILED = "queued", "running", "done", "failed"
+
+
+class QueueFullError(RuntimeError):
+    """Raised by JobScheduler.submit when the queue, or the user's share of it, is full"""
+
+
+class JobUpdate(NamedTuple):
+    status: str
+    position: int  # 1-based place in line while queued, 0 once running
+    items: list  # items published since the previous update
+
+
+class Job:
+    """
+    One scheduled call, shared by every request that asked for the same key.
+
+    The call publishes partial results (cards, as they stream in) that every
+    follower receives, so a coalesced request still sees them arrive one by one.
+    """
+
+    def __init__(self, scheduler, user, key, fn):
+        self.user = user
+        self.key = key
+        self.fn = fn
+        self.status = QUEUED
+        self.items = []
+        self.result = None
+        self.error = None
+        self.followers = 1
+        self.submitted = time.monotonic()
+        self._scheduler = scheduler
+        self._cond = threading.Condition()
+
+    def publish(self, item):
+        with self._cond:
+            self.items.append(item)
+            self._cond.notify_all()
+
+    def _set_status(self, status, result=None, error=None):
+        with self._cond:
+            self.status = status
+            self.result = result
+            self.error = error
+            self._cond.notify_all()
+
+    def position(self):
+        return self._scheduler.position(self)
+
+    def wait(self, timeout=None):
+        """
+        Block until the job finishes.
+
+        Returns:
+            The value returned by the job's function; its exception is raised instead if it failed
+        """
+        with self._cond:
+            if not self._cond.wait_for(lambda: self.status in (DONE, FAILED), timeout):
+                raise TimeoutError(f"job {self.key!r} still {self.status}")
+        if self.error is not None:
+            raise self.error
+        return self.result
+
+    def follow(self, poll_interval=0.5):
+        """
+        Follow the job from the queue to its end.
+
+        Yields an update every `poll_interval` while queued, so the caller can
+        show its place in line, then one per batch of published items. The
+        job's exception is raised after the last update if it failed.
+
+        Yields:
+            JobUpdate: Status, queue position and the items published since the last update
+        """
+        seen = 0
+        last_status = None
+        while True:
+            with self._cond:
+                if len(self.items) == seen and self.status == last_status and self.status in (QUEUED, RUNNING):
+                    self._cond.wait(poll_interval)
+                items = self.items[seen:]
+                seen += len(items)
+                status = self.status
+            if status == QUEUED:
+                yield JobUpdate(status, self.position(), items)
+            elif status == RUNNING:
+                if items or status != last_status:
+                    yield JobUpdate(status, 0, items)
+            else:
+                yield JobUpdate(status, 0, items)
+                if self.error is not None:
+                    raise self.error
+                return
+            last_status = status
+
+
+class JobScheduler:
+    """
+    Runs jobs on a fixed pool of workers with one fair queue per user.
+
+    Workers take jobs from the users' queues in turn, so one user with many
+    requests waits behind everyone else's next job instead of in front of
+    it. Submitting a key that is already queued or running joins that job
+    (single-flight) rather than queueing a copy. When the queue is full, or
+    a user already has `max_per_user` jobs waiting or running, submit raises
+    QueueFullError right away instead of letting requests time out.
+    """
+
+    def __init__(self, workers=GENERATE_WORKERS, max_queued=MAX_QUEUED, max_per_user=MAX_JOBS_PER_USER):
+        """
+        Args:
+            workers (int): Jobs run at once
+            max_queued (int): Jobs waiting for a worker, across all users
+            max_per_user (int): Jobs one user may have waiting or running
+        """
+        self.workers = workers
+        self.max_queued = max_queued
+        self.max_per_user = max_per_user
+        self._queues = OrderedDict()  # user -> deque of jobs; the first user is served next
+        self._jobs = {}  # key -> queued or running job
+        self._per_user = {}  # user -> jobs waiting or running
+        self._queued = 0
+        self._running = 0
+        self._cond = threading.Condition()
+        self._threads = []
+        self._closed = False
+
+    def submit(self, user, key, fn):
+        """
+        Schedule `fn(publish)` for `user`, or join the job already scheduled under `key`.
+
+        Args:
+            user (str): Whose queue the job goes in, e.g. a browser session id
+            key (hashable): Requests with equal keys share one call
+            fn (callable): Called with the job's publish function; its return value is the job's result
+
+        Returns:
+            Job: The new or joined job
+        """
+        with self._cond:
+            if self._closed:
+                raise RuntimeError("scheduler is closed")
+            job = self._jobs.get(key)
+            if job is not None:
+                job.followers += 1
+                metrics.GENERATE_JOBS.inc(outcome="coalesced")
+                return job
+            if self._queued >= self.max_queued:
+                metrics.GENERATE_JOBS.inc(outcome="rejected")
+                raise QueueFullError(f"{self._queued} generation requests are already waiting")
+            if self._per_user.get(user, 0) >= self.max_per_user:
+                metrics.GENERATE_JOBS.inc(outcome="rejected")
+                raise QueueFullError(f"you already have {self.max_per_user} generation requests in progress")
+
+            job = Job(self, user, key, fn)
+            self._queues.setdefault(user, deque()).append(job)
+            self._jobs[key] = job
+            self._per_user[user] = self._per_user.get(user, 0) + 1
+            self._queued += 1
+            metrics.GENERATE_JOBS.inc(outcome="queued")
+            self._start_workers()
+            self._cond.notify()
+            return job
+
+    def position(self, job):
+        """
+        1-based place of a queued job in the order workers will pick it up, or 0 if it is not queued.
+
+        Workers serve users in turn, so a job k-th in its user's queue goes
+        after up to k+1 jobs of each user ahead of its own in the rotation
+        and up to k jobs of each user behind it.
+        """
+        with self._cond:
+            queue = self._queues.get(job.user, ())
+            # A job just taken by a worker may still read as queued
+            if job.status != QUEUED or job not in queue:
+                return 0
+            rank = queue.index(job)
+            own_turn = list(self._queues).index(job.user)
+            ahead = rank
+            for turn, (user, other) in enumerate(self._queues.items()):
+                if user != job.user:
+                    ahead += min(len(other), rank + 1 if turn < own_turn else rank)
+            return ahead + 1
+
+    def stats(self):
+        with self._cond:
+            return {"queued": self._queued, "running": self._running, "users": len(self._queues)}
+
+    def close(self):
+        """Stop the workers once the jobs already running finish; queued jobs fail without running"""
+        with self._cond:
+            self._closed = True
+            dropped = [job for queue in self._queues.values() for job in queue]
+            self._queues.clear()
+            for job in dropped:
+                del self._jobs[job.key]
+            self._queued = 0
+            self._cond.notify_all()
+        for job in dropped:
+            job._set_status(FAILED, error=RuntimeError("scheduler closed before the job ran"))
+        for thread in self._threads:
+            thread.join()
+
+    def _start_workers(self):
+        # Called with the lock held; workers are started on first use
+        while len(self._threads) < self.workers:
+            thread = threading.Thread(target=self._work, name=f"generate-worker-{len(self._threads)}", daemon=True)
+            self._threads.append(thread)
+            thread.start()
+
+    def _next_job(self):
+        # Round-robin: take the first user's oldest job, then send the user to the back
+        user, queue = next(iter(self._queues.items()))
+        job = queue.popleft()
+        if queue:
+            self._queues.move_to_end(user)
+        else:
+            del self._queues[user]
+        self._queued -= 1
+        self._running += 1
+        return job
+
+    def _work(self):
+        while True:
+            with self._cond:
+                while not self._queues and not self._closed:
+                    self._cond.wait()
+                if self._closed:
+                    return
+                job = self._next_job()
+            metrics.GENERATE_QUEUE_SECONDS.observe(time.monotonic() - job.submitted)
+            job._set_status(RUNNING)
+            result, error = None, None
+            try:
+                result = job.fn(job.publish)
+            except Exception as e:
+                logger.warning("Generation job failed: %s", e)
+                error = e
+            with self._cond:
+                del self._jobs[job.key]
+                self._per_user[job.user] -= 1
+                if not self._per_user[job.user]:
+                    del self._per_user[job.user]
+                self._running -= 1
+            job._set_status(FAILED if error is not None else DONE, result, error)
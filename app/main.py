@@ -1,167 +1,29 @@
-import gradio as gr
-import pandas as pd
 import os
-from pathlib import Path
-from flashcard_generator import generate_flashcards
-
-def load_decks():
-    """Load all CSV files from data/ directory as flashcard decks"""
-    decks = {}
-    data_dir = Path("data")
-
-    if not data_dir.exists():
-        return {}
-
-    for file in data_dir.glob("*.csv"):
-        deck_name = file.stem
-        df = pd.read_csv(file)
-        if 'front' in df.columns and 'back' in df.columns:
-            decks[deck_name] = df[['front', 'back']].values.tolist()
-
-    return decks
-
-class FlashcardApp:
-    def __init__(self):
-        self.decks = load_decks()
-        self.current_card_index = 0
-        self.showing_front = True
-    
-    def get_deck_names(self):
-        return list(self.decks.keys())
-    
-    def load_card(self, deck_name):
-        # Ensure deck_name is a string, not a list
-        if isinstance(deck_name, list) and deck_name:
-            deck_name = deck_name[0]
-            
-        if not deck_name or deck_name not in self.decks:
-            return "<div class='card-container'>Please select a deck</div>", "0/0"
-        
-        self.current_card_index = 0
-        self.showing_front = True
-        current_deck = self.decks[deck_name]
-        
-        # Handle empty deck case
-        if len(current_deck) == 0:
-            return "<div class='card-container'>This deck is empty. Add cards in Create Mode.</div>", "0/0"
-            
-        return (f"<div class='card-container'>{current_deck[0][0]}</div>", 
-                f"{self.current_card_index + 1}/{len(current_deck)}")
-    
-    def flip_card(self, deck_name):
-        # Ensure deck_name is a string, not a list
-        if isinstance(deck_name, list) and deck_name:
-            deck_name = deck_name[0]
-            
-        if not deck_name or deck_name not in self.decks:
-            return "<div class='card-container'>Please select a deck</div>", "0/0"
-        
-        current_deck = self.decks[deck_name]
-        
-        # Handle empty deck case
-        if len(current_deck) == 0:
-            return "<div class='card-container'>This deck is empty. Add cards in Create Mode.</div>", "0/0"
-            
-        current_card = current_deck[self.current_card_index]
-        self.showing_front = not self.showing_front
-        
-        content = current_card[0] if self.showing_front else current_card[1]
-        return (f"<div class='card-container'>{content}</div>",
-                f"{self.current_card_index + 1}/{len(current_deck)}")
-    
-    def navigate_card(self, deck_name, direction):
-        # Ensure deck_name is a string, not a list
-        if isinstance(deck_name, list) and deck_name:
-            deck_name = deck_name[0]
-            
-        if not deck_name or deck_name not in self.decks:
-            return "<div class='card-container'>Please select a deck</div>", "0/0"
-        
-        current_deck = self.decks[deck_name]
-        
-        # Handle empty deck case
-        if len(current_deck) == 0:
-            return "<div class='card-container'>This deck is empty. Add cards in Create Mode.</div>", "0/0"
-            
-        if direction == "next":
-            self.current_card_index = (self.current_card_index + 1) % len(current_deck)
-        else:  # previous
-            self.current_card_index = (self.current_card_index - 1) % len(current_deck)
-        
-        self.showing_front = True
-        return (f"<div class='card-container'>{current_deck[self.current_card_index][0]}</div>",
-                f"{self.current_card_index + 1}/{len(current_deck)}")
-    
+import threading
+import gradio as gr
+import metrics
+from flashcard_app import DEFAULT_SESSION, FlashcardApp, StalePageError, card_rows, editor_rows, is_new_card
+from job_scheduler import QUEUED, QueueFullError
+from scheduler import GRADES
 
-def add_ai_cards_to_deck(prompt, current_deck_data):
-    """
-    Add AI-generated flashcards to the current deck
-    
-    Args:
-        prompt (str): User prompt for generating cards
-        current_deck_data (list): Current deck data as a list of lists
-    
-    Returns:
-        list: Updated deck data with new flashcards added
-    """
-    if not prompt:
-        return current_deck_data
-    
-    print(f"Current deck data: {current_deck_data}")
-    try:
-        # Convert existing cards to CSV string format
-        existing_cards_csv = None
-        if current_deck_data is not None and (
-            (isinstance(current_deck_data, pd.DataFrame) and not current_deck_data.empty) or
-            (not isinstance(current_deck_data, pd.DataFrame) and len(current_deck_data) > 0)
-        ):
-            existing_df = pd.DataFrame(current_deck_data, columns=['front', 'back'])
-            existing_cards_csv = existing_df.to_csv(index=False)
-        
-        # Generate flashcards with context from existing cards
-        new_cards_csv = generate_flashcards(prompt, existing_cards_csv)
+# Study handlers are cheap reads and can run many at once; generation has its
+# own, smaller pool of workers (GENERATE_CONCURRENCY in flashcard_app.py)
+STUDY_CONCURRENCY = int(os.getenv("FLASHCARD_STUDY_CONCURRENCY", 32))
 
-        # Convert CSV string to DataFrame
-        from io import StringIO
-        new_cards_df = pd.read_csv(StringIO(new_cards_csv))
-        
-        # Convert the generated cards to a list of lists
-        new_cards = new_cards_df.values.tolist()
-        
-        # Combine with existing cards - properly handle pandas DataFrame
-        if isinstance(current_deck_data, pd.DataFrame):
-            # If it's a DataFrame, convert to list of lists
-            updated_deck = current_deck_data.values.tolist()
-        else:
-            # Otherwise use what was provided, or an empty list
-            updated_deck = current_deck_data if current_deck_data is not None else []
-        
-        updated_deck.extend(new_cards)
-        
-        # Filter out rows where both front and back are empty or just whitespace
-        updated_deck = [card for card in updated_deck if 
-                       (isinstance(card[0], str) and card[0].strip()) or 
-                       (isinstance(card[1], str) and card[1].strip())]
-        
-        return updated_deck
-    
-    except pd.errors.ParserError as e:
-        # Handle CSV parsing errors
-        print(f"Error parsing CSV data: {e}")
-        return current_deck_data
-    
-    except (ValueError, TypeError) as e:
-        # Handle other conversion errors
-        print(f"Error processing flashcard data: {e}")
-        return current_deck_data
-    
-    except Exception as e:
-        # Catch any other unexpected errors
-        print(f"Unexpected error adding AI cards: {e}")
-        return current_deck_data
+def session_id(request):
+    """Key of the browser session behind a Gradio request"""
+    return getattr(request, "session_hash", None) or DEFAULT_SESSION
 
 def create_interface():
     app = FlashcardApp()
+    # Load decks in the background so the server can start listening right away;
+    # handlers that need them wait for the load. The deck lists are filled in on page load.
+    # The search index is built right after, so the first search does not pay for it
+    def load_in_background():
+        app.start_watching()
+        app.search_index()
+
+    threading.Thread(target=load_in_background, name="deck-loader", daemon=True).start()
     
     with gr.Blocks(css="""
         .card-container {
@@ -178,6 +40,20 @@ def create_interface():
             padding: 20px;
             color: #000000;
         }
+        .card-content pre, .card-content table {
+            text-align: left;
+            font-size: 16px;
+        }
+        .card-content pre {
+            overflow-x: auto;
+            background: #e8e8e8;
+            padding: 8px;
+            border-radius: 4px;
+        }
+        .card-content th, .card-content td {
+            border: 1px solid #ccc;
+            padding: 4px 8px;
+        }
     """) as interface:
         gr.Markdown("# Flashcard App")
         
@@ -185,7 +61,7 @@ def create_interface():
             with gr.Tab("Study Mode"):
                 with gr.Row():
                     deck_dropdown = gr.Dropdown(
-                        choices=app.get_deck_names(),
+                        choices=[],
                         label="Select Deck",
                         interactive=True
                     )
@@ -208,6 +84,9 @@ def create_interface():
                     flip_btn = gr.Button("Flip")
                     next_btn = gr.Button("Next")
 
+                with gr.Row():
+                    grade_btns = {grade: gr.Button(grade.capitalize()) for grade in GRADES}
+
             with gr.Tab("Create Mode"):
                 with gr.Row():
                     new_deck_name = gr.Textbox(
@@ -219,20 +98,29 @@ def create_interface():
 
                 with gr.Row():
                     create_deck_dropdown = gr.Dropdown(
-                        choices=app.get_deck_names(),
+                        choices=[],
                         label="Select Deck to Edit",
                         interactive=True
                     )
                     delete_deck_btn = gr.Button("Delete Deck", variant="stop")
                 
+                # Only one page of the deck is in the browser at a time. Rows are keyed by
+                # the id column; rows without an id are added at the end of the deck
                 deck_df = gr.Dataframe(
-                    headers=["front", "back"],
-                    datatype=["str", "str"],
+                    headers=["id", "front", "back"],
+                    datatype=["number", "str", "str"],
                     label="Edit Deck Content",
-                    col_count=(2, "fixed"),
+                    col_count=(3, "fixed"),
                     interactive=True,
                     value=[]
                 )
+                editor_page = gr.State(None)
+
+                with gr.Row():
+                    prev_page_btn = gr.Button("◀ Previous Page", scale=1)
+                    page_number = gr.Number(label="Page", value=1, precision=0, minimum=1, interactive=True, scale=1)
+                    next_page_btn = gr.Button("Next Page ▶", scale=1)
+                page_info = gr.Markdown("")
                 
                 save_btn = gr.Button("Save Changes")
                 
@@ -244,7 +132,28 @@ def create_interface():
                         placeholder="e.g., Add 3 flashcards about Python basics",
                         interactive=True
                     )
+                    card_count = gr.Number(
+                        label="Number of cards (optional)",
+                        value=None,
+                        precision=0,
+                        minimum=1,
+                        maximum=500,
+                        interactive=True
+                    )
                     generate_btn = gr.Button("Generate Cards")
+
+                generation_status = gr.Markdown("")
+
+                # New cards stay here until added, so the deck is never sent back with them
+                generated_df = gr.Dataframe(
+                    headers=["front", "back"],
+                    datatype=["str", "str"],
+                    label="Generated Cards",
+                    col_count=(2, "fixed"),
+                    interactive=True,
+                    value=[]
+                )
+                add_generated_btn = gr.Button("Add to Deck")
                 
                 gr.Markdown("""
                 Examples:
@@ -253,79 +162,172 @@ def create_interface():
                 - Create cards about science topics
                 """)
 
-        # Event handlers for Study Mode
+            with gr.Tab("Search"):
+                search_box = gr.Textbox(
+                    label="Search all decks",
+                    placeholder='e.g., photosynth* "cell membrane"',
+                    interactive=True
+                )
+                search_results = gr.Dataframe(
+                    headers=["deck", "front", "back"],
+                    datatype=["str", "str", "str"],
+                    label="Matching cards",
+                    col_count=(3, "fixed"),
+                    interactive=False,
+                    value=[]
+                )
+
+        # Event handlers for Study Mode. Each browser session keeps its own position,
+        # so these run concurrently in a shared "study" pool
+        def load_card(deck_name, request: gr.Request):
+            # Start each study session on the card that is due first
+            return app.next_due_card(deck_name, session_id(request))
+
         deck_dropdown.change(
-            fn=lambda x: app.load_card(x),
+            fn=metrics.instrument_handler("load_card", load_card),
             inputs=[deck_dropdown],
-            outputs=[card_text, card_counter]
+            outputs=[card_text, card_counter],
+            concurrency_limit=STUDY_CONCURRENCY,
+            concurrency_id="study"
         )
         
-        def refresh_decks(current_deck):
-            app.decks = load_decks()
+        def refresh_decks(current_deck, request: gr.Request):
+            app.refresh()
             deck_names = app.get_deck_names()
             
             selected_deck = current_deck if current_deck in deck_names else None
-            card_content, counter = app.load_card(selected_deck) if selected_deck else ("<div class='card-container'>Select a deck to begin</div>", "0/0")
+            card_content, counter = app.load_card(selected_deck, session_id(request)) if selected_deck else ("<div class='card-container'>Select a deck to begin</div>", "0/0")
             
-            return deck_names, selected_deck, card_content, counter
+            return gr.Dropdown(choices=deck_names, value=selected_deck), card_content, counter
 
         refresh_btn.click(
-            fn=refresh_decks,
+            fn=metrics.instrument_handler("refresh_decks", refresh_decks),
             inputs=[deck_dropdown],
             outputs=[deck_dropdown, card_text, card_counter]
         )
         
-        flip_btn.click(
-            fn=lambda x: app.flip_card(x),
-            inputs=[deck_dropdown],
-            outputs=[card_text, card_counter]
-        )
-        
-        prev_btn.click(
-            fn=lambda x: app.navigate_card(x, "prev"),
-            inputs=[deck_dropdown],
-            outputs=[card_text, card_counter]
-        )
-        
-        next_btn.click(
-            fn=lambda x: app.navigate_card(x, "next"),
-            inputs=[deck_dropdown],
-            outputs=[card_text, card_counter]
+        def flip_card(deck_name, request: gr.Request):
+            return app.flip_card(deck_name, session_id(request))
+
+        def prev_card(deck_name, request: gr.Request):
+            return app.navigate_card(deck_name, "prev", session_id(request))
+
+        def next_card(deck_name, request: gr.Request):
+            return app.navigate_card(deck_name, "next", session_id(request))
+
+        for button, handler in ((flip_btn, flip_card), (prev_btn, prev_card), (next_btn, next_card)):
+            button.click(
+                fn=metrics.instrument_handler(handler.__name__, handler),
+                inputs=[deck_dropdown],
+                outputs=[card_text, card_counter],
+                concurrency_limit=STUDY_CONCURRENCY,
+                concurrency_id="study"
+            )
+
+        # Again/Hard/Good/Easy grade the card on screen and show the next due one
+        def grade_handler(grade):
+            def grade_card(deck_name, request: gr.Request):
+                return app.grade_card(deck_name, grade, session_id(request))
+            return grade_card
+
+        for grade, button in grade_btns.items():
+            button.click(
+                fn=metrics.instrument_handler(f"grade_{grade}", grade_handler(grade)),
+                inputs=[deck_dropdown],
+                outputs=[card_text, card_counter],
+                concurrency_limit=STUDY_CONCURRENCY,
+                concurrency_id="study"
+            )
+
+        # Search runs on every keystroke; the index answers in milliseconds
+        def search_cards(query):
+            if not query or not query.strip():
+                return gr.Dataframe(value=[])
+            return gr.Dataframe(value=app.search(query))
+
+        search_box.change(
+            fn=metrics.instrument_handler("search_cards", search_cards),
+            inputs=[search_box],
+            outputs=[search_results],
+            show_progress="hidden",
+            concurrency_limit=STUDY_CONCURRENCY,
+            concurrency_id="study"
         )
 
-        # Event handlers for Create Mode
-        def load_deck_for_editing(deck_name):
+        # Event handlers for Create Mode. The editor shows one page of a deck at a time
+        # and keeps the page as read in a State, so saves send only that page back
+        def show_page(page, message=""):
+            if page is None:
+                return gr.Dataframe(value=[]), None, message, 1
+            info = f"Page {page.number} of {page.pages} · cards {page.start + 1 if page.total else 0}-{page.start + len(page.ids)} of {page.total}"
+            return gr.Dataframe(value=page.rows()), page, f"{message} {info}".strip(), page.number
+
+        def load_deck_for_editing(deck_name, number=1):
             # Ensure deck_name is a string, not a list
             if isinstance(deck_name, list) and deck_name:
                 deck_name = deck_name[0]
-            
-            if not deck_name or deck_name not in app.decks:
-                return gr.Dataframe(value=[["", ""]])
-            
-            deck_data = app.decks[deck_name]
-            # Convert the deck data to a list of lists for the dataframe
-            df_data = [[card[0], card[1]] for card in deck_data]
-            return gr.Dataframe(value=df_data)
+            if not deck_name:
+                return show_page(None)
+            return show_page(app.deck_page(deck_name, number))
+
+        def prev_page(deck_name, page):
+            return load_deck_for_editing(deck_name, page.number - 1 if page else 1)
+
+        def next_page(deck_name, page):
+            return load_deck_for_editing(deck_name, page.number + 1 if page else 1)
+
+        page_outputs = [deck_df, editor_page, page_info, page_number]
+        for event, handler, inputs in ((create_deck_dropdown.change, load_deck_for_editing, [create_deck_dropdown]),
+                                       (page_number.submit, load_deck_for_editing, [create_deck_dropdown, page_number]),
+                                       (prev_page_btn.click, prev_page, [create_deck_dropdown, editor_page]),
+                                       (next_page_btn.click, next_page, [create_deck_dropdown, editor_page])):
+            event(
+                fn=metrics.instrument_handler(handler.__name__, handler),
+                inputs=inputs,
+                outputs=page_outputs,
+                concurrency_limit=STUDY_CONCURRENCY,
+                concurrency_id="study"
+            )
 
-        def save_deck_changes(deck_name, data):
+        def save_deck_changes(deck_name, data, page):
             if not deck_name:
-                return gr.Dropdown(choices=app.get_deck_names()), gr.Dropdown(choices=app.get_deck_names())
-            
-            updated_deck = add_ai_cards_to_deck(ai_prompt, data)  # Add this line to include the generated flashcards
+                return (gr.Dropdown(choices=app.get_deck_names()), gr.Dropdown(choices=app.get_deck_names()),
+                        *show_page(page))
 
-            df = pd.DataFrame(updated_deck, columns=['front', 'back'])  # Use the updated_deck instead of data
-            os.makedirs('data', exist_ok=True)
-            df.to_csv(f'data/{deck_name}.csv', index=False)
+            try:
+                app.save_page(deck_name, page, editor_rows(data))
+            except StalePageError:
+                # Row ids in CSV decks are positions, so edits to an old page could hit other cards
+                new_choices = app.get_deck_names()
+                return (gr.Dropdown(choices=new_choices, value=deck_name), gr.Dropdown(choices=new_choices, value=deck_name),
+                        *show_page(app.deck_page(deck_name, page.number),
+                                   "The deck changed since this page was loaded; reloaded it, please redo your edits."))
 
-            # Reload decks and update dropdowns
-            app.decks = load_decks()
             new_choices = app.get_deck_names()
-            return gr.Dropdown(choices=new_choices, value=deck_name), gr.Dropdown(choices=new_choices, value=deck_name)
+            return (gr.Dropdown(choices=new_choices, value=deck_name), gr.Dropdown(choices=new_choices, value=deck_name),
+                    *show_page(app.deck_page(deck_name, page.number if page and page.deck_name == deck_name else None),
+                               "Saved."))
 
         save_btn.click(
-            fn=save_deck_changes,
-            inputs=[create_deck_dropdown, deck_df],
-            outputs=[deck_dropdown, create_deck_dropdown]
+            fn=metrics.instrument_handler("save_deck", save_deck_changes),
+            inputs=[create_deck_dropdown, deck_df, editor_page],
+            outputs=[deck_dropdown, create_deck_dropdown, *page_outputs]
+        )
+
+        def add_generated(deck_name, data):
+            rows = card_rows(data)
+            if not deck_name or not rows:
+                return (gr.Dataframe(value=[list(card) for card in rows]),
+                        *show_page(app.deck_page(deck_name) if deck_name else None, "Select a deck to add the cards to."
+                                   if rows else ""))
+            app.append_cards(deck_name, rows)
+            # New cards are at the end of the deck: show the last page
+            return gr.Dataframe(value=[]), *show_page(app.deck_page(deck_name, None), f"Added {len(rows)} cards.")
+
+        add_generated_btn.click(
+            fn=metrics.instrument_handler("add_generated", add_generated),
+            inputs=[create_deck_dropdown, generated_df],
+            outputs=[generated_df, *page_outputs]
         )
 
         # Additional event handlers for Create Mode
@@ -333,61 +335,138 @@ def create_interface():
             if not deck_name:
                 return gr.Dropdown(choices=app.get_deck_names()), gr.Dropdown(choices=app.get_deck_names()), ""
             
-            # Create empty CSV file
-            df = pd.DataFrame(columns=['front', 'back'])
-            os.makedirs('data', exist_ok=True)
-            df.to_csv(f'data/{deck_name}.csv', index=False)
-            
-            # Reload decks and update dropdowns
-            app.decks = load_decks()
+            # Create an empty deck
+            app.storage.create_deck(deck_name)
+            app.catalog.invalidate(deck_name)
             new_choices = app.get_deck_names()
             return gr.Dropdown(choices=new_choices, value=deck_name), gr.Dropdown(choices=new_choices, value=deck_name), ""
 
         def delete_deck(deck_name):
             if not deck_name:
-                return gr.Dropdown(choices=app.get_deck_names()), gr.Dropdown(choices=app.get_deck_names()), []
+                return gr.Dropdown(choices=app.get_deck_names()), gr.Dropdown(choices=app.get_deck_names()), *show_page(None)
             
-            # Delete the CSV file
-            try:
-                os.remove(f'data/{deck_name}.csv')
-            except FileNotFoundError:
-                pass
-            
-            # Reload decks and update dropdowns
-            app.decks = load_decks()
+            app.delete_deck(deck_name)
             new_choices = app.get_deck_names()
-            return gr.Dropdown(choices=new_choices), gr.Dropdown(choices=new_choices), []
+            return gr.Dropdown(choices=new_choices), gr.Dropdown(choices=new_choices), *show_page(None)
 
         create_deck_btn.click(
-            fn=create_new_deck,
+            fn=metrics.instrument_handler("create_deck", create_new_deck),
             inputs=[new_deck_name],
             outputs=[deck_dropdown, create_deck_dropdown, new_deck_name]
         )
 
         delete_deck_btn.click(
-            fn=delete_deck,
+            fn=metrics.instrument_handler("delete_deck", delete_deck),
             inputs=[create_deck_dropdown],
-            outputs=[deck_dropdown, create_deck_dropdown, deck_df]
+            outputs=[deck_dropdown, create_deck_dropdown, *page_outputs]
         )
 
-        # AI flashcard generation handler
-        def generate_ai_cards(prompt, deck_data):
-            # Handle empty dataframe case
-            if deck_data is None or len(deck_data) == 0:
-                # Initialize with empty list but proper structure for pandas
-                deck_data = []
-            
-            updated_deck = add_ai_cards_to_deck(prompt, deck_data)
-            return gr.Dataframe(value=updated_deck), ""
+        # Push the deck list to every open page whenever the catalog changes,
+        # so decks saved from another tab or added on disk show up without Refresh
+        deck_list_version = gr.State(-1)
+        deck_list_timer = gr.Timer(2.0)
+
+        def push_deck_choices(seen_version, study_deck, edit_deck):
+            if seen_version == app.catalog.version:
+                return seen_version, gr.update(), gr.update()
+            deck_names = app.get_deck_names()
+            return (app.catalog.version,
+                    gr.Dropdown(choices=deck_names, value=study_deck if study_deck in deck_names else None),
+                    gr.Dropdown(choices=deck_names, value=edit_deck if edit_deck in deck_names else None))
+
+        deck_list_timer.tick(
+            fn=metrics.instrument_handler("push_deck_choices", push_deck_choices),
+            inputs=[deck_list_version, deck_dropdown, create_deck_dropdown],
+            outputs=[deck_list_version, deck_dropdown, create_deck_dropdown],
+            show_progress="hidden",
+            # Every open tab polls; this only reads the catalog, so it shares the study pool
+            concurrency_limit=STUDY_CONCURRENCY,
+            concurrency_id="study"
+        )
+
+        # Fill the deck lists as soon as a page opens instead of waiting for the first tick
+        interface.load(
+            fn=metrics.instrument_handler("push_deck_choices", push_deck_choices),
+            inputs=[deck_list_version, deck_dropdown, create_deck_dropdown],
+            outputs=[deck_list_version, deck_dropdown, create_deck_dropdown],
+            show_progress="hidden",
+            concurrency_limit=STUDY_CONCURRENCY,
+            concurrency_id="study"
+        )
+
+        # AI flashcard generation handler, streams each new card into the generated table as it arrives.
+        # Generations go through the app's job scheduler, which shows the place in
+        # line while waiting and shares one upstream call between identical requests.
+        # The deck's cards are read server-side, so the browser sends only the prompt
+        def generate_ai_cards(prompt, deck_name, count, request: gr.Request):
+            generated = []
+            if not prompt:
+                yield gr.Dataframe(value=generated), "", ""
+                return
+
+            deck_name = deck_name if isinstance(deck_name, str) and deck_name in app.catalog else None
+            dedup_index = app.dedup_index(deck_name) if deck_name else None
+            count = int(count) if count else None
+            try:
+                job = app.submit_generation(prompt, deck_name, count, session_id(request))
+            except QueueFullError as e:
+                # Keep the prompt so it can be sent again once there is room
+                yield gr.Dataframe(value=generated), prompt, f"Too busy to generate right now ({e}). Please try again shortly."
+                return
+
+            from dedup_index import DedupIndex
+
+            streamed = DedupIndex()
+            try:
+                for update in job.follow():
+                    if update.status == QUEUED:
+                        yield gr.Dataframe(value=generated), "", f"Queued, position {update.position}"
+                        continue
+                    for card in update.items:
+                        if is_new_card(card, dedup_index, streamed):
+                            generated.append([card.front, card.back])
+                    yield gr.Dataframe(value=generated), "", f"Generating... {len(streamed)} new cards"
+            except Exception as e:
+                # Keep whatever arrived before the generation failed
+                print(f"Unexpected error generating AI cards: {e}")
+                yield gr.Dataframe(value=generated), "", f"Generation failed after {len(streamed)} cards"
+                return
+
+            yield gr.Dataframe(value=generated), "", f"Generated {len(streamed)} new cards; review them and click Add to Deck"
         
         generate_btn.click(
-            fn=generate_ai_cards,
-            inputs=[ai_prompt, deck_df],
-            outputs=[deck_df, ai_prompt]
+            fn=metrics.instrument_handler("generate_ai_cards", generate_ai_cards),
+            inputs=[ai_prompt, create_deck_dropdown, card_count],
+            outputs=[generated_df, ai_prompt, generation_status],
+            # Handlers only wait on the job scheduler, which bounds upstream calls and the queue itself
+            concurrency_limit=None
         )
     
+    # Only the study handlers and the deck list polling raise their limit; writes
+    # (save, add, create, delete, refresh) keep Gradio's default of one at a time per event
+    interface.queue()
     return interface
 
+def serve_with_metrics(interface):
+    """Serve the interface with a Prometheus-text /metrics route mounted next to it"""
+    import uvicorn
+    from fastapi import FastAPI
+    from fastapi.responses import PlainTextResponse
+
+    server = FastAPI()
+
+    @server.get("/metrics")
+    def metrics_endpoint():
+        return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
+
+    server = gr.mount_gradio_app(server, interface, path="/")
+    uvicorn.run(server, host=os.getenv("GRADIO_SERVER_NAME", "127.0.0.1"),
+                port=int(os.getenv("GRADIO_SERVER_PORT", 7860)))
+
 if __name__ == "__main__":
+    metrics.configure_logging()
     interface = create_interface()
-    interface.launch()
\ No newline at end of file
+    if metrics.ENABLED:
+        serve_with_metrics(interface)
+    else:
+        interface.launch()
\ No newline at end of file
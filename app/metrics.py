@@ -0,0 +1,297 @@
+import functools
+import inspect
+import json
+import logging
+import os
+import threading
+import time
+from bisect import bisect_left
+
+# Collection is off unless FLASHCARD_METRICS is set; when off every
+# instrumentation call returns after a single attribute check
+ENABLED = os.getenv("FLASHCARD_METRICS", "").lower() in ("1", "true", "yes")
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+logger = logging.getLogger("flashcards.metrics")
+
+# Set by configure_logging(json_logs=True): every observed timing is also logged as an event
+_log_events = False
+
+
+class _NoopTimer:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NOOP_TIMER = _NoopTimer()
+
+
+def _label_key(labels):
+    return tuple(sorted(labels.items()))
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(key, extra=()):
+    pairs = list(key) + list(extra)
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in pairs) + "}"
+
+
+def _format_value(value):
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    """Monotonic counter, one value per label set"""
+
+    def __init__(self, name, documentation):
+        self.name = name
+        self.documentation = documentation
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1, **labels):
+        if not ENABLED:
+            return
+        key = _label_key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels):
+        with self._lock:
+            return self._values.get(_label_key(labels), 0)
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            for key, value in sorted(self._values.items()):
+                lines.append(f"{self.name}{_format_labels(key)} {_format_value(value)}")
+        return lines
+
+    def clear(self):
+        with self._lock:
+            self._values.clear()
+
+
+class _HistogramTimer:
+    __slots__ = ("histogram", "labels", "start")
+
+    def __init__(self, histogram, labels):
+        self.histogram = histogram
+        self.labels = labels
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        labels = self.labels
+        if exc_type is not None:
+            labels = dict(labels, outcome="error")
+        self.histogram.observe(time.perf_counter() - self.start, **labels)
+        return False
+
+
+class Histogram:
+    """Cumulative-bucket histogram of durations in seconds, one series per label set"""
+
+    def __init__(self, name, documentation, buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.buckets = tuple(sorted(buckets))
+        self._series = {}  # label key -> [bucket counts..., sum, count]
+        self._lock = threading.Lock()
+
+    def observe(self, value, **labels):
+        if not ENABLED:
+            return
+        key = _label_key(labels)
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [0] * (len(self.buckets) + 1) + [0.0, 0]
+            series[index] += 1
+            series[-2] += value
+            series[-1] += 1
+        if _log_events:
+            logger.info("%s %.4fs", self.name, value, extra={"metric": self.name, "seconds": value, **labels})
+
+    def time(self, **labels):
+        """Context manager observing the duration of its block; exceptions add outcome="error" """
+        if not ENABLED:
+            return _NOOP_TIMER
+        return _HistogramTimer(self, labels)
+
+    def count(self, **labels):
+        with self._lock:
+            series = self._series.get(_label_key(labels))
+            return series[-1] if series else 0
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            for key, series in sorted(self._series.items()):
+                cumulative = 0
+                for bound, count in zip(self.buckets + (float("inf"),), series):
+                    cumulative += count
+                    lines.append(f"{self.name}_bucket{_format_labels(key, [('le', _format_value(bound))])} "
+                                 f"{cumulative}")
+                lines.append(f"{self.name}_sum{_format_labels(key)} {_format_value(series[-2])}")
+                lines.append(f"{self.name}_count{_format_labels(key)} {series[-1]}")
+        return lines
+
+    def clear(self):
+        with self._lock:
+            self._series.clear()
+
+
+_registry = []
+
+
+def counter(name, documentation):
+    metric = Counter(name, documentation)
+    _registry.append(metric)
+    return metric
+
+
+def histogram(name, documentation, buckets=DEFAULT_BUCKETS):
+    metric = Histogram(name, documentation, buckets)
+    _registry.append(metric)
+    return metric
+
+
+def render():
+    """All metrics in the Prometheus text exposition format"""
+    lines = []
+    for metric in _registry:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+
+def enable(enabled=True):
+    """Turn collection on or off at runtime (tests, or an app that decides after import)"""
+    global ENABLED
+    ENABLED = enabled
+
+
+def reset():
+    for metric in _registry:
+        metric.clear()
+
+
+def instrument_handler(name, fn):
+    """
+    Wrap a Gradio event handler so its latency and errors are recorded.
+
+    Generator handlers are timed from the first call until they finish
+    streaming. The wrapper keeps the handler's signature for Gradio.
+    """
+    if inspect.isgeneratorfunction(fn):
+        @functools.wraps(fn)
+        def generator_wrapper(*args, **kwargs):
+            if not ENABLED:
+                yield from fn(*args, **kwargs)
+                return
+            try:
+                with HANDLER_SECONDS.time(handler=name):
+                    yield from fn(*args, **kwargs)
+            except Exception:
+                HANDLER_ERRORS.inc(handler=name)
+                raise
+        return generator_wrapper
+
+    @functools.wraps(fn)
+    def wrapper(*args, **kwargs):
+        if not ENABLED:
+            return fn(*args, **kwargs)
+        try:
+            with HANDLER_SECONDS.time(handler=name):
+                return fn(*args, **kwargs)
+        except Exception:
+            HANDLER_ERRORS.inc(handler=name)
+            raise
+    return wrapper
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per log record, including any `extra` fields"""
+
+    _reserved = set(vars(logging.LogRecord("", 0, "", 0, "", (), None))) | {"message", "asctime"}
+
+    def format(self, record):
+        entry = {
+            "time": self.formatTime(record, "%Y-%m-%dT%H:%M:%S"),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        entry.update((key, value) for key, value in vars(record).items() if key not in self._reserved)
+        if record.exc_info:
+            entry["exception"] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+
+def configure_logging(json_logs=None, level=None):
+    """
+    Set up the root logger, as JSON lines when $FLASHCARD_LOG_JSON is set.
+
+    Args:
+        json_logs (bool, optional): Overrides $FLASHCARD_LOG_JSON
+        level (str, optional): Overrides $FLASHCARD_LOG_LEVEL (default WARNING, INFO with JSON logs)
+    """
+    global _log_events
+    if json_logs is None:
+        json_logs = os.getenv("FLASHCARD_LOG_JSON", "").lower() in ("1", "true", "yes")
+    level = level or os.getenv("FLASHCARD_LOG_LEVEL", "INFO" if json_logs else "WARNING")
+    handler = logging.StreamHandler()
+    if json_logs:
+        handler.setFormatter(JsonFormatter())
+    root = logging.getLogger()
+    root.handlers[:] = [handler]
+    root.setLevel(level)
+    _log_events = json_logs
+
+
+# Metrics of the app's hot paths
+GENERATE_SECONDS = histogram(
+    "flashcards_generate_seconds", "End-to-end card generation time by mode and cache result")
+UPSTREAM_SECONDS = histogram(
+    "flashcards_upstream_seconds", "Time spent waiting on the chat completions API by mode")
+PARSE_SECONDS = histogram(
+    "flashcards_parse_seconds", "Time spent parsing completions into cards",
+    buckets=(0.0001, 0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0))
+GENERATE_ERRORS = counter("flashcards_generate_errors_total", "Failed generation requests by mode")
+CARDS_GENERATED = counter("flashcards_cards_generated_total", "Cards returned by the model")
+FANOUT_REQUESTS = counter(
+    "flashcards_fanout_requests_total", "Sub-requests of large generations, by kind (plan, shard or top_up)")
+PROMPT_TOKENS = histogram(
+    "flashcards_prompt_tokens", "Estimated prompt tokens per request, by part (total or examples)",
+    buckets=(100, 250, 500, 1000, 1500, 2000, 4000, 8000, 16000))
+TOKENS = counter("flashcards_tokens_total", "Tokens reported by the API, by kind (prompt or completion)")
+ADD_CARDS_SECONDS = histogram(
+    "flashcards_add_cards_seconds", "Time of each stage of adding AI cards to a deck (generate, dedup, merge)")
+DECK_IO_SECONDS = histogram(
+    "flashcards_deck_io_seconds", "Deck storage operations (load_decks, load_deck, save_deck)")
+CLIENT_RETRIES = counter("flashcards_client_retries_total", "OpenAI requests retried, by status or error type")
+CLIENT_HEDGES = counter("flashcards_client_hedges_total", "Hedged duplicate requests sent after a slow first attempt")
+CLIENT_BREAKER_REJECTIONS = counter(
+    "flashcards_client_breaker_rejections_total", "Requests refused while the circuit breaker was open")
+GENERATE_JOBS = counter(
+    "flashcards_generate_jobs_total", "Generation requests by outcome (queued, coalesced or rejected)")
+GENERATE_QUEUE_SECONDS = histogram(
+    "flashcards_generate_queue_seconds", "Time generation jobs waited for a worker")
+RENDER_CACHE = counter(
+    "flashcards_render_cache_total", "Card sides served from the render cache, by result (hit, miss or prefetch)")
+HANDLER_SECONDS = histogram("flashcards_handler_seconds", "Gradio event handler latency")
+HANDLER_ERRORS = counter("flashcards_handler_errors_total", "Gradio event handlers that raised")
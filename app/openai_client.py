@@ -0,0 +1,408 @@
+import asyncio
+import email.utils
+import os
+import random
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import NamedTuple
+
+from openai import (
+    DEFAULT_CONNECTION_LIMITS,
+    APIConnectionError,
+    APIStatusError,
+    AsyncOpenAI,
+    DefaultAsyncHttpxClient,
+    DefaultHttpxClient,
+    OpenAI,
+    OpenAIError,
+    Timeout,
+)
+
+import metrics
+
+# The openai package re-exports httpx's connection defaults; reuse their type
+# for our limits instead of depending on httpx directly
+Limits = type(DEFAULT_CONNECTION_LIMITS)
+
+RETRY_STATUSES = {408, 409, 429, 500, 502, 503, 504}
+
+# Never wait longer than this for a single Retry-After
+MAX_RETRY_AFTER = 60.0
+
+
+def _env_float(name, default):
+    return float(os.getenv(name, default))
+
+
+class ClientConfig(NamedTuple):
+    connect_timeout: float = 5.0
+    read_timeout: float = 60.0
+    write_timeout: float = 30.0
+    pool_timeout: float = 10.0
+    max_connections: int = 20
+    max_keepalive_connections: int = 10
+    keepalive_expiry: float = 30.0
+    max_retries: int = 3
+    backoff_base: float = 0.5
+    backoff_max: float = 8.0
+    breaker_failures: int = 5  # consecutive failures that open the circuit
+    breaker_reset: float = 30.0  # seconds before a trial request is let through
+    hedge: bool = False
+    hedge_quantile: float = 0.95
+    hedge_min_samples: int = 20
+
+    @classmethod
+    def from_env(cls):
+        """Read overrides from FLASHCARD_OPENAI_* environment variables"""
+        return cls(
+            connect_timeout=_env_float("FLASHCARD_OPENAI_CONNECT_TIMEOUT", cls._field_defaults["connect_timeout"]),
+            read_timeout=_env_float("FLASHCARD_OPENAI_READ_TIMEOUT", cls._field_defaults["read_timeout"]),
+            write_timeout=_env_float("FLASHCARD_OPENAI_WRITE_TIMEOUT", cls._field_defaults["write_timeout"]),
+            pool_timeout=_env_float("FLASHCARD_OPENAI_POOL_TIMEOUT", cls._field_defaults["pool_timeout"]),
+            max_connections=int(os.getenv("FLASHCARD_OPENAI_MAX_CONNECTIONS", cls._field_defaults["max_connections"])),
+            max_keepalive_connections=int(os.getenv("FLASHCARD_OPENAI_MAX_KEEPALIVE",
+                                                    cls._field_defaults["max_keepalive_connections"])),
+            keepalive_expiry=_env_float("FLASHCARD_OPENAI_KEEPALIVE_EXPIRY", cls._field_defaults["keepalive_expiry"]),
+            max_retries=int(os.getenv("FLASHCARD_OPENAI_MAX_RETRIES", cls._field_defaults["max_retries"])),
+            breaker_failures=int(os.getenv("FLASHCARD_OPENAI_BREAKER_FAILURES",
+                                           cls._field_defaults["breaker_failures"])),
+            breaker_reset=_env_float("FLASHCARD_OPENAI_BREAKER_RESET", cls._field_defaults["breaker_reset"]),
+            hedge=os.getenv("FLASHCARD_OPENAI_HEDGE", "").lower() in ("1", "true", "yes"),
+        )
+
+    def timeout(self):
+        return Timeout(connect=self.connect_timeout, read=self.read_timeout, write=self.write_timeout,
+                       pool=self.pool_timeout)
+
+    def limits(self):
+        return Limits(max_connections=self.max_connections,
+                      max_keepalive_connections=self.max_keepalive_connections,
+                      keepalive_expiry=self.keepalive_expiry)
+
+
+class CircuitOpenError(OpenAIError):
+    """Raised without calling the API while the circuit breaker is open"""
+
+
+class CircuitBreaker:
+    """
+    Stop calling a failing upstream for a while.
+
+    After `failures` consecutive failed requests (each after its own
+    retries) the circuit opens and requests fail fast. Once `reset_timeout`
+    has passed a single trial request is let through; its success closes the
+    circuit, its failure re-opens it.
+    """
+
+    def __init__(self, failures=5, reset_timeout=30.0, clock=time.monotonic):
+        self.failures = failures
+        self.reset_timeout = reset_timeout
+        self._clock = clock
+        self._consecutive = 0
+        self._opened_at = None
+        self._trial_in_flight = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self):
+        with self._lock:
+            if self._opened_at is None:
+                return "closed"
+            if self._clock() - self._opened_at >= self.reset_timeout:
+                return "half-open"
+            return "open"
+
+    def before_request(self):
+        """
+        Raise CircuitOpenError unless a request may be sent now.
+
+        Returns:
+            bool: True if the request is the half-open trial; the caller must call end_trial when it is over
+        """
+        with self._lock:
+            if self._opened_at is None:
+                return False
+            if self._clock() - self._opened_at >= self.reset_timeout and not self._trial_in_flight:
+                self._trial_in_flight = True
+                return True
+        metrics.CLIENT_BREAKER_REJECTIONS.inc()
+        raise CircuitOpenError("OpenAI circuit breaker is open; not sending the request")
+
+    def end_trial(self):
+        """Let another trial through, even if this one never recorded a result (e.g. it was cancelled)"""
+        with self._lock:
+            self._trial_in_flight = False
+
+    def record_success(self):
+        with self._lock:
+            self._consecutive = 0
+            self._opened_at = None
+            self._trial_in_flight = False
+
+    def record_failure(self):
+        with self._lock:
+            self._consecutive += 1
+            if self._trial_in_flight or self._consecutive >= self.failures:
+                self._opened_at = self._clock()
+            self._trial_in_flight = False
+
+
+class LatencyTracker:
+    """Recent successful request latencies, for choosing the hedge delay"""
+
+    def __init__(self, window=200):
+        self._samples = deque(maxlen=window)
+        self._lock = threading.Lock()
+
+    def add(self, seconds):
+        with self._lock:
+            self._samples.append(seconds)
+
+    def quantile(self, q, min_samples=1):
+        with self._lock:
+            if len(self._samples) < min_samples:
+                return None
+            ordered = sorted(self._samples)
+        return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+def is_retryable(error):
+    if isinstance(error, APIStatusError):
+        return error.status_code in RETRY_STATUSES
+    # Connection errors and timeouts
+    return isinstance(error, APIConnectionError)
+
+
+def retry_after(error):
+    """Seconds the server asked us to wait, from Retry-After(-ms), or None"""
+    response = getattr(error, "response", None)
+    if response is None:
+        return None
+    headers = response.headers
+    value = headers.get("retry-after-ms")
+    if value is not None:
+        try:
+            return float(value) / 1000
+        except ValueError:
+            pass
+    value = headers.get("retry-after")
+    if value is None:
+        return None
+    try:
+        return float(value)
+    except ValueError:
+        pass
+    try:
+        parsed = email.utils.parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    return max(0.0, parsed.timestamp() - time.time())
+
+
+def backoff_delay(config, attempt, error):
+    """Retry-After if the server sent one, otherwise full-jitter exponential backoff"""
+    delay = retry_after(error)
+    if delay is not None:
+        return min(delay, MAX_RETRY_AFTER)
+    return random.uniform(0, min(config.backoff_max, config.backoff_base * 2 ** attempt))
+
+
+class _Namespace:
+    def __init__(self, **attrs):
+        self.__dict__.update(attrs)
+
+
+class ResilientClient:
+    """
+    OpenAI client wrapper adding retries, a circuit breaker and hedged requests.
+
+    Exposes `chat.completions.create` like the SDK client, so callers do not
+    change. The SDK's own retries are turned off so every retry goes through
+    the backoff and breaker here.
+    """
+
+    def __init__(self, client, config=None, breaker=None, tracker=None):
+        self.client = client
+        self.config = config or ClientConfig()
+        self.breaker = breaker or CircuitBreaker(self.config.breaker_failures, self.config.breaker_reset)
+        self.tracker = tracker or LatencyTracker()
+        self._hedge_pool = None
+        self._hedge_lock = threading.Lock()
+        self.chat = _Namespace(completions=_Namespace(create=self.create))
+
+    def _send(self, kwargs):
+        start = time.perf_counter()
+        response = self.client.chat.completions.create(**kwargs)
+        if not kwargs.get("stream"):
+            self.tracker.add(time.perf_counter() - start)
+        return response
+
+    def _hedge_delay(self, kwargs):
+        if not self.config.hedge or kwargs.get("stream"):
+            return None
+        return self.tracker.quantile(self.config.hedge_quantile, self.config.hedge_min_samples)
+
+    def _send_hedged(self, kwargs, delay):
+        with self._hedge_lock:
+            if self._hedge_pool is None:
+                self._hedge_pool = ThreadPoolExecutor(thread_name_prefix="openai-hedge")
+        primary = self._hedge_pool.submit(self._send, kwargs)
+        done, _ = wait([primary], timeout=delay)
+        if done:
+            return primary.result()
+        # The first request is slower than usual: race a second copy against it.
+        # A sync request cannot be cancelled, so the loser finishes in the background.
+        metrics.CLIENT_HEDGES.inc()
+        futures = {primary, self._hedge_pool.submit(self._send, kwargs)}
+        error = None
+        while futures:
+            done, futures = wait(futures, return_when=FIRST_COMPLETED)
+            for future in done:
+                if future.exception() is None:
+                    return future.result()
+                error = future.exception()
+        raise error
+
+    def create(self, **kwargs):
+        # The breaker sees one result per request, not per attempt, so a single
+        # request exhausting its retries does not open the circuit for everyone
+        trial = self.breaker.before_request()
+        try:
+            attempt = 0
+            while True:
+                try:
+                    delay = self._hedge_delay(kwargs)
+                    response = self._send(kwargs) if delay is None else self._send_hedged(kwargs, delay)
+                except Exception as e:
+                    if not is_retryable(e):
+                        # The upstream answered, so it counts as healthy for the breaker
+                        self.breaker.record_success()
+                        raise
+                    if attempt >= self.config.max_retries:
+                        self.breaker.record_failure()
+                        raise
+                    metrics.CLIENT_RETRIES.inc(reason=str(getattr(e, "status_code", None) or type(e).__name__))
+                    time.sleep(backoff_delay(self.config, attempt, e))
+                    attempt += 1
+                    continue
+                self.breaker.record_success()
+                return response
+        finally:
+            if trial:
+                # A trial cut short by KeyboardInterrupt must not leave the circuit stuck open
+                self.breaker.end_trial()
+
+    def close(self):
+        if self._hedge_pool is not None:
+            self._hedge_pool.shutdown(wait=False)
+        self.client.close()
+
+
+class AsyncResilientClient(ResilientClient):
+    """Async version of ResilientClient; a losing hedged request is cancelled"""
+
+    async def _send(self, kwargs):
+        start = time.perf_counter()
+        response = await self.client.chat.completions.create(**kwargs)
+        if not kwargs.get("stream"):
+            self.tracker.add(time.perf_counter() - start)
+        return response
+
+    async def _send_hedged(self, kwargs, delay):
+        primary = asyncio.ensure_future(self._send(kwargs))
+        done, _ = await asyncio.wait([primary], timeout=delay)
+        if done:
+            return primary.result()
+        metrics.CLIENT_HEDGES.inc()
+        pending = {primary, asyncio.ensure_future(self._send(kwargs))}
+        error = None
+        try:
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        return task.result()
+                    error = task.exception()
+            raise error
+        finally:
+            for task in pending:
+                task.cancel()
+
+    async def create(self, **kwargs):
+        trial = self.breaker.before_request()
+        try:
+            attempt = 0
+            while True:
+                try:
+                    delay = self._hedge_delay(kwargs)
+                    if delay is None:
+                        response = await self._send(kwargs)
+                    else:
+                        response = await self._send_hedged(kwargs, delay)
+                except Exception as e:
+                    if not is_retryable(e):
+                        # The upstream answered, so it counts as healthy for the breaker
+                        self.breaker.record_success()
+                        raise
+                    if attempt >= self.config.max_retries:
+                        self.breaker.record_failure()
+                        raise
+                    metrics.CLIENT_RETRIES.inc(reason=str(getattr(e, "status_code", None) or type(e).__name__))
+                    await asyncio.sleep(backoff_delay(self.config, attempt, e))
+                    attempt += 1
+                    continue
+                self.breaker.record_success()
+                return response
+        finally:
+            if trial:
+                # A cancelled trial (a lost hedge race, a timeout) must not leave the circuit stuck open
+                self.breaker.end_trial()
+
+    async def close(self):
+        await self.client.close()
+
+
+# One breaker and latency history per process, shared by the sync client and
+# the per-event-loop async clients so they all see the same upstream health
+_shared = {}
+_shared_lock = threading.Lock()
+
+
+def _shared_state(config):
+    with _shared_lock:
+        if not _shared:
+            _shared["breaker"] = CircuitBreaker(config.breaker_failures, config.breaker_reset)
+            _shared["tracker"] = LatencyTracker()
+        return _shared["breaker"], _shared["tracker"]
+
+
+def create_client(base_url=None, api_key=None, config=None):
+    """
+    Build a sync OpenAI client with explicit pool limits, split timeouts and resilience.
+
+    Args:
+        base_url (str, optional): API base URL
+        api_key (str, optional): API key
+        config (ClientConfig, optional): Defaults to ClientConfig.from_env()
+
+    Returns:
+        ResilientClient: Client exposing chat.completions.create
+    """
+    config = config or ClientConfig.from_env()
+    http_client = DefaultHttpxClient(limits=config.limits(), timeout=config.timeout())
+    client = OpenAI(base_url=base_url, api_key=api_key, timeout=config.timeout(), max_retries=0,
+                    http_client=http_client)
+    breaker, tracker = _shared_state(config)
+    return ResilientClient(client, config, breaker=breaker, tracker=tracker)
+
+
+def create_async_client(base_url=None, api_key=None, config=None):
+    """Async version of create_client; create one per event loop"""
+    config = config or ClientConfig.from_env()
+    http_client = DefaultAsyncHttpxClient(limits=config.limits(), timeout=config.timeout())
+    client = AsyncOpenAI(base_url=base_url, api_key=api_key, timeout=config.timeout(), max_retries=0,
+                         http_client=http_client)
+    breaker, tracker = _shared_state(config)
+    return AsyncResilientClient(client, config, breaker=breaker, tracker=tracker)
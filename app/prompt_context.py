@@ -0,0 +1,112 @@
+import math
+import os
+import re
+from typing import NamedTuple
+
+from card_parser import cards_to_csv
+
+# Maximum prompt tokens spent on example cards from the existing deck
+DEFAULT_CONTEXT_TOKENS = int(os.getenv("FLASHCARD_CONTEXT_TOKENS", 1500))
+
+# Greedy diversity selection is O(selected * candidates), so large decks are
+# first thinned to an evenly spaced sample of this many cards
+MAX_CANDIDATES = 500
+
+# Tokens the chat format adds around every message
+MESSAGE_OVERHEAD = 4
+
+_WORDS = re.compile(r"\w+|[^\w\s]")
+
+
+def estimate_tokens(text):
+    """
+    Estimate how many tokens a string costs in the prompt.
+
+    Counts words and punctuation, charging long words one token per four
+    characters. This runs locally on every request, so it never loads a
+    tokenizer that may have to be downloaded first.
+    """
+    if not text:
+        return 0
+    return sum(max(1, math.ceil(len(piece) / 4)) for piece in _WORDS.findall(text))
+
+
+def estimate_message_tokens(messages):
+    """Estimate the prompt tokens of a full chat request"""
+    return sum(estimate_tokens(message["content"]) + MESSAGE_OVERHEAD for message in messages)
+
+
+class PromptContext(NamedTuple):
+    text: str
+    cards: list
+    tokens: int
+
+
+def _normalize(text):
+    return " ".join(_WORDS.findall(str(text).lower()))
+
+
+def _jaccard_distance(a, b):
+    if not a and not b:
+        return 0.0
+    return 1.0 - len(a & b) / len(a | b)
+
+
+def build_context(cards, max_tokens=DEFAULT_CONTEXT_TOKENS):
+    """
+    Pick a representative, deduplicated sample of cards that fits a token budget.
+
+    Cards whose front repeats an earlier card are dropped. The remaining cards
+    are chosen greedily, each time taking the card least similar (by word-set
+    Jaccard distance) to everything already chosen, until the budget is spent.
+
+    Args:
+        cards (list): Existing (front, back) pairs
+        max_tokens (int): Budget for the example cards, including their CSV framing
+
+    Returns:
+        PromptContext: The CSV text to embed, the chosen cards and its token estimate
+    """
+    unique = []
+    seen = set()
+    for card in cards:
+        front, back = str(card[0]).strip(), str(card[1]).strip()
+        key = _normalize(front)
+        if not key or key in seen:
+            continue
+        seen.add(key)
+        unique.append((front, back))
+
+    if len(unique) > MAX_CANDIDATES:
+        step = len(unique) / MAX_CANDIDATES
+        unique = [unique[int(i * step)] for i in range(MAX_CANDIDATES)]
+
+    header_tokens = estimate_tokens("front,back\n")
+    if not unique or max_tokens <= header_tokens:
+        return PromptContext("", [], 0)
+
+    words = [set(_normalize(f"{front} {back}").split()) for front, back in unique]
+    costs = [estimate_tokens(cards_to_csv([card], header=False)) for card in unique]
+
+    chosen = []
+    used = header_tokens
+    # Distance from each candidate to its nearest chosen card
+    nearest = [math.inf] * len(unique)
+    remaining = set(range(len(unique)))
+    cheapest = min(costs)
+    while remaining and used + cheapest <= max_tokens:
+        best = max(remaining, key=lambda i: (nearest[i], -i))
+        remaining.discard(best)
+        if used + costs[best] > max_tokens:
+            continue
+        chosen.append(best)
+        used += costs[best]
+        for i in remaining:
+            nearest[i] = min(nearest[i], _jaccard_distance(words[i], words[best]))
+
+    if not chosen:
+        return PromptContext("", [], 0)
+
+    # Keep the deck's original order in the prompt
+    selected = [unique[i] for i in sorted(chosen)]
+    return PromptContext(cards_to_csv(selected), selected, used)
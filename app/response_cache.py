@@ -0,0 +1,183 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+
+class ResponseCache:
+    """
+    Two-tier cache for chat completion responses.
+
+    A small in-process LRU sits in front of an on-disk SQLite store, so a
+    repeated prompt is answered from memory when possible and from disk after
+    a restart. Entries expire after `ttl` seconds and both tiers are bounded:
+    the memory tier by entry count, the disk tier by total stored bytes.
+    """
+
+    def __init__(self, path=None, max_memory_entries=256, max_disk_bytes=64 * 1024 * 1024,
+                 ttl=7 * 24 * 3600):
+        """
+        Args:
+            path (str, optional): SQLite file for the disk tier. None keeps the cache in memory only.
+            max_memory_entries (int): Maximum number of responses kept in the LRU
+            max_disk_bytes (int): Maximum total size of the responses stored on disk
+            ttl (float): Seconds before an entry is considered stale. None disables expiry.
+        """
+        self.path = path
+        self.max_memory_entries = max_memory_entries
+        self.max_disk_bytes = max_disk_bytes
+        self.ttl = ttl
+        self._memory = OrderedDict()  # key -> (created_at, value)
+        self._lock = threading.Lock()
+        self._conn = None
+        self.hits = 0
+        self.misses = 0
+        self.memory_hits = 0
+        self.disk_hits = 0
+
+    @staticmethod
+    def make_key(messages, model, temperature):
+        """Hash the full request payload that determines a completion"""
+        payload = json.dumps(
+            {"messages": messages, "model": model, "temperature": temperature},
+            sort_keys=True,
+            ensure_ascii=False,
+        )
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def _connect(self):
+        # Opened lazily so importing the generator never touches the disk
+        if self._conn is None:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            self._conn = sqlite3.connect(self.path, check_same_thread=False)
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS responses ("
+                " key TEXT PRIMARY KEY,"
+                " value TEXT NOT NULL,"
+                " size INTEGER NOT NULL,"
+                " created_at REAL NOT NULL,"
+                " accessed_at REAL NOT NULL)"
+            )
+            self._conn.execute(
+                "CREATE INDEX IF NOT EXISTS responses_accessed ON responses (accessed_at)"
+            )
+            self._conn.commit()
+        return self._conn
+
+    def _expired(self, created_at, now):
+        return self.ttl is not None and now - created_at > self.ttl
+
+    def _remember(self, key, created_at, value):
+        self._memory[key] = (created_at, value)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_memory_entries:
+            self._memory.popitem(last=False)
+
+    def get(self, key):
+        """
+        Look up a cached response.
+
+        Returns:
+            str or None: The cached response, or None on a miss or expired entry
+        """
+        now = time.time()
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                if not self._expired(entry[0], now):
+                    self._memory.move_to_end(key)
+                    self.hits += 1
+                    self.memory_hits += 1
+                    return entry[1]
+                del self._memory[key]
+
+            if self.path:
+                conn = self._connect()
+                row = conn.execute(
+                    "SELECT value, created_at FROM responses WHERE key = ?", (key,)
+                ).fetchone()
+                if row is not None:
+                    value, created_at = row
+                    if not self._expired(created_at, now):
+                        conn.execute("UPDATE responses SET accessed_at = ? WHERE key = ?", (now, key))
+                        conn.commit()
+                        self._remember(key, created_at, value)
+                        self.hits += 1
+                        self.disk_hits += 1
+                        return value
+                    conn.execute("DELETE FROM responses WHERE key = ?", (key,))
+                    conn.commit()
+
+            self.misses += 1
+            return None
+
+    def set(self, key, value):
+        """Store a response in both tiers, evicting old entries if needed"""
+        now = time.time()
+        with self._lock:
+            self._remember(key, now, value)
+            if not self.path:
+                return
+            conn = self._connect()
+            conn.execute(
+                "INSERT OR REPLACE INTO responses (key, value, size, created_at, accessed_at)"
+                " VALUES (?, ?, ?, ?, ?)",
+                (key, value, len(value.encode("utf-8")), now, now),
+            )
+            self._evict(conn, now)
+            conn.commit()
+
+    def _evict(self, conn, now):
+        if self.ttl is not None:
+            conn.execute("DELETE FROM responses WHERE created_at < ?", (now - self.ttl,))
+
+        total = conn.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+        if total <= self.max_disk_bytes:
+            return
+
+        # Drop least recently used entries until we are back under the byte budget.
+        # Memory hits do not touch accessed_at on disk, so entries still held in
+        # the LRU are treated as the most recently used.
+        rows = conn.execute("SELECT key, size FROM responses ORDER BY accessed_at").fetchall()
+        rows.sort(key=lambda row: row[0] in self._memory)
+        stale = []
+        for key, size in rows:
+            if total <= self.max_disk_bytes:
+                break
+            stale.append((key,))
+            total -= size
+        conn.executemany("DELETE FROM responses WHERE key = ?", stale)
+        for (key,) in stale:
+            self._memory.pop(key, None)
+
+    def clear(self):
+        """Remove every entry from both tiers and reset the counters"""
+        with self._lock:
+            self._memory.clear()
+            if self.path:
+                conn = self._connect()
+                conn.execute("DELETE FROM responses")
+                conn.commit()
+            self.hits = self.misses = self.memory_hits = self.disk_hits = 0
+
+    def stats(self):
+        """Return the hit/miss counters as a dict"""
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "memory_hits": self.memory_hits,
+                "disk_hits": self.disk_hits,
+                "memory_entries": len(self._memory),
+            }
+
+    def close(self):
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
@@ -0,0 +1,243 @@
+import heapq
+import itertools
+import json
+import os
+import threading
+import time
+from typing import NamedTuple
+
+AGAIN, HARD, GOOD, EASY = "again", "hard", "good", "easy"
+GRADES = (AGAIN, HARD, GOOD, EASY)
+
+DAY = 24 * 3600
+# A card answered "again" comes back within the same session
+RELEARN_DELAY = 10 * 60
+MIN_EASE = 1.3
+START_EASE = 2.5
+
+DEFAULT_REVIEW_LOG = os.getenv("FLASHCARD_REVIEW_LOG", os.path.join("data", "reviews.jsonl"))
+
+
+class CardSchedule(NamedTuple):
+    due: float  # epoch seconds
+    interval: float = 0.0  # days
+    ease: float = START_EASE
+    reps: int = 0  # successful reviews in a row
+    lapses: int = 0
+
+
+class DueCard(NamedTuple):
+    deck: str
+    key: object
+    due: float
+
+
+def review(schedule, grade, now):
+    """
+    Next schedule of a card after a review (SM-2 with Anki-style grades).
+
+    Args:
+        schedule (CardSchedule): Current schedule, or None for a new card
+        grade (str): One of "again", "hard", "good", "easy"
+        now (float): Review time in epoch seconds
+
+    Returns:
+        CardSchedule: The updated schedule
+    """
+    if grade not in GRADES:
+        raise ValueError(f"Unknown grade: {grade!r}")
+    if schedule is None:
+        schedule = CardSchedule(now)
+    interval, ease, reps, lapses = schedule.interval, schedule.ease, schedule.reps, schedule.lapses
+
+    if grade == AGAIN:
+        return CardSchedule(now + RELEARN_DELAY, 0.0, max(MIN_EASE, ease - 0.2), 0, lapses + 1)
+
+    if grade == HARD:
+        interval = max(1.0, interval * 1.2)
+        ease = max(MIN_EASE, ease - 0.15)
+    else:
+        if reps == 0:
+            interval = 1.0
+        elif reps == 1:
+            interval = 6.0
+        else:
+            interval = interval * ease
+        if grade == EASY:
+            interval *= 1.3
+            ease += 0.15
+    return CardSchedule(now + interval * DAY, interval, ease, reps + 1, lapses)
+
+
+class Scheduler:
+    """
+    Spaced-repetition schedules with an append-only review log and due-time heaps.
+
+    Every review appends one JSON line holding the card's new schedule, so
+    rebuilding at startup is a single pass that keeps the last line per card
+    followed by a heapify. Due times are indexed in a min-heap per deck and
+    one across all decks; stale heap entries are skipped lazily, so finding
+    the next due card and recording a review are O(log n) amortized. Once
+    stale entries outnumber live ones the heaps are rebuilt from the
+    schedules, so they stay within twice the number of cards.
+    """
+
+    def __init__(self, log_path=DEFAULT_REVIEW_LOG, clock=time.time):
+        """
+        Args:
+            log_path (str, optional): Review log file; None keeps reviews in memory only
+            clock (callable): Time source in epoch seconds, replaceable in tests
+        """
+        self.log_path = log_path
+        self._clock = clock
+        self._schedules = {}  # deck -> {key: CardSchedule}
+        self._heaps = {}  # deck -> [(due, seq, key)]
+        self._all = []  # [(due, seq, deck, key)]
+        self._live = 0  # cards with a schedule; the heap entries beyond this are stale
+        self._seq = itertools.count()
+        self._lock = threading.RLock()
+        self.rebuild()
+
+    def rebuild(self):
+        """Re-read the review log and rebuild every index"""
+        schedules = {}
+        if self.log_path and os.path.exists(self.log_path):
+            with open(self.log_path, encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                        schedule = CardSchedule(entry["due"], entry["interval"], entry["ease"], entry["reps"],
+                                                entry["lapses"])
+                        schedules.setdefault(entry["deck"], {})[entry["card"]] = schedule
+                    except (ValueError, KeyError, TypeError):
+                        continue  # a line cut short by a crash
+        with self._lock:
+            self._schedules = schedules
+            self._reindex()
+
+    def _reindex(self):
+        # Heaps rebuilt from the schedules alone, without stale entries
+        self._heaps = {}
+        self._all = []
+        for deck in self._schedules:
+            self._all.extend((due, seq, deck, key) for due, seq, key in self._reindex_deck(deck))
+        heapq.heapify(self._all)
+        self._live = len(self._all)
+
+    def _reindex_deck(self, deck):
+        heap = [(schedule.due, next(self._seq), key) for key, schedule in self._schedules[deck].items()]
+        heapq.heapify(heap)
+        self._heaps[deck] = heap
+        return heap
+
+    def __len__(self):
+        with self._lock:
+            return sum(len(cards) for cards in self._schedules.values())
+
+    def schedule(self, deck, key):
+        with self._lock:
+            return self._schedules.get(deck, {}).get(key)
+
+    def _push(self, deck, key, due):
+        seq = next(self._seq)
+        heap = self._heaps.setdefault(deck, [])
+        heapq.heappush(heap, (due, seq, key))
+        heapq.heappush(self._all, (due, seq, deck, key))
+        # Every push after a card's first leaves a stale entry behind; rebuild
+        # once they outnumber the live ones, so memory stays O(cards)
+        if len(self._all) > 2 * self._live:
+            self._reindex()
+        elif len(heap) > 2 * len(self._schedules[deck]):
+            self._reindex_deck(deck)
+
+    def sync_deck(self, deck, keys):
+        """
+        Match a deck's schedules to its current cards.
+
+        New keys are scheduled as due now, in the given order, and schedules
+        of cards no longer in the deck are dropped (their log lines remain).
+        """
+        now = self._clock()
+        with self._lock:
+            cards = self._schedules.setdefault(deck, {})
+            current = set(keys)
+            for key in [key for key in cards if key not in current]:
+                del cards[key]
+                self._live -= 1
+            for key in keys:
+                if key not in cards:
+                    cards[key] = CardSchedule(now)
+                    self._live += 1
+                    self._push(deck, key, now)
+
+    def drop_deck(self, deck):
+        with self._lock:
+            self._live -= len(self._schedules.pop(deck, {}))
+            self._heaps.pop(deck, None)
+
+    def record(self, deck, key, grade):
+        """
+        Apply a review grade, append it to the log and re-index the card.
+
+        Returns:
+            CardSchedule: The card's new schedule
+        """
+        now = self._clock()
+        with self._lock:
+            cards = self._schedules.setdefault(deck, {})
+            if key not in cards:
+                self._live += 1
+            schedule = review(cards.get(key), grade, now)
+            cards[key] = schedule
+            self._push(deck, key, schedule.due)
+            if self.log_path:
+                self._append({"deck": deck, "card": key, "grade": grade, "time": now, **schedule._asdict()})
+        return schedule
+
+    def _append(self, entry):
+        directory = os.path.dirname(self.log_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        line = json.dumps(entry).encode("utf-8") + b"\n"
+        with open(self.log_path, "ab+") as f:
+            # Start on a fresh line if a crash cut the last write short
+            if f.seek(0, os.SEEK_END) > 0:
+                f.seek(-1, os.SEEK_END)
+                if f.read(1) != b"\n":
+                    line = b"\n" + line
+            f.write(line)
+
+    def _valid(self, deck, key, due):
+        schedule = self._schedules.get(deck, {}).get(key)
+        return schedule is not None and schedule.due == due
+
+    def next_due(self, deck=None):
+        """
+        Return the card with the earliest due time, in one deck or across all decks.
+
+        Returns:
+            DueCard: The card and when it is due (possibly in the future), or None if there are no cards
+        """
+        with self._lock:
+            if deck is None:
+                heap = self._all
+                while heap and not self._valid(heap[0][2], heap[0][3], heap[0][0]):
+                    heapq.heappop(heap)
+                return DueCard(heap[0][2], heap[0][3], heap[0][0]) if heap else None
+            heap = self._heaps.get(deck)
+            while heap and not self._valid(deck, heap[0][2], heap[0][0]):
+                heapq.heappop(heap)
+            return DueCard(deck, heap[0][2], heap[0][0]) if heap else None
+
+    def compact(self):
+        """Rewrite the log with only the latest schedule per card, so startup stays fast"""
+        if not self.log_path or not os.path.exists(self.log_path):
+            return
+        with self._lock:
+            tmp_path = f"{self.log_path}.tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                for deck, cards in self._schedules.items():
+                    for key, schedule in cards.items():
+                        if schedule.reps or schedule.lapses:
+                            f.write(json.dumps({"deck": deck, "card": key, **schedule._asdict()}) + "\n")
+            os.replace(tmp_path, self.log_path)
@@ -0,0 +1,279 @@
+import bisect
+import heapq
+import math
+import re
+import threading
+from typing import NamedTuple
+
+_WORDS = re.compile(r"\w+")
+_CLAUSES = re.compile(r'"([^"]*)"|(\S+)')
+
+# BM25 parameters
+K1 = 1.2
+B = 0.75
+# Most terms a prefix query expands to, so "a*" stays cheap on a large corpus
+PREFIX_EXPANSIONS = 200
+
+
+class SearchHit(NamedTuple):
+    deck: str
+    key: object  # storage id of the card, or its row position in CSV storage
+    front: str
+    back: str
+    score: float
+
+
+class _Clause(NamedTuple):
+    terms: tuple
+    prefix: bool = False  # the last term matches any indexed term starting with it
+
+
+def tokenize(text):
+    return _WORDS.findall(str(text).lower())
+
+
+def parse_query(query):
+    """
+    Split a query into clauses that must all match.
+
+    Words match exactly, `word*` matches a prefix, and `"several words"` (or
+    a word that tokenizes into several, like "don't") must appear in order
+    on one side of a card.
+
+    Returns:
+        list: _Clause records
+    """
+    clauses = []
+    for phrase, word in _CLAUSES.findall(query):
+        if phrase:
+            terms = tokenize(phrase)
+            prefix = False
+        else:
+            terms = tokenize(word)
+            prefix = word.endswith("*")
+        if terms:
+            clauses.append(_Clause(tuple(terms), prefix and len(terms) == 1))
+    return clauses
+
+
+def _contains(tokens, terms):
+    n = len(terms)
+    first = terms[0]
+    for start in range(len(tokens) - n + 1):
+        if tokens[start] == first and tokens[start:start + n] == terms:
+            return True
+    return False
+
+
+class SearchIndex:
+    """
+    Inverted index over the front and back of cards in many decks, ranked with BM25.
+
+    Postings map each term to the documents containing it and the term's
+    frequency there, so a query only touches the postings of its own terms;
+    clauses are intersected starting with the rarest. Documents keep their
+    token lists for phrase checks, and a sorted term list answers prefix
+    queries with a binary search. Cards are added, replaced and removed one
+    at a time, so saving a deck never rebuilds the index.
+    """
+
+    def __init__(self):
+        self._docs = {}  # doc id -> (deck, key, front, back, front tokens, back tokens)
+        self._ids = {}  # (deck, key) -> doc id
+        self._decks = {}  # deck -> set of doc ids
+        self._postings = {}  # term -> {doc id: term frequency}
+        self._lengths = {}  # doc id -> number of tokens
+        self._total_length = 0
+        self._next_id = 0
+        # Sorted terms for prefix queries; None after bulk loads until the next prefix query
+        self._sorted_terms = []
+        self._lock = threading.RLock()
+
+    def __len__(self):
+        return len(self._docs)
+
+    def decks(self):
+        with self._lock:
+            return sorted(self._decks)
+
+    def index_deck(self, deck, items):
+        """Replace everything indexed for `deck` with (key, card) pairs"""
+        with self._lock:
+            self._remove_deck(deck)
+            # Many new terms at once: re-sort on the next prefix query instead of inserting each
+            self._sorted_terms = None
+            for key, card in items:
+                self._add(deck, key, card)
+
+    def update_deck(self, deck, upserted=(), deleted=()):
+        """
+        Apply one save of a deck.
+
+        Args:
+            deck (str): Deck name
+            upserted (iterable): (key, card) pairs added or changed
+            deleted (iterable): Keys of removed cards
+        """
+        with self._lock:
+            for key in deleted:
+                self._remove(deck, key)
+            for key, card in upserted:
+                self._remove(deck, key)
+                self._add(deck, key, card)
+
+    def remove_deck(self, deck):
+        with self._lock:
+            self._remove_deck(deck)
+
+    def _remove_deck(self, deck):
+        for doc_id in list(self._decks.get(deck, ())):
+            _, key = self._docs[doc_id][:2]
+            self._remove(deck, key)
+        self._decks.pop(deck, None)
+
+    def _add(self, deck, key, card):
+        front, back = str(card[0]), str(card[1])
+        front_tokens, back_tokens = tuple(tokenize(front)), tuple(tokenize(back))
+        doc_id = self._next_id
+        self._next_id += 1
+        self._docs[doc_id] = (deck, key, front, back, front_tokens, back_tokens)
+        self._ids[(deck, key)] = doc_id
+        self._decks.setdefault(deck, set()).add(doc_id)
+        self._lengths[doc_id] = len(front_tokens) + len(back_tokens)
+        self._total_length += self._lengths[doc_id]
+        for term in front_tokens + back_tokens:
+            postings = self._postings.get(term)
+            if postings is None:
+                postings = self._postings[term] = {}
+                if self._sorted_terms is not None:
+                    bisect.insort(self._sorted_terms, term)
+            postings[doc_id] = postings.get(doc_id, 0) + 1
+
+    def _remove(self, deck, key):
+        doc_id = self._ids.pop((deck, key), None)
+        if doc_id is None:
+            return
+        _, _, _, _, front_tokens, back_tokens = self._docs.pop(doc_id)
+        self._decks[deck].discard(doc_id)
+        self._total_length -= self._lengths.pop(doc_id)
+        for term in set(front_tokens + back_tokens):
+            postings = self._postings[term]
+            del postings[doc_id]
+            if not postings:
+                del self._postings[term]
+                if self._sorted_terms is not None:
+                    del self._sorted_terms[bisect.bisect_left(self._sorted_terms, term)]
+
+    def _prefix_terms(self, prefix):
+        if self._sorted_terms is None:
+            self._sorted_terms = sorted(self._postings)
+        terms = []
+        for i in range(bisect.bisect_left(self._sorted_terms, prefix), len(self._sorted_terms)):
+            term = self._sorted_terms[i]
+            if not term.startswith(prefix) or len(terms) >= PREFIX_EXPANSIONS:
+                break
+            terms.append(term)
+        return terms
+
+    def _clause_postings(self, clause):
+        """Postings a clause can match: one dict per exact term, or per expansion of a prefix"""
+        if clause.prefix:
+            return [self._postings[term] for term in self._prefix_terms(clause.terms[0])]
+        return [self._postings.get(term, {}) for term in clause.terms]
+
+    def search(self, query, limit=20, deck=None):
+        """
+        Find cards matching every clause of a query, best first.
+
+        Args:
+            query (str): Words, `prefix*` and `"exact phrases"`
+            limit (int): Most hits returned
+            deck (str, optional): Only search this deck
+
+        Returns:
+            list: SearchHit records sorted by score
+        """
+        clauses = parse_query(query)
+        if not clauses:
+            return []
+        with self._lock:
+            n_docs = len(self._docs)
+            if not n_docs:
+                return []
+
+            # Each clause becomes a list of (postings, idf): a prefix matches
+            # any of its expansions, a word or phrase needs all of its terms
+            matched = []
+            for clause in clauses:
+                postings = self._clause_postings(clause)
+                if not postings or not all(postings):
+                    return []
+                matched.append((clause, [(term_postings, self._idf(len(term_postings), n_docs))
+                                         for term_postings in postings]))
+            # Start from the clause with the fewest candidates
+            matched.sort(key=lambda entry: sum(len(p) for p, _ in entry[1]) if entry[0].prefix
+                         else min(len(p) for p, _ in entry[1]))
+
+            # Score term at a time: each clause narrows the running scores to the
+            # documents it matches, so later clauses only probe the survivors
+            scores = dict.fromkeys(self._decks.get(deck, ()), 0.0) if deck is not None else None
+            for clause, terms in matched:
+                if clause.prefix:
+                    # Best matching expansion, so "pho*" does not favour cards containing many variants
+                    best = {}
+                    for postings, idf in terms:
+                        for doc_id, score in self._term_scores(scores, postings, idf, n_docs).items():
+                            if score > best.get(doc_id, -1.0):
+                                best[doc_id] = score
+                    scores = best
+                else:
+                    for postings, idf in sorted(terms, key=lambda term: len(term[0])):
+                        scores = self._term_scores(scores, postings, idf, n_docs)
+                    if len(clause.terms) > 1:
+                        scores = {doc_id: score for doc_id, score in scores.items()
+                                  if self._has_phrase(doc_id, clause.terms)}
+                if not scores:
+                    return []
+
+            best = heapq.nlargest(limit, scores.items(), key=lambda item: (item[1], -item[0]))
+            return [SearchHit(*self._docs[doc_id][:4], round(score, 4)) for doc_id, score in best]
+
+    def _term_scores(self, scores, postings, idf, n_docs):
+        """
+        Add one term's BM25 score to the running scores of the documents containing it.
+
+        Args:
+            scores (dict): doc id -> score so far, or None to start from every document with the term
+
+        Returns:
+            dict: doc id -> new score, for documents in both `scores` and `postings`
+        """
+        lengths = self._lengths
+        # BM25 length normalization is norm = c1 + c2 * length
+        c1 = K1 * (1 - B)
+        c2 = K1 * B * n_docs / self._total_length if self._total_length else 0.0
+        weight = idf * (K1 + 1)
+        result = {}
+        if scores is None:
+            for doc_id, frequency in postings.items():
+                result[doc_id] = weight * frequency / (frequency + c1 + c2 * lengths[doc_id])
+        elif len(postings) < len(scores):
+            for doc_id, frequency in postings.items():
+                score = scores.get(doc_id)
+                if score is not None:
+                    result[doc_id] = score + weight * frequency / (frequency + c1 + c2 * lengths[doc_id])
+        else:
+            get = postings.get
+            for doc_id, score in scores.items():
+                frequency = get(doc_id)
+                if frequency:
+                    result[doc_id] = score + weight * frequency / (frequency + c1 + c2 * lengths[doc_id])
+        return result
+
+    def _has_phrase(self, doc_id, terms):
+        front_tokens, back_tokens = self._docs[doc_id][4:]
+        return _contains(front_tokens, terms) or _contains(back_tokens, terms)
+
+    @staticmethod
+    def _idf(document_frequency, n_docs):
+        return math.log(1 + (n_docs - document_frequency + 0.5) / (document_frequency + 0.5))
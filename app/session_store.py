@@ -0,0 +1,105 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import NamedTuple, Optional
+
+# Defaults for the app's study sessions, overridable from the environment
+MAX_SESSIONS = int(os.getenv("FLASHCARD_MAX_SESSIONS", 10000))
+SESSION_IDLE_TIMEOUT = float(os.getenv("FLASHCARD_SESSION_IDLE_TIMEOUT", 2 * 3600))
+
+
+class StudyState(NamedTuple):
+    """Where one browser session is in Study Mode; the deck itself is shared"""
+    deck_name: Optional[str] = None
+    card_index: int = 0
+    showing_front: bool = True
+    deck_token: object = None  # catalog token of the deck when the card was shown
+
+
+class SessionStore:
+    """
+    Per-session state with idle eviction and a bound on the number of sessions.
+
+    Sessions are kept in least-recently-used order, so eviction only ever
+    looks at the oldest entries and every operation is O(1) amortized.
+    """
+
+    def __init__(self, max_sessions=MAX_SESSIONS, idle_timeout=SESSION_IDLE_TIMEOUT, default=StudyState(),
+                 clock=time.monotonic):
+        """
+        Args:
+            max_sessions (int): Most sessions kept; the least recently used are dropped first
+            idle_timeout (float): Seconds after which an untouched session is dropped
+            default: State returned for a session that has none yet
+            clock (callable): Time source, replaceable in tests
+        """
+        self.max_sessions = max_sessions
+        self.idle_timeout = idle_timeout
+        self.default = default
+        self._clock = clock
+        self._sessions = OrderedDict()  # session id -> (last access, state)
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        with self._lock:
+            return len(self._sessions)
+
+    def __contains__(self, session_id):
+        now = self._clock()
+        with self._lock:
+            return self._entry(session_id, now) is not None
+
+    def _entry(self, session_id, now):
+        # A session idle for too long is gone, even if no write has evicted it yet
+        entry = self._sessions.get(session_id)
+        if entry is not None and now - entry[0] >= self.idle_timeout:
+            del self._sessions[session_id]
+            return None
+        return entry
+
+    def get(self, session_id):
+        """Return a session's state, or the default if it has none or it expired, and mark it as used"""
+        now = self._clock()
+        with self._lock:
+            entry = self._entry(session_id, now)
+            if entry is None:
+                return self.default
+            self._sessions[session_id] = (now, entry[1])
+            self._sessions.move_to_end(session_id)
+            return entry[1]
+
+    def set(self, session_id, state):
+        now = self._clock()
+        with self._lock:
+            self._sessions[session_id] = (now, state)
+            self._sessions.move_to_end(session_id)
+            self._evict(now)
+
+    def update(self, session_id, **changes):
+        """Replace some fields of a session's state and return the new state"""
+        now = self._clock()
+        with self._lock:
+            entry = self._entry(session_id, now)
+            state = (entry[1] if entry is not None else self.default)._replace(**changes)
+            self._sessions[session_id] = (now, state)
+            self._sessions.move_to_end(session_id)
+            self._evict(now)
+            return state
+
+    def discard(self, session_id):
+        with self._lock:
+            self._sessions.pop(session_id, None)
+
+    def evict_idle(self):
+        """Drop idle sessions now instead of waiting for the next write"""
+        with self._lock:
+            self._evict(self._clock())
+
+    def _evict(self, now):
+        sessions = self._sessions
+        while sessions:
+            oldest_id, (last_access, _) = next(iter(sessions.items()))
+            if len(sessions) <= self.max_sessions and now - last_access < self.idle_timeout:
+                break
+            del sessions[oldest_id]
@@ -0,0 +1,136 @@
+"""
+Startup benchmark: module import time and time to the first generated card.
+
+Each measurement runs in a fresh interpreter. Import times come from
+`python -X importtime`; the first request goes to the local OpenAI stub, so
+no network access is needed.
+
+    python benchmarks/bench_startup.py [--repeat 5] [--output startup.json]
+    python benchmarks/bench_startup.py --budget flashcard_generator=250 --budget first_request=1500
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+APP_DIR = os.path.abspath(os.path.join(ROOT, 'app'))
+sys.path.insert(0, os.path.abspath(os.path.join(ROOT, 'tests')))
+
+from openai_stub import OpenAIStub  # noqa: E402
+
+MODULES = ["flashcard_generator", "deck_catalog", "batch", "main"]
+
+# Run in the child: import the generator and time one uncached request
+FIRST_REQUEST_SCRIPT = """
+import json, sys, time
+start = time.perf_counter()
+sys.path.insert(0, {app_dir!r})
+import flashcard_generator
+imported = time.perf_counter()
+cards = flashcard_generator.generate_cards("Startup benchmark", use_cache=False)
+done = time.perf_counter()
+print(json.dumps({{"import_ms": (imported - start) * 1000, "request_ms": (done - imported) * 1000,
+                  "cards": len(cards)}}))
+"""
+
+
+def _env(**extra):
+    env = dict(os.environ, OPENAI_API_KEY=os.environ.get("OPENAI_API_KEY", "benchmark"), **extra)
+    env.pop("FLASHCARD_METRICS", None)
+    return env
+
+
+def import_time(module, repeat=5):
+    """
+    Cumulative import time of `module` in a fresh interpreter, best of `repeat`.
+
+    Returns:
+        dict: import_ms and process wall time, or the error if the module cannot be imported
+    """
+    best_import, best_wall = None, None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = subprocess.run(
+            [sys.executable, "-X", "importtime", "-c", f"import sys; sys.path.insert(0, {APP_DIR!r}); import {module}"],
+            capture_output=True, text=True, env=_env(),
+        )
+        wall = time.perf_counter() - start
+        if result.returncode != 0:
+            return {"skipped": result.stderr.strip().splitlines()[-1]}
+        cumulative = None
+        for line in result.stderr.splitlines():
+            # "import time: self [us] | cumulative | imported package", top level has no indent
+            parts = line.split("|")
+            if len(parts) == 3 and parts[2].rstrip() == f" {module}":
+                cumulative = int(parts[1]) / 1000
+        best_import = cumulative if best_import is None else min(best_import, cumulative)
+        best_wall = wall if best_wall is None else min(best_wall, wall)
+    return {"import_ms": round(best_import, 2), "process_ms": round(best_wall * 1000, 2)}
+
+
+def first_request(repeat=5):
+    """Process start to first generated cards against the stub, best of `repeat`"""
+    best = None
+    with OpenAIStub() as stub:
+        for _ in range(repeat):
+            start = time.perf_counter()
+            result = subprocess.run(
+                [sys.executable, "-c", FIRST_REQUEST_SCRIPT.format(app_dir=APP_DIR)],
+                capture_output=True, text=True, env=_env(OPENAI_API_BASE=stub.base_url),
+            )
+            wall = (time.perf_counter() - start) * 1000
+            if result.returncode != 0:
+                return {"error": result.stderr.strip().splitlines()[-1]}
+            child = json.loads(result.stdout.strip().splitlines()[-1])
+            if best is None or wall < best["process_ms"]:
+                best = {"process_ms": round(wall, 2), "import_ms": round(child["import_ms"], 2),
+                        "request_ms": round(child["request_ms"], 2), "cards": child["cards"]}
+    return best
+
+
+def measure(repeat=5, modules=MODULES):
+    results = {module: import_time(module, repeat) for module in modules}
+    results["first_request"] = first_request(repeat)
+    return results
+
+
+def over_budget(results, budgets):
+    """Names of measurements slower than their budget in ms (import_ms, or process_ms for first_request)"""
+    failures = []
+    for name, limit in budgets.items():
+        entry = results.get(name, {})
+        value = entry.get("process_ms" if name == "first_request" else "import_ms")
+        if value is not None and value > limit:
+            failures.append(f"{name}: {value} ms > {limit} ms")
+    return failures
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--output", help="Write the results JSON here (default: stdout)")
+    parser.add_argument("--budget", action="append", default=[], metavar="NAME=MS",
+                        help="Fail if a module's import time (or first_request) exceeds MS")
+    args = parser.parse_args()
+
+    results = measure(args.repeat)
+    text = json.dumps(results, indent=2)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(text + "\n")
+    else:
+        print(text)
+
+    budgets = {name: float(ms) for name, ms in (budget.split("=", 1) for budget in args.budget)}
+    failures = over_budget(results, budgets)
+    for failure in failures:
+        print(f"over budget: {failure}", file=sys.stderr)
+    if failures:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,382 @@
+"""
+Offline benchmark suite: generation against a local OpenAI stub, CSV parsing, deck loading and search.
+
+Every request goes to tests/openai_stub.py, which replays the VCR cassettes
+with configurable latency, jitter, streaming pace and error rate, so no
+network access or API key is needed. Results are written as JSON; pass an
+earlier results file with --compare to print the change per metric.
+
+    python benchmarks/run_benchmarks.py --output results.json
+    python benchmarks/run_benchmarks.py --quick --only parse_csv load_decks
+    python benchmarks/run_benchmarks.py --compare results.json --output new.json
+"""
+import argparse
+import datetime
+import json
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.insert(0, os.path.join(ROOT, 'app'))
+sys.path.insert(0, os.path.join(ROOT, 'tests'))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import flashcard_generator  # noqa: E402
+import bench_startup  # noqa: E402
+from bench_card_parser import legacy_parse, make_completion  # noqa: E402
+from card_parser import cards_to_csv, parse_cards  # noqa: E402
+from deck_catalog import DeckCatalog  # noqa: E402
+from deck_storage import CsvDeckStorage  # noqa: E402
+from flashcard_app import add_ai_cards_to_deck, load_decks  # noqa: E402
+from openai_client import create_async_client, create_client  # noqa: E402
+from openai_stub import OpenAIStub  # noqa: E402
+from response_cache import ResponseCache  # noqa: E402
+from search_index import SearchIndex  # noqa: E402
+
+# Metrics where a lower value is better; everything else is reported as-is
+LOWER_IS_BETTER = ("seconds", "_ms", "p50", "p90", "p99")
+
+
+def percentiles(samples):
+    """p50/p90/p99 of a list of seconds, in milliseconds"""
+    if not samples:
+        return {}
+    ordered = sorted(samples)
+
+    def pick(p):
+        return round(ordered[min(len(ordered) - 1, int(round(p / 100 * (len(ordered) - 1))))] * 1000, 3)
+
+    return {"p50_ms": pick(50), "p90_ms": pick(90), "p99_ms": pick(99)}
+
+
+def best_of(fn, repeat):
+    """Fastest of `repeat` runs, in seconds"""
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+
+def use_stub(stub):
+    """
+    Point the generator's sync and async clients at the stub, with an in-memory cache.
+
+    The clients come from the same factories the app uses, so pool limits,
+    retries, the circuit breaker and hedging (FLASHCARD_OPENAI_* settings)
+    are part of every measurement.
+    """
+    flashcard_generator.client = create_client(base_url=stub.base_url, api_key="benchmark")
+    flashcard_generator.get_async_openai_client = lambda: create_async_client(
+        base_url=stub.base_url, api_key="benchmark")
+    flashcard_generator.response_cache = ResponseCache()
+
+
+def timed_requests(fn, prompts, workers=1):
+    """Call fn on every prompt, returning per-request latencies and the error count"""
+    def one(prompt):
+        start = time.perf_counter()
+        try:
+            fn(prompt)
+        except Exception:
+            return None
+        return time.perf_counter() - start
+
+    start = time.perf_counter()
+    if workers == 1:
+        latencies = [one(prompt) for prompt in prompts]
+    else:
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            latencies = list(pool.map(one, prompts))
+    elapsed = time.perf_counter() - start
+    ok = [latency for latency in latencies if latency is not None]
+    return {
+        "requests": len(prompts),
+        "errors": len(prompts) - len(ok),
+        "seconds": round(elapsed, 4),
+        "requests_per_second": round(len(prompts) / elapsed, 2),
+        **percentiles(ok),
+    }
+
+
+def bench_generate_serial(args, stub):
+    prompts = [f"Serial topic {i}" for i in range(args.requests)]
+    return timed_requests(
+        lambda prompt: flashcard_generator.generate_flashcards(prompt, use_cache=False), prompts)
+
+
+def bench_generate_concurrent(args, stub):
+    results = {}
+    prompts = [f"Threaded topic {i}" for i in range(args.requests * 4)]
+    results["threads"] = timed_requests(
+        lambda prompt: flashcard_generator.generate_flashcards(prompt, use_cache=False),
+        prompts, workers=args.concurrency)
+
+    prompts = [f"Async topic {i}" for i in range(args.requests * 4)]
+    start = time.perf_counter()
+    batch = flashcard_generator.generate_many(prompts, concurrency=args.concurrency, use_cache=False)
+    elapsed = time.perf_counter() - start
+    results["generate_many"] = {
+        "requests": len(prompts),
+        "errors": sum(result.error is not None for result in batch),
+        "seconds": round(elapsed, 4),
+        "requests_per_second": round(len(prompts) / elapsed, 2),
+    }
+    results["concurrency"] = args.concurrency
+    return results
+
+
+def bench_generate_stream(args, stub):
+    first_card, total = [], []
+    errors = 0
+    for i in range(args.requests):
+        start = time.perf_counter()
+        try:
+            for n, _ in enumerate(flashcard_generator.generate_flashcards_stream(
+                    f"Stream topic {i}", use_cache=False)):
+                if n == 0:
+                    first_card.append(time.perf_counter() - start)
+        except Exception:
+            errors += 1
+            continue
+        total.append(time.perf_counter() - start)
+    return {
+        "requests": args.requests,
+        "errors": errors,
+        "first_card": percentiles(first_card),
+        "complete": percentiles(total),
+    }
+
+
+def bench_generate_cached(args, stub):
+    prompt = "Create 3 flashcards about Python"
+    flashcard_generator.generate_flashcards(prompt)
+    before = stub.request_count
+    hits = timed_requests(lambda p: flashcard_generator.generate_flashcards(p), [prompt] * args.requests)
+    hits["requests_sent"] = stub.request_count - before
+    return hits
+
+
+def bench_parse_csv(args, stub):
+    try:
+        # Import pandas up front so the first legacy timing does not include it
+        legacy_parse(make_completion(10))
+        has_pandas = True
+    except ImportError:
+        has_pandas = False
+    results = {}
+    for cards in (1000, 10000):
+        plain = make_completion(cards)
+        markdown = make_completion(cards, markdown=True)
+        results[str(cards)] = {
+            "card_parser_seconds": round(best_of(lambda: parse_cards(plain), args.repeat), 5),
+            "card_parser_markdown_seconds": round(best_of(lambda: parse_cards(markdown), args.repeat), 5),
+            "cards_to_csv_seconds": round(best_of(lambda: cards_to_csv(parse_cards(plain)), args.repeat), 5),
+        }
+        if has_pandas:
+            results[str(cards)]["legacy_pandas_seconds"] = round(best_of(lambda: legacy_parse(plain), args.repeat), 5)
+    return results
+
+
+def synthetic_deck(n_cards, prefix="Card"):
+    return [[f"{prefix} question {i}?", f"{prefix} answer {i}, with some detail"] for i in range(n_cards)]
+
+
+def bench_add_ai_cards(args, stub):
+    results = {}
+    for size in args.deck_sizes:
+        deck = synthetic_deck(size)
+        latencies = []
+        for i in range(args.repeat):
+            start = time.perf_counter()
+            add_ai_cards_to_deck(f"Large deck topic {size} {i}", deck)
+            latencies.append(time.perf_counter() - start)
+        results[str(size)] = {"cards": size, **percentiles(latencies)}
+    return results
+
+
+def write_data_dir(path, n_decks, cards_per_deck):
+    os.makedirs(path, exist_ok=True)
+    for i in range(n_decks):
+        with open(os.path.join(path, f"deck_{i:05d}.csv"), "w", encoding="utf-8", newline="") as f:
+            f.write(cards_to_csv(synthetic_deck(cards_per_deck, prefix=f"Deck {i}")))
+
+
+def bench_load_decks(args, stub):
+    results = {}
+    root = tempfile.mkdtemp(prefix="flashcard-bench-")
+    try:
+        for n_decks in args.deck_counts:
+            data_dir = os.path.join(root, str(n_decks))
+            write_data_dir(data_dir, n_decks, args.cards_per_deck)
+            entry = {"decks": n_decks, "cards_per_deck": args.cards_per_deck}
+            entry["catalog_scan_seconds"] = round(
+                best_of(lambda: DeckCatalog(CsvDeckStorage(data_dir)), args.repeat), 5)
+
+            def load_all():
+                catalog = DeckCatalog(CsvDeckStorage(data_dir), max_bytes=0)
+                for name in catalog.names():
+                    catalog.get(name)
+
+            entry["catalog_load_all_seconds"] = round(best_of(load_all, args.repeat), 5)
+            entry["load_decks_seconds"] = round(best_of(lambda: load_decks(data_dir), args.repeat), 5)
+            results[str(n_decks)] = entry
+    finally:
+        shutil.rmtree(root, ignore_errors=True)
+    return results
+
+
+def bench_search(args, stub):
+    """Build the full-text index over many decks, then time queries and a single-card save"""
+    results = {}
+    for n_cards in args.search_sizes:
+        index = SearchIndex()
+        start = time.perf_counter()
+        for deck in range(n_cards // 1000):
+            index.index_deck(f"deck {deck}", enumerate(synthetic_deck(1000, prefix=f"Deck {deck} topic{deck}")))
+        entry = {"cards": n_cards, "build_seconds": round(time.perf_counter() - start, 3)}
+        index.search("answ*")  # sorts the terms once after the bulk load
+        queries = {"rare_word": "topic7", "two_words": "topic7 question", "prefix": "topic1*",
+                   "phrase": '"answer 17"', "common_word": "question"}
+        for name, query in queries.items():
+            latencies = []
+            for _ in range(max(args.repeat, 5)):
+                start = time.perf_counter()
+                index.search(query)
+                latencies.append(time.perf_counter() - start)
+            entry[name] = percentiles(latencies)
+        start = time.perf_counter()
+        index.update_deck("deck 0", upserted=[(0, ("Edited question", "Edited answer"))], deleted=[1])
+        entry["update_ms"] = round((time.perf_counter() - start) * 1000, 3)
+        results[str(n_cards)] = entry
+    return results
+
+
+def bench_startup_time(args, stub):
+    return bench_startup.measure(repeat=args.repeat)
+
+
+BENCHMARKS = {
+    "generate_serial": bench_generate_serial,
+    "generate_concurrent": bench_generate_concurrent,
+    "generate_stream": bench_generate_stream,
+    "generate_cached": bench_generate_cached,
+    "parse_csv": bench_parse_csv,
+    "add_ai_cards": bench_add_ai_cards,
+    "load_decks": bench_load_decks,
+    "search": bench_search,
+    "startup": bench_startup_time,
+}
+
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def flatten(results, prefix=""):
+    """Flatten nested results into {"bench.sub.metric": value} for comparison"""
+    flat = {}
+    for key, value in results.items():
+        name = f"{prefix}.{key}" if prefix else key
+        if isinstance(value, dict):
+            flat.update(flatten(value, name))
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            flat[name] = value
+    return flat
+
+
+def compare(baseline, current, threshold):
+    """
+    Print the relative change of every timing metric present in both runs.
+
+    Returns:
+        list: Names of metrics that got slower by more than `threshold`
+    """
+    old, new = flatten(baseline["results"]), flatten(current["results"])
+    regressions = []
+    for name in sorted(old.keys() & new.keys()):
+        if not any(marker in name for marker in LOWER_IS_BETTER) or not old[name]:
+            continue
+        change = (new[name] - old[name]) / old[name]
+        flag = ""
+        if change > threshold:
+            flag = "  <-- slower"
+            regressions.append(name)
+        print(f"{name:<60} {old[name]:>12} -> {new[name]:>12} {change:+7.1%}{flag}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--only", nargs="+", choices=sorted(BENCHMARKS), help="Run only these benchmarks")
+    parser.add_argument("--quick", action="store_true", help="Smaller sizes for a fast smoke run")
+    parser.add_argument("--latency", type=float, default=0.05, help="Stub response delay in seconds")
+    parser.add_argument("--jitter", type=float, default=0.02, help="Extra random delay, up to this many seconds")
+    parser.add_argument("--stream-chunk-delay", type=float, default=0.002)
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Fraction of stub requests that fail")
+    parser.add_argument("--requests", type=int, default=20, help="Requests per generation benchmark")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="Write the results JSON here (default: stdout)")
+    parser.add_argument("--compare", help="Earlier results JSON to compare against")
+    parser.add_argument("--threshold", type=float, default=0.10, help="Slowdown reported as a regression")
+    args = parser.parse_args()
+
+    args.deck_sizes = [1000, 10000] if args.quick else [1000, 10000, 50000]
+    args.deck_counts = [10, 100, 1000] if args.quick else [10, 100, 1000, 10000]
+    args.cards_per_deck = 20
+    args.search_sizes = [10000, 50000] if args.quick else [10000, 100000, 300000]
+    if args.quick:
+        args.requests = min(args.requests, 5)
+        args.repeat = 1
+
+    results = {}
+    with OpenAIStub(delay=args.latency, jitter=args.jitter, error_rate=args.error_rate,
+                    stream_chunk_delay=args.stream_chunk_delay, seed=args.seed) as stub:
+        use_stub(stub)
+        for name in args.only or BENCHMARKS:
+            print(f"running {name}...", file=sys.stderr)
+            results[name] = BENCHMARKS[name](args, stub)
+
+    report = {
+        "timestamp": datetime.datetime.now(datetime.timezone.utc).isoformat(timespec="seconds"),
+        "commit": git_commit(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "config": {
+            "latency": args.latency, "jitter": args.jitter, "error_rate": args.error_rate,
+            "stream_chunk_delay": args.stream_chunk_delay, "requests": args.requests,
+            "concurrency": args.concurrency, "repeat": args.repeat, "quick": args.quick,
+        },
+        "results": results,
+    }
+
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(text + "\n")
+    else:
+        print(text)
+
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            regressions = compare(json.load(f), report, args.threshold)
+        if regressions:
+            print(f"{len(regressions)} metrics regressed by more than {args.threshold:.0%}", file=sys.stderr)
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
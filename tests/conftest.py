@@ -0,0 +1,49 @@
+import os
+import sys
+
+# The app modules import each other by bare name (main.py is run as a script
+# from app/), so make that directory importable for the tests as well
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'app')))
+
+import pytest  # noqa: E402
+from openai import AsyncOpenAI, OpenAI  # noqa: E402
+
+import flashcard_generator  # noqa: E402
+from openai_stub import OpenAIStub  # noqa: E402
+from response_cache import ResponseCache  # noqa: E402
+
+
+@pytest.fixture
+def make_stub(monkeypatch):
+    """
+    Start an OpenAIStub with the given options and point the generator at it.
+
+    Both generator clients go to the latest stub without retries, so injected
+    errors reach the code under test, and the response cache starts empty.
+    """
+    servers = []
+
+    def start(**options):
+        server = OpenAIStub(**options).start()
+        servers.append(server)
+        monkeypatch.setattr(flashcard_generator, "client", OpenAI(
+            base_url=server.base_url, api_key="test-key", max_retries=0))
+        monkeypatch.setattr(flashcard_generator, "get_async_openai_client",
+                            lambda: AsyncOpenAI(base_url=server.base_url, api_key="test-key", max_retries=0))
+        monkeypatch.setattr(flashcard_generator, "response_cache", ResponseCache())
+        return server
+
+    yield start
+    for server in servers:
+        server.stop()
+
+
+@pytest.fixture
+def stub_options():
+    """OpenAIStub options of the `stub` fixture; override in a test module, e.g. to set a delay"""
+    return {}
+
+
+@pytest.fixture
+def stub(make_stub, stub_options):
+    return make_stub(**stub_options)
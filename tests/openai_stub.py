@@ -0,0 +1,194 @@
+"""Minimal local stand-in for the chat completions endpoint, used by the tests and benchmarks."""
+import glob
+import hashlib
+import json
+import os
+import random
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import yaml
+
+CASSETTE_DIR = os.path.join(os.path.dirname(__file__), 'fixtures', 'vcr_cassettes')
+
+
+def load_cassette_responses(cassette_dir=CASSETTE_DIR):
+    """Map each recorded user prompt to the completion body recorded for it"""
+    responses = {}
+    for path in sorted(glob.glob(os.path.join(cassette_dir, '*.yaml'))):
+        with open(path) as f:
+            cassette = yaml.safe_load(f)
+        for interaction in cassette['interactions']:
+            request = json.loads(interaction['request']['body'])
+            user_prompt = request['messages'][-1]['content']
+            responses.setdefault(user_prompt, interaction['response']['body']['string'])
+    return responses
+
+
+def completion_body(content):
+    return json.dumps({
+        "id": "chatcmpl-stub",
+        "object": "chat.completion",
+        "created": int(time.time()),
+        "model": "gpt-35-turbo-16k",
+        "choices": [{
+            "index": 0,
+            "finish_reason": "stop",
+            "message": {"role": "assistant", "content": content},
+        }],
+        "usage": {"prompt_tokens": 100, "completion_tokens": 75, "total_tokens": 175},
+    })
+
+
+class OpenAIStub:
+    """
+    Threaded HTTP server answering POST /chat/completions.
+
+    Prompts recorded in the VCR cassettes get their recorded answer, anything
+    else gets a small generated deck, or as many distinct cards as the system
+    prompt asks for (at most `max_cards`, to simulate a short completion). Subtopic planning requests get
+    a numbered list of the number of subtopics asked for. Requests with `stream` set are answered
+    as server-sent events in `stream_chunk_size` character deltas. Prompts containing `fail_marker` get a
+    500 response. The server counts requests and the peak number in flight.
+
+    For benchmarks, each request waits `delay` plus up to `jitter` seconds,
+    streamed chunks are spaced `stream_chunk_delay` apart, and a random
+    `error_rate` fraction of requests fail with a 500.
+
+    `faults` scripts the first requests, one dict per request in arrival
+    order: {"status": 429, "retry_after": "0.1"} answers with that error and
+    header, {"delay": 2.0} stalls before answering normally.
+    """
+
+    def __init__(self, delay=0.0, fail_marker="FAIL", stream_chunk_size=8, jitter=0.0, error_rate=0.0,
+                 stream_chunk_delay=0.0, seed=None, faults=(), max_cards=None):
+        self.delay = delay
+        self.max_cards = max_cards
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.stream_chunk_delay = stream_chunk_delay
+        self._random = random.Random(seed)
+        self.faults = list(faults)
+        self.stream_chunk_size = stream_chunk_size
+        self.fail_marker = fail_marker
+        self.responses = load_cassette_responses()
+        self.request_count = 0
+        self.error_count = 0
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer(('127.0.0.1', 0), self._handler_class())
+        self._server.daemon_threads = True
+        self._thread = None
+
+    @property
+    def base_url(self):
+        host, port = self._server.server_address
+        return f"http://{host}:{port}/v1"
+
+    def _handler_class(self):
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, format, *args):
+                pass
+
+            def do_POST(self):
+                length = int(self.headers.get('content-length', 0))
+                request = json.loads(self.rfile.read(length) or b'{}')
+                status, body, headers = stub.handle(request)
+                if request.get('stream') and status == 200:
+                    self.send_stream(json.loads(body)['choices'][0]['message']['content'])
+                    return
+                payload = body.encode('utf-8')
+                self.send_response(status)
+                for name, value in headers.items():
+                    self.send_header(name, value)
+                self.send_header('content-type', 'application/json')
+                self.send_header('content-length', str(len(payload)))
+                self.end_headers()
+                self.wfile.write(payload)
+
+            def send_stream(self, content):
+                # Server-sent events, one small content delta per event
+                self.send_response(200)
+                self.send_header('content-type', 'text/event-stream')
+                self.end_headers()
+                size = stub.stream_chunk_size
+                for start in range(0, len(content), size):
+                    if start and stub.stream_chunk_delay:
+                        time.sleep(stub.stream_chunk_delay)
+                    chunk = {
+                        "id": "chatcmpl-stub",
+                        "object": "chat.completion.chunk",
+                        "created": int(time.time()),
+                        "model": "gpt-35-turbo-16k",
+                        "choices": [{"index": 0, "finish_reason": None,
+                                     "delta": {"content": content[start:start + size]}}],
+                    }
+                    self.wfile.write(f"data: {json.dumps(chunk)}\n\n".encode('utf-8'))
+                    self.wfile.flush()
+                self.wfile.write(b"data: [DONE]\n\n")
+
+        return Handler
+
+    def handle(self, request):
+        with self._lock:
+            self.request_count += 1
+            self.in_flight += 1
+            self.max_in_flight = max(self.max_in_flight, self.in_flight)
+            delay = self.delay + (self._random.uniform(0, self.jitter) if self.jitter else 0.0)
+            injected_error = bool(self.error_rate) and self._random.random() < self.error_rate
+            fault = self.faults.pop(0) if self.faults else {}
+        try:
+            delay += fault.get("delay", 0.0)
+            if delay:
+                time.sleep(delay)
+            if "status" in fault:
+                with self._lock:
+                    self.error_count += 1
+                headers = {"retry-after": fault["retry_after"]} if "retry_after" in fault else {}
+                body = json.dumps({"error": {"message": "injected fault", "type": "server_error"}})
+                return fault["status"], body, headers
+            user_prompt = request['messages'][-1]['content']
+            planned = re.search(r"into exactly (\d+) distinct, non-overlapping subtopics",
+                                request['messages'][0]['content'])
+            if planned is not None:
+                lines = [f"{i}. Subtopic {i} of {user_prompt}" for i in range(1, int(planned.group(1)) + 1)]
+                return 200, completion_body("\n".join(lines)), {}
+            if injected_error or (self.fail_marker and self.fail_marker in user_prompt):
+                with self._lock:
+                    self.error_count += 1
+                return 500, json.dumps({"error": {"message": "stub failure", "type": "server_error"}}), {}
+            if user_prompt in self.responses:
+                return 200, self.responses[user_prompt], {}
+            topic = user_prompt.rsplit('\n', 1)[-1]
+            requested = re.search(r"Generate exactly (\d+) cards for this request", request['messages'][0]['content'])
+            if requested is None:
+                rows = [f"Question {i} about {topic}?,Answer {i} about {topic}" for i in range(1, 4)]
+            else:
+                # Unrelated text per card, so cards from different requests are not near-duplicates
+                n_cards = min(int(requested.group(1)), self.max_cards or float("inf"))
+                digests = [hashlib.sha1(f"{user_prompt}|{i}".encode()).hexdigest() for i in range(n_cards)]
+                rows = [f"What does {d[:20]} mean?,It means {d[20:]}" for d in digests]
+            return 200, completion_body("front,back\n" + "\n".join(rows)), {}
+        finally:
+            with self._lock:
+                self.in_flight -= 1
+
+    def start(self):
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
@@ -0,0 +1,112 @@
+import json
+
+import pytest
+
+from batch import Checkpoint, LatencyReservoir, run_batch
+from deck_storage import SqliteDeckStorage
+
+
+@pytest.fixture
+def stub_options():
+    return {"delay": 0.02}
+
+
+@pytest.fixture
+def storage(tmp_path):
+    storage = SqliteDeckStorage(str(tmp_path / "decks.sqlite"))
+    yield storage
+    storage.close()
+
+
+def write_manifest(path, entries):
+    with open(path, "w", encoding="utf-8") as f:
+        for entry in entries:
+            f.write((json.dumps(entry) if entry is not None else "") + "\n")
+    return str(path)
+
+
+@pytest.mark.parametrize("mode", ["thread", "async"])
+def test_run_batch_writes_decks_and_reports(stub, storage, tmp_path, mode):
+    """Test that every manifest item lands in its deck and is counted in the report"""
+    manifest = write_manifest(tmp_path / "manifest.jsonl", [
+        {"deck": "chemistry", "prompt": "Topic 1", "count": 3},
+        None,
+        {"deck": "chemistry", "prompt": "Topic 2"},
+        {"deck": "biology", "prompt": "Topic 3"},
+    ])
+
+    summary = run_batch(manifest, storage, workers=2, mode=mode)
+
+    assert summary["completed"] == 3 and summary["failed"] == 0
+    assert summary["cards"] == 9
+    assert summary["prompt_tokens"] == 300 and summary["completion_tokens"] == 225
+    assert summary["latency_p50"] > 0
+    assert storage.card_count("chemistry") == 6
+    assert storage.card_count("biology") == 3
+    assert stub.max_in_flight <= 2
+
+
+def test_run_batch_resumes_from_checkpoint(stub, storage, tmp_path):
+    """Test that a second run only requests the items the first one did not finish"""
+    manifest = write_manifest(tmp_path / "manifest.jsonl", [
+        {"deck": "deck", "prompt": f"Topic {i}"} for i in range(6)
+    ])
+    checkpoint = Checkpoint(f"{manifest}.checkpoint", manifest)
+    # Pretend a killed run finished lines 1, 2 and 4
+    for line in (1, 2, 4):
+        checkpoint.mark(line)
+
+    summary = run_batch(manifest, storage, workers=3)
+
+    assert summary["completed"] == 3 and summary["skipped"] == 3
+    assert stub.request_count == 3
+    assert Checkpoint(f"{manifest}.checkpoint", manifest).next_line == 7
+
+    summary = run_batch(manifest, storage, workers=3)
+    assert summary["completed"] == 0 and stub.request_count == 3
+
+
+def test_run_batch_records_failures_and_moves_on(stub, storage, tmp_path):
+    """Test that failed and malformed items are logged and checkpointed without stopping the run"""
+    manifest = tmp_path / "manifest.jsonl"
+    manifest.write_text(
+        json.dumps({"deck": "deck", "prompt": "FAIL please"}) + "\n"
+        + "not json\n"
+        + json.dumps({"deck": "deck", "prompt": "Topic"}) + "\n"
+    )
+    errors = tmp_path / "errors.jsonl"
+
+    summary = run_batch(str(manifest), storage, errors_path=str(errors))
+
+    assert summary["completed"] == 1 and summary["failed"] == 2
+    assert [json.loads(line)["line"] for line in errors.read_text().splitlines()] == [2, 1]
+    assert Checkpoint(f"{manifest}.checkpoint", str(manifest)).next_line == 4
+
+
+@pytest.mark.parametrize("mode", ["thread", "async"])
+def test_workers_bound_fan_out_sub_requests(stub, storage, tmp_path, mode):
+    """Test that --workers caps upstream requests even when every item fans out"""
+    manifest = write_manifest(tmp_path / "manifest.jsonl",
+                              [{"deck": f"deck{i}", "prompt": f"Topic {i}", "count": 60} for i in range(4)])
+    summary = run_batch(manifest, storage, workers=2, mode=mode)
+
+    assert summary["completed"] == 4 and summary["cards"] == 240
+    assert stub.request_count == 16
+    assert stub.max_in_flight <= 2
+
+
+def test_checkpoint_keeps_only_out_of_order_lines(tmp_path):
+    checkpoint = Checkpoint(str(tmp_path / "cp"), "manifest.jsonl")
+    for line in (3, 1, 5):
+        checkpoint.mark(line)
+    assert checkpoint.next_line == 2 and checkpoint.done == {3, 5}
+    checkpoint.mark(2)
+    assert checkpoint.next_line == 4 and checkpoint.done == {5}
+
+
+def test_latency_reservoir_is_bounded():
+    reservoir = LatencyReservoir(size=100)
+    for i in range(10000):
+        reservoir.add(i / 10000)
+    assert len(reservoir.samples) == 100
+    assert 0.3 < reservoir.percentile(50) < 0.7
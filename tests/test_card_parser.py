@@ -0,0 +1,56 @@
+from card_parser import Card, CardStreamParser, cards_to_csv, parse_cards
+
+
+def feed_in_chunks(text, size):
+    parser = CardStreamParser()
+    cards = []
+    for start in range(0, len(text), size):
+        cards.extend(parser.feed(text[start:start + size]))
+    cards.extend(parser.close())
+    return cards
+
+
+def test_stream_parser_yields_cards_as_lines_complete():
+    """Test that a card is returned as soon as its line ends"""
+    parser = CardStreamParser()
+    assert parser.feed("front,back\nWhat is Python?,A lang") == []
+    assert parser.feed("uage\nWhat") == [Card("What is Python?", "A language")]
+    assert parser.close() == []  # "What" has no back side
+
+
+def test_stream_parser_handles_quotes_across_chunks():
+    """Test that quoted fields with newlines are not split at chunk boundaries"""
+    text = 'front,back\n"Line one\nline two","A, B"\nQ2,A2'
+    for size in (1, 3, 7, len(text)):
+        assert feed_in_chunks(text, size) == [Card("Line one\nline two", "A, B"), Card("Q2", "A2")]
+
+
+def test_parse_cards_keeps_unquoted_commas_in_answer():
+    """Test that an answer containing commas is not truncated"""
+    cards = parse_cards("front,back\nWhat are Python's key features?,Dynamic typing, GC, and a large stdlib")
+    assert cards == [Card("What are Python's key features?", "Dynamic typing, GC, and a large stdlib")]
+
+
+def test_parse_cards_handles_fences_and_multiline_markdown():
+    """Test that code fences are skipped and quoted Markdown cells keep their newlines"""
+    text = (
+        "```csv\n"
+        "front,back\n"
+        '"How do you print in **Python**?","Use `print`:\n\n```python\nprint(""hi"")\n```"\n'
+        "```\n"
+    )
+    assert parse_cards(text) == [
+        Card("How do you print in **Python**?", 'Use `print`:\n\n```python\nprint("hi")\n```'),
+    ]
+
+
+def test_parse_cards_only_skips_a_leading_header():
+    """Test that header detection applies to the first row only"""
+    assert parse_cards("Question,Answer\nfront,back") == [Card("front", "back")]
+    assert parse_cards("Q1,A1\r\nQ2,A2\r\n") == [Card("Q1", "A1"), Card("Q2", "A2")]
+
+
+def test_cards_to_csv_round_trips():
+    """Test that serialized cards parse back to the same records"""
+    cards = [Card("a, b", 'say "hi"'), Card("multi\nline", "x")]
+    assert parse_cards(cards_to_csv(cards)) == cards
@@ -0,0 +1,86 @@
+import html
+import re
+
+import pytest
+
+import card_renderer
+from card_renderer import CardRenderer
+
+
+@pytest.fixture(params=["markdown-it", "basic"])
+def render_markdown(request, monkeypatch):
+    """render_markdown through markdown-it, which the app uses when installed, and through the fallback"""
+    if request.param == "markdown-it":
+        markdown_it = pytest.importorskip("markdown_it")
+        monkeypatch.setattr(card_renderer, "MarkdownIt", markdown_it.MarkdownIt)
+    else:
+        monkeypatch.setattr(card_renderer, "MarkdownIt", None)
+    monkeypatch.setattr(card_renderer, "_markdown", None)
+    return card_renderer.render_markdown
+
+
+def test_render_escapes_html_and_unsafe_links(render_markdown):
+    """Test that cards cannot inject markup or script links"""
+    rendered = render_markdown('Hi <script>alert(1)</script> <img src=x onerror="x()"> [bad](javascript:alert)')
+    assert "<script" not in rendered and "<img" not in rendered
+    assert "&lt;script&gt;" in rendered
+    assert 'href="javascript' not in rendered
+
+
+@pytest.mark.parametrize("url", ["javascript:alert(1)", "JavaScript:alert(1)", "&#106;avascript:alert(1)",
+                                 "data:text/html,x", "vbscript:msgbox"])
+def test_render_refuses_unsafe_link_schemes(render_markdown, url):
+    """Test that links with a script or data scheme, however spelled, are not turned into anchors"""
+    rendered = render_markdown(f"[click]({url})")
+    assert "click" in rendered
+    # What a browser follows is the attribute value with its entities decoded
+    hrefs = [html.unescape(href) for href in re.findall(r'href="([^"]*)"', rendered)]
+    assert not [href for href in hrefs if href.lower().startswith(("javascript:", "data:", "vbscript:"))]
+
+
+def test_render_keeps_safe_links(render_markdown):
+    """Test that http, https, mailto and relative links stay links"""
+    rendered = render_markdown("[a](https://example.com/x?a=1&b=2) [b](mailto:me@example.com) [c](notes/page)")
+    assert 'href="https://example.com/x?a=1&amp;b=2"' in rendered
+    assert 'href="mailto:me@example.com"' in rendered
+    assert 'href="notes/page"' in rendered
+
+
+def test_render_markdown_blocks(render_markdown):
+    """Test that the Markdown the generator asks for becomes HTML"""
+    rendered = render_markdown(
+        "**Big O** of `x < y`\n\n```python\nif a < b:\n    pass\n```\n\n| n | cost |\n|---|---|\n| 1 | O(1) |"
+    )
+    assert "<strong>Big O</strong>" in rendered
+    assert "<code>x &lt; y</code>" in rendered
+    assert "<pre><code" in rendered and "if a &lt; b:" in rendered
+    assert "<table>" in rendered and "<td>O(1)</td>" in rendered
+
+
+def test_renderer_caches_by_content_and_stays_bounded():
+    """Test that each side renders once and old entries are evicted"""
+    calls = []
+    renderer = CardRenderer(max_entries=2, render=lambda text: calls.append(text) or text.upper())
+
+    assert renderer.render("a") == "A"
+    assert renderer.render("a") == "A"
+    assert calls == ["a"] and renderer.hits == 1
+
+    renderer.render("b")
+    renderer.render("c")
+    assert len(renderer) == 2
+    renderer.render("a")
+    assert calls == ["a", "b", "c", "a"]
+
+
+def test_prefetch_renders_in_background():
+    """Test that prefetched sides are served from the cache without rendering again"""
+    calls = []
+    renderer = CardRenderer(render=lambda text: calls.append(text) or f"<p>{text}</p>")
+
+    renderer.prefetch(["front", "back", "front"])
+    renderer.wait()
+    assert sorted(calls) == ["back", "front"]
+
+    assert renderer.render("back") == "<p>back</p>"
+    assert renderer.misses == 0 and len(calls) == 2
@@ -0,0 +1,69 @@
+import os
+
+from card_parser import Card
+from deck_catalog import DeckCatalog
+from deck_storage import CsvDeckStorage
+
+
+def write_deck(data_dir, name, rows, header="front,back"):
+    path = data_dir / f"{name}.csv"
+    path.write_text("\n".join([header] + rows) + "\n", encoding="utf-8")
+    return path
+
+
+def test_listing_does_not_decode_decks(tmp_path):
+    """Test that decks are listed with cheap metadata and decoded only on request"""
+    write_deck(tmp_path, "python", ["Q1,A1", "Q2,A2"])
+    write_deck(tmp_path, "history", ['"Multi\nline",A'])
+    (tmp_path / "notes.txt").write_text("not a deck")
+
+    catalog = DeckCatalog(CsvDeckStorage(tmp_path))
+
+    assert catalog.names() == ["history", "python"]
+    assert catalog.decoded_bytes() == 0
+    assert catalog.card_count("python") == 2
+    assert catalog.card_count("history") == 1
+    assert catalog.decoded_bytes() == 0
+
+    assert catalog.get("python") == (Card("Q1", "A1"), Card("Q2", "A2"))
+    assert catalog.decoded_bytes() > 0
+
+
+def test_decoded_decks_are_bounded_by_bytes(tmp_path):
+    """Test that the least recently used deck is evicted once over budget"""
+    for name in ("a", "b", "c"):
+        write_deck(tmp_path, name, [f"Q{i},A{i}" for i in range(10)])
+    # Each deck is estimated at a little over 2 KB, so two fit in the budget
+    catalog = DeckCatalog(CsvDeckStorage(tmp_path), max_bytes=4500)
+
+    catalog.get("a")
+    catalog.get("b")
+    catalog.get("a")
+    catalog.get("c")
+
+    assert list(catalog._decoded) == ["a", "c"]
+    assert catalog.decoded_bytes() <= 4500
+
+
+def test_changed_file_is_reloaded(tmp_path):
+    """Test that a deck is re-read after its file changes"""
+    path = write_deck(tmp_path, "python", ["Q1,A1"])
+    catalog = DeckCatalog(CsvDeckStorage(tmp_path))
+    assert len(catalog.get("python")) == 1
+
+    write_deck(tmp_path, "python", ["Q1,A1", "Q2,A2"])
+    os.utime(path, ns=(1, 1))
+    catalog.invalidate("python")
+    assert len(catalog.get("python")) == 2
+
+    path.unlink()
+    catalog.refresh()
+    assert "python" not in catalog
+    assert catalog.get("python") is None
+
+
+def test_files_without_front_back_columns_are_not_decks(tmp_path):
+    """Test that CSV files without the expected columns are ignored when decoded"""
+    write_deck(tmp_path, "other", ["1,2"], header="a,b")
+    catalog = DeckCatalog(CsvDeckStorage(tmp_path))
+    assert catalog.get("other") is None
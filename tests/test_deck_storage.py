@@ -0,0 +1,155 @@
+import threading
+
+import pytest
+
+from deck_storage import (CsvDeckStorage, SqliteDeckStorage, diff_rows, export_csv_dir, import_csv_dir,
+                          open_storage)
+
+
+@pytest.fixture(params=["csv", "sqlite"])
+def storage(request, tmp_path):
+    if request.param == "csv":
+        backend = CsvDeckStorage(tmp_path / "data")
+    else:
+        backend = SqliteDeckStorage(tmp_path / "decks.sqlite")
+    yield backend
+    backend.close()
+
+
+def pairs(cards):
+    return [(card.front, card.back) for card in cards]
+
+
+def test_append_update_delete(storage):
+    """Test that per-card writes only touch the cards they name"""
+    storage.create_deck("python")
+    assert storage.load_deck("python") == []
+
+    ids = storage.append_cards("python", [("Q1", "A1"), ("Q2", "A, with comma"), ("Q3", "A3")])
+    assert len(ids) == 3
+    assert storage.card_count("python") == 3
+
+    storage.update_cards("python", {ids[1]: ("Q2", "multi\nline")})
+    storage.delete_cards("python", [ids[0]])
+    assert pairs(storage.load_deck("python")) == [("Q2", "multi\nline"), ("Q3", "A3")]
+
+    storage.append_cards("python", [("Q4", "A4")])
+    assert pairs(storage.load_deck("python"))[-1] == ("Q4", "A4")
+    assert storage.card_count("python") == 3
+
+
+def test_tokens_change_on_write(storage):
+    """Test that scan() and deck_token() move whenever a deck is written"""
+    storage.create_deck("a")
+    before = storage.deck_token("a")
+    storage.append_cards("a", [("Q", "A")] * 50)
+    assert storage.deck_token("a") != before
+    assert set(storage.scan()) == {"a"}
+
+    storage.delete_deck("a")
+    assert storage.deck_token("a") is None
+    assert storage.load_deck("a") is None
+    assert storage.scan() == {}
+
+
+def test_rejects_path_like_deck_names(storage):
+    """Test that every mutator refuses deck names that could escape the data directory"""
+    for write in (storage.create_deck, storage.delete_deck, lambda name: storage.apply_changes(name, [("Q", "A")])):
+        with pytest.raises(ValueError):
+            write("../escape")
+
+
+def test_csv_append_ids_match_loaded_positions(tmp_path):
+    """Test that ids returned by an append are the positions load_deck gives the new cards"""
+    (tmp_path / "messy.csv").write_text("front,back\nQ1,A1\n\nshort row\nQ2,A2\n")
+    storage = CsvDeckStorage(tmp_path)
+    assert storage.card_count("messy") == 2
+
+    ids = storage.apply_changes("messy", appended=[("Q3", "A3")])
+    cards = storage.load_deck("messy")
+    assert [cards[i].front for i in ids] == ["Q3"]
+    assert storage.card_count("messy") == len(cards) == 3
+
+
+def test_sqlite_tokens_are_not_reused_after_delete(tmp_path):
+    """Test that a deck deleted and created again never gets a token the deleted deck had"""
+    storage = SqliteDeckStorage(tmp_path / "decks.sqlite")
+    storage.create_deck("bio")
+    seen = {storage.deck_token("bio")}
+    storage.append_cards("bio", [("Mitochondria", "Powerhouse of the cell")])
+    seen.add(storage.deck_token("bio"))
+
+    storage.delete_deck("bio")
+    storage.create_deck("bio")
+    assert storage.deck_token("bio") not in seen
+    storage.append_cards("bio", [("Photosynthesis", "Light to sugar")])
+    assert storage.deck_token("bio") not in seen
+    storage.close()
+
+    reopened = SqliteDeckStorage(tmp_path / "decks.sqlite")
+    reopened.create_deck("chem")
+    assert reopened.deck_token("chem") not in seen | {reopened.deck_token("bio")}
+    reopened.close()
+
+
+def test_sqlite_concurrent_writers_do_not_lose_cards(tmp_path):
+    """Test that appends from several threads are all kept"""
+    storage = SqliteDeckStorage(tmp_path / "decks.sqlite")
+    storage.create_deck("shared")
+
+    def writer(n):
+        for i in range(25):
+            storage.append_cards("shared", [(f"writer {n} card {i}", "A")])
+
+    threads = [threading.Thread(target=writer, args=(n,)) for n in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert storage.card_count("shared") == 100
+    assert len(storage.load_deck("shared")) == 100
+
+
+def test_diff_rows_patches_one_window_by_id(storage):
+    """Test that editing a page of a large deck only touches the cards on that page"""
+    storage.append_cards("big", [(f"Q{i}", f"A{i}") for i in range(1000)])
+    window = storage.load_deck("big")[500:503]
+    ids = [card.id for card in window]
+    cards = [(card.front, card.back) for card in window]
+
+    # Reorder, edit the middle card, drop the last one, add a row and paste a copy of the first
+    rows = [(ids[1], "Q501", "edited"), (ids[0], "Q500", "A500"), (None, "Q new", "A new"),
+            (ids[0], "Q500", "A500")]
+    appended, updated, deleted = diff_rows(ids, cards, rows)
+    assert appended == [("Q new", "A new"), ("Q500", "A500")]
+    assert updated == {ids[1]: ("Q501", "edited")}
+    assert deleted == [ids[2]]
+
+    storage.apply_changes("big", appended=appended, updated=updated, deleted=deleted)
+    fronts = [card.front for card in storage.load_deck("big")]
+    assert len(fronts) == 1001 and "Q502" not in fronts
+    assert fronts[-2:] == ["Q new", "Q500"]
+    assert storage.load_deck("big")[501].back == "edited"
+
+
+def test_csv_import_export_round_trip(tmp_path):
+    """Test that the one-shot importer and exporter preserve every deck"""
+    source = CsvDeckStorage(tmp_path / "csv")
+    source.append_cards("python", [("What is Python?", "A language, \"dynamic\"")])
+    source.create_deck("empty")
+
+    database = SqliteDeckStorage(tmp_path / "decks.sqlite")
+    assert import_csv_dir(database, tmp_path / "csv") == ["empty", "python"]
+    assert export_csv_dir(database, tmp_path / "out") == ["empty", "python"]
+
+    exported = CsvDeckStorage(tmp_path / "out")
+    assert pairs(exported.load_deck("python")) == [("What is Python?", "A language, \"dynamic\"")]
+    assert exported.load_deck("empty") == []
+
+
+def test_open_storage_imports_existing_csv_decks(tmp_path):
+    """Test that switching to SQLite brings the existing CSV decks along"""
+    (tmp_path / "history.csv").write_text("front,back\nQ,A\n")
+    storage = open_storage("sqlite", data_dir=str(tmp_path))
+    assert pairs(storage.load_deck("history")) == [("Q", "A")]
@@ -0,0 +1,53 @@
+from deck_catalog import DeckCatalog
+from deck_storage import CsvDeckStorage
+from deck_watcher import DeckWatcher
+
+
+def write_deck(data_dir, name, rows):
+    path = data_dir / f"{name}.csv"
+    path.write_text("\n".join(["front,back"] + rows) + "\n", encoding="utf-8")
+    return path
+
+
+def test_poll_reports_only_changed_decks(tmp_path):
+    """Test that a poll re-stats the directory and reports added, changed and removed decks"""
+    write_deck(tmp_path, "keep", ["Q,A"])
+    write_deck(tmp_path, "edit", ["Q,A"])
+    write_deck(tmp_path, "drop", ["Q,A"])
+    catalog = DeckCatalog(CsvDeckStorage(tmp_path))
+    kept = catalog.get("keep")
+    catalog.get("edit")
+    watcher = DeckWatcher(catalog, use_notifications=False)
+    seen = []
+    watcher.subscribe(seen.append)
+
+    write_deck(tmp_path, "edit", ["Q,A", "Q2,A2"])
+    write_deck(tmp_path, "new", ["Q,A"])
+    (tmp_path / "drop.csv").unlink()
+    changes = watcher.poll()
+
+    assert changes.added == ["new"]
+    assert changes.changed == ["edit"]
+    assert changes.removed == ["drop"]
+    assert seen == [changes]
+    # Unchanged decks stay decoded, the edited one is re-read on demand
+    assert catalog.get("keep") is kept
+    assert len(catalog.get("edit")) == 2
+    assert not watcher.poll()
+
+
+def test_file_notification_touches_one_deck(tmp_path):
+    """Test that a notification for one file invalidates just that deck"""
+    write_deck(tmp_path, "a", ["Q,A"])
+    write_deck(tmp_path, "b", ["Q,A"])
+    catalog = DeckCatalog(CsvDeckStorage(tmp_path))
+    version = catalog.version
+    b_cards = catalog.get("b")
+    watcher = DeckWatcher(catalog, use_notifications=False)
+
+    write_deck(tmp_path, "a", ["Q,A", "Q2,A2"])
+    watcher.file_changed(str(tmp_path / "a.csv"))
+
+    assert catalog.version == version + 1
+    assert len(catalog.get("a")) == 2
+    assert catalog.get("b") is b_cards
@@ -0,0 +1,90 @@
+import random
+import string
+
+import dedup_index
+from dedup_index import DedupIndex
+
+
+PYTHON = ("What is Python?", "Python is a high-level programming language known for its simplicity and readability.")
+PARAPHRASE = ("What is Python?", "Python is a high level programming language known for simplicity and readability.")
+UNRELATED = ("Who was the first Roman emperor?", "Augustus became the first Roman emperor in 27 BC.")
+
+
+def test_paraphrased_cards_are_detected():
+    """Test that a reworded card matches the indexed original and an unrelated one does not"""
+    index = DedupIndex()
+    index.add(1, PYTHON)
+
+    matches = index.query(PARAPHRASE)
+    assert matches and matches[0][0] == 1
+    assert matches[0][1] >= 0.7
+    assert index.query(UNRELATED) == []
+
+
+def test_check_splits_new_and_duplicate_cards():
+    """Test that incoming cards are checked against the index and each other"""
+    index = DedupIndex()
+    index.add(1, PYTHON)
+
+    result = index.check([PARAPHRASE, UNRELATED, UNRELATED])
+
+    assert result.accepted == [UNRELATED]
+    assert [duplicate.match for duplicate in result.duplicates] == [1, 1]
+    assert len(index) == 1  # checking does not modify the index
+
+
+def test_incremental_updates():
+    """Test that removed and replaced cards stop matching"""
+    index = DedupIndex()
+    index.add_many([(1, PYTHON), (2, UNRELATED)])
+    index.remove(1)
+    assert index.query(PARAPHRASE) == []
+
+    index.add(2, PYTHON)  # card 2 edited
+    assert index.query(UNRELATED) == []
+    assert index.query(PARAPHRASE)[0][0] == 2
+
+
+def test_bulk_signatures_match_single_signatures():
+    """Test that batching texts does not change their signatures"""
+    index = DedupIndex()
+    texts = ["What is Python?", "", "ab", "Who was Augustus?"] * 100
+    bulk = index.signatures(texts)
+    for i in (0, 1, 2, 3, 399):
+        assert (bulk[i] == index.signatures([texts[i]])[0]).all()
+
+
+def test_signatures_do_not_depend_on_the_slice_size(monkeypatch):
+    """Test that texts split across shingle slices get the same signatures"""
+    index = DedupIndex()
+    texts = ["What is Python?", "", PYTHON[1] * 20, "ab", UNRELATED[1]] * 30
+    expected = index.signatures(texts)
+    monkeypatch.setattr(dedup_index, "BATCH_SHINGLES", 37)
+    assert (index.signatures(texts) == expected).all()
+
+
+def test_empty_cards_are_never_duplicates():
+    """Test that cards without text neither match each other nor get indexed"""
+    index = DedupIndex()
+    index.add_many([(1, ("", "")), (2, PYTHON)])
+    assert len(index) == 1
+    assert index.query((" ", "?!")) == []
+    assert index.check([("", ""), ("", " "), UNRELATED]).duplicates == []
+
+
+def test_large_deck_lookups_only_compare_candidates():
+    """Test that a lookup in a big index touches a small candidate set"""
+    rng = random.Random(0)
+    vocabulary = ["".join(rng.choices(string.ascii_lowercase, k=6)) for _ in range(3000)]
+    cards = [(" ".join(rng.choices(vocabulary, k=6)) + "?", " ".join(rng.choices(vocabulary, k=12)))
+             for _ in range(20000)]
+    index = DedupIndex()
+    index.add_many(enumerate(cards))
+
+    signature = index.signatures([f"{cards[123][0]} {cards[123][1]}"])[0]
+    candidates = set()
+    for band, band_key in zip(index._buckets, index._band_keys(signature)):
+        candidates.update(band.get(band_key, ()))
+    assert 123 in candidates
+    assert len(candidates) < 100
+    assert index.query(cards[123])[0] == (123, 1.0)
@@ -0,0 +1,77 @@
+import asyncio
+import time
+
+import pytest
+
+import flashcard_generator
+from flashcard_generator import complete_deck, complete_deck_async, plan_shards, plan_subtopics
+
+
+def test_plan_shards_splits_evenly():
+    """Test that counts are split into the fewest shards of near-equal size"""
+    assert plan_shards(3, 20) == [3]
+    assert plan_shards(200, 20) == [20] * 10
+    assert plan_shards(45, 20) == [15, 15, 15]
+    assert sum(plan_shards(201, 20)) == 201 and max(plan_shards(201, 20)) <= 20
+
+
+def test_large_count_runs_shards_in_parallel(make_stub):
+    """Test that 200 cards take about as long as one sub-request, with one distinct prompt per shard"""
+    stub = make_stub(delay=0.2)
+    started = time.perf_counter()
+    completion = complete_deck("Cell biology", 200)
+    elapsed = time.perf_counter() - started
+
+    assert len(completion.cards) == 200
+    assert len({card.front for card in completion.cards}) == 200
+    # One planning request, then the 10 shards at once
+    assert stub.request_count == 11 and stub.max_in_flight == 10
+    assert elapsed < 0.2 * 4
+    assert completion.usage["prompt_tokens"] == 1000
+    assert completion.cached is False
+
+
+def test_shards_get_distinct_planned_subtopics(make_stub):
+    """Test that one planning request hands every shard its own subtopic"""
+    make_stub()
+    subtopics = plan_subtopics("Cell biology", 3)
+    assert subtopics == [f"Subtopic {i} of Cell biology" for i in (1, 2, 3)]
+
+    prompts = [prompt for prompt, _, _ in next(flashcard_generator._FanOut("Cell biology", 45, [], 20).rounds())]
+    assert len(set(prompts)) == 3
+    fan_out = flashcard_generator._FanOut("Cell biology", 45, [], 20)
+    fan_out.subtopics = subtopics
+    prompts = [prompt for prompt, _, _ in next(fan_out.rounds())]
+    assert [prompt.rsplit(": ", 1)[1] for prompt in prompts] == subtopics
+
+
+def test_failed_fan_out_is_not_reported_as_cached(make_stub):
+    """Test that a fan-out where every shard fails raises instead of reporting cached cards"""
+    make_stub(error_rate=1.0)
+    with pytest.raises(Exception):
+        complete_deck("Cell biology", 45)
+    fan_out = flashcard_generator._FanOut("Cell biology", 45, [], 20)
+    fan_out.add([flashcard_generator.Completion([], None, False)])
+    assert fan_out.completion().cached is False
+
+
+def test_short_shards_are_topped_up(make_stub):
+    """Test that cards missing from short completions are asked for again"""
+    stub = make_stub(max_cards=15)
+    completion = complete_deck("Cell biology", 60, shard_size=20)
+
+    # A planning request, 3 shards of 15 cards, then 15 missing: one top-up request
+    assert len(completion.cards) == 60
+    assert stub.request_count == 5
+
+
+def test_failed_shards_are_topped_up_and_duplicates_dropped(make_stub):
+    """Test that a failed shard is asked for again and existing cards are not repeated"""
+    # The planning request succeeds, then one of the two shards fails
+    stub = make_stub(faults=[{}, {"status": 500}])
+    existing = [("What does Python mean?", "A programming language")]
+    completion = asyncio.run(complete_deck_async("Python", 40, existing_cards=existing, shard_size=20))
+
+    assert len(completion.cards) == 40
+    assert stub.request_count == 4
+    assert existing[0] not in [tuple(card) for card in completion.cards]
@@ -0,0 +1,220 @@
+import time
+
+import pytest
+
+from deck_storage import CsvDeckStorage, SqliteDeckStorage
+from flashcard_app import FlashcardApp, StalePageError, card_rows, editor_rows
+from job_scheduler import QUEUED, JobScheduler, QueueFullError
+from scheduler import Scheduler
+
+
+@pytest.fixture(params=["csv", "sqlite"])
+def app(request, tmp_path):
+    if request.param == "csv":
+        storage = CsvDeckStorage(tmp_path / "data")
+    else:
+        storage = SqliteDeckStorage(tmp_path / "decks.sqlite")
+    yield FlashcardApp(storage, scheduler=Scheduler(log_path=None))
+    storage.close()
+
+
+@pytest.fixture
+def stub_options():
+    return {"delay": 0.2}
+
+
+def make_deck(app, name, n_cards):
+    app.apply_changes(name, appended=[(f"Question {i}", f"Answer {i}") for i in range(n_cards)])
+
+
+def fronts(app, name):
+    return [card[0] for card in app.get_deck(name)]
+
+
+def test_table_rows_are_normalized():
+    """Test that table input is cleaned up into card rows, with blank rows dropped and blank ids marking new cards"""
+    table = [["Q1", "A1"], ["", "  "], [None, "A2"], ["Q3"]]
+    assert card_rows(table) == [("Q1", "A1"), ("", "A2"), ("Q3", "")]
+    assert editor_rows([[4.0, "Q1", "A1"], ["", "New", None], [7, " ", ""]]) == [(4, "Q1", "A1"), (None, "New", "")]
+
+
+def test_deck_page_reads_one_window(app):
+    """Test that the editor reads one page of a deck, clamped to the pages that exist"""
+    make_deck(app, "big", 25)
+
+    page = app.deck_page("big", 2, page_size=10)
+    assert (page.number, page.pages, page.start, page.total) == (2, 3, 10, 25)
+    assert [card[0] for card in page.cards] == [f"Question {i}" for i in range(10, 20)]
+    assert page.rows()[0] == [page.ids[0], "Question 10", "Answer 10"]
+
+    assert app.deck_page("big", None, page_size=10).number == 3
+    assert app.deck_page("big", 99, page_size=10).cards[-1][0] == "Question 24"
+    assert app.deck_page("missing") is None
+
+
+def test_save_page_patches_only_its_rows(app):
+    """Test that saving a page updates, deletes and appends by card id and leaves other pages alone"""
+    make_deck(app, "big", 25)
+    page = app.deck_page("big", 2, page_size=10)
+    rows = page.rows()
+    rows[0][2] = "Edited"
+    del rows[1]
+    rows.append([None, "New front", "New back"])
+
+    app.save_page("big", page, editor_rows(rows))
+
+    cards = app.get_deck("big")
+    assert len(cards) == 25
+    assert cards[10] == ("Question 10", "Edited")
+    assert "Question 11" not in fronts(app, "big")
+    assert fronts(app, "big")[:10] == [f"Question {i}" for i in range(10)]
+    assert cards[-1] == ("New front", "New back")
+
+
+def test_stale_page_is_rejected_when_ids_are_positions(app):
+    """Test that a page read before the deck changed is only saved when its ids still name the same cards"""
+    make_deck(app, "deck", 5)
+    page = app.deck_page("deck", 1, page_size=2)
+    app.apply_changes("deck", deleted=[page.ids[0]])
+
+    rows = page.rows()
+    rows[1][2] = "Edited"
+    if app.storage.stable_ids:
+        app.save_page("deck", page, editor_rows(rows))
+        assert app.get_deck("deck")[0] == ("Question 1", "Edited")
+    else:
+        # Row 1 is now "Question 2"; saving would edit the wrong card
+        with pytest.raises(StalePageError):
+            app.save_page("deck", page, editor_rows(rows))
+        assert app.get_deck("deck")[:2] == (("Question 1", "Answer 1"), ("Question 2", "Answer 2"))
+
+
+def test_writes_update_the_dedup_and_search_indexes(app):
+    """Test that saved, appended and deleted cards are reflected in the near-duplicate and search indexes"""
+    make_deck(app, "deck", 3)
+    dedup = app.dedup_index("deck")
+    assert app.search("Question 1")[0] == ["deck", "Question 1", "Answer 1"]
+
+    app.append_cards("deck", [("Photosynthesis turns light into sugar", "In chloroplasts")])
+    assert app.dedup_index("deck") is dedup
+    assert dedup.query(("Photosynthesis turns light into sugar", "In chloroplasts"))
+    assert app.search("chloroplasts") == [["deck", "Photosynthesis turns light into sugar", "In chloroplasts"]]
+
+    page = app.deck_page("deck")
+    rows = [row for row in page.rows() if row[1] != "Question 1"]
+    app.save_page("deck", page, editor_rows(rows))
+    assert not app.dedup_index("deck").query(("Question 1", "Answer 1"), threshold=1.0)
+    assert ["deck", "Question 1", "Answer 1"] not in app.search("Question")
+    assert app.search("chloroplasts") == [["deck", "Photosynthesis turns light into sugar", "In chloroplasts"]]
+
+
+def test_deleted_deck_leaves_no_trace(app):
+    """Test that a deck deleted and created again under the same name forgets the deleted cards"""
+    app.append_cards("bio", [("Mitochondria", "Powerhouse of the cell")])
+    assert app.search("mitochondria")
+    assert app.dedup_index("bio").query(("Mitochondria", "Powerhouse of the cell"))
+    app.review_keys("bio")
+
+    app.delete_deck("bio")
+    assert "bio" not in app.get_deck_names()
+    assert app.search("mitochondria") == []
+    assert len(app.scheduler) == 0
+
+    app.append_cards("bio", [("Photosynthesis", "Light to sugar")])
+    assert app.search("mitochondria") == []
+    assert app.search("photosynthesis") == [["bio", "Photosynthesis", "Light to sugar"]]
+    assert not app.dedup_index("bio").query(("Mitochondria", "Powerhouse of the cell"))
+    keys, _ = app.review_keys("bio")
+    assert len(keys) == 1 and len(app.scheduler) == 1
+
+
+def test_review_keys_follow_the_deck(app):
+    """Test that review keys line up with the cards and the scheduler tracks every card"""
+    make_deck(app, "deck", 3)
+    keys, positions = app.review_keys("deck")
+    if app.storage.stable_ids:
+        assert keys == tuple(app.catalog.get_ids("deck"))
+    else:
+        assert keys == ("Question 0", "Question 1", "Question 2")
+    assert [positions[key] for key in keys] == [0, 1, 2]
+    assert len(app.scheduler) == 3
+
+    app.append_cards("deck", [("Question 3", "Answer 3")])
+    keys, _ = app.review_keys("deck")
+    assert len(keys) == 4 and len(app.scheduler) == 4
+
+
+def test_grading_moves_on_to_the_next_due_card(app):
+    """Test that a graded card is rescheduled and the next due card is shown"""
+    make_deck(app, "deck", 3)
+    html, status = app.next_due_card("deck", "s1")
+    assert "Question 0" in html and status.startswith("1/3")
+
+    html, status = app.grade_card("deck", "good", "s1")
+    assert "Question 1" in html and status.startswith("2/3")
+    keys, _ = app.review_keys("deck")
+    assert app.scheduler.schedule("deck", keys[0]).reps == 1
+
+    app.grade_card("deck", "again", "s1")
+    app.grade_card("deck", "easy", "s1")
+    html, status = app.next_due_card("deck", "s1")
+    # "again" brings Question 1 back within minutes, the other cards in days
+    assert "Question 1" in html and status.startswith("2/3 · next due")
+    assert app.scheduler.schedule("deck", keys[1]).lapses == 1
+
+
+def test_grade_is_dropped_when_the_deck_changed(app):
+    """Test that a grade for a card shown before the deck changed is not recorded against another card"""
+    make_deck(app, "deck", 3)
+    app.next_due_card("deck", "s1")
+    first, _ = app.review_keys("deck")
+    app.apply_changes("deck", deleted=[app.catalog.get_ids("deck")[0]])
+
+    app.grade_card("deck", "easy", "s1")
+
+    keys, _ = app.review_keys("deck")
+    assert all(app.scheduler.schedule("deck", key).reps == 0 for key in keys)
+    assert app.scheduler.schedule("deck", first[0]) is None
+
+
+def test_identical_generations_share_one_call(app, stub):
+    """Test that sessions asking for the same cards for the same deck share one upstream call"""
+    app.generation_jobs = JobScheduler(workers=2)
+    make_deck(app, "deck", 2)
+    try:
+        first = app.submit_generation("Photosynthesis", "deck", session_id="s1")
+        assert app.submit_generation(" Photosynthesis ", "deck", session_id="s2") is first
+        assert app.submit_generation("Photosynthesis", None, session_id="s2") is not first
+        first.wait(5)
+        assert len(first.items) == 3
+
+        # Once the deck is saved its cards are different examples, so the same prompt runs again
+        app.append_cards("deck", [("Chlorophyll", "Green pigment")])
+        again = app.submit_generation("Photosynthesis", "deck", session_id="s1")
+        assert again is not first
+        again.wait(5)
+        assert stub.request_count == 3
+    finally:
+        app.generation_jobs.close()
+
+
+def test_generations_are_queued_fairly_per_session(app, stub):
+    """Test that one session's backlog neither runs ahead of another session nor grows past its share"""
+    app.generation_jobs = JobScheduler(workers=1, max_per_user=2)
+    try:
+        busy = app.submit_generation("Busy topic", session_id="s0")
+        deadline = time.monotonic() + 5
+        while busy.status == QUEUED and time.monotonic() < deadline:
+            time.sleep(0.005)
+        first = app.submit_generation("Topic 1", session_id="s1")
+        second = app.submit_generation("Topic 2", session_id="s1")
+        with pytest.raises(QueueFullError):
+            app.submit_generation("Topic 3", session_id="s1")
+        other = app.submit_generation("Topic 4", session_id="s2")
+
+        assert [first.position(), other.position(), second.position()] == [1, 2, 3]
+        for job in (busy, first, other, second):
+            job.wait(5)
+        assert stub.request_count == 4
+    finally:
+        app.generation_jobs.close()
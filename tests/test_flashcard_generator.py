@@ -1,15 +1,14 @@
 import pandas as pd
 from io import StringIO
-import sys
-import os
 import vcr
 import pytest
 from unittest.mock import patch
 
-# Add the app directory to the path so we can import the module
-sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
-
-from app.flashcard_generator import generate_flashcards, get_openai_client
+# conftest puts app/ on the path; import the module by the same bare name the
+# other modules use, so there is one copy with one cache and one client
+import flashcard_generator
+from flashcard_generator import generate_flashcards
+from response_cache import ResponseCache
 
 # Configure VCR
 my_vcr = vcr.VCR(
@@ -24,6 +23,14 @@ my_vcr = vcr.VCR(
     before_record_response=lambda response: response
 )
 
+@pytest.fixture(autouse=True)
+def isolated_response_cache(tmp_path, monkeypatch):
+    """Give every test an empty cache so cassettes are always exercised"""
+    cache = ResponseCache(path=str(tmp_path / "responses.sqlite"))
+    monkeypatch.setattr(flashcard_generator, "response_cache", cache)
+    yield cache
+    cache.close()
+
 @my_vcr.use_cassette('generate_flashcards_basic.yaml')
 def test_generate_flashcards_returns_csv_string():
     """Test that the function returns a string in CSV format"""
@@ -71,4 +78,28 @@ def test_generate_flashcards_no_empty_rows():
     
     # Check for empty values in 'back' column
     empty_backs = df['back'].isna() | (df['back'] == '')
-    assert not any(empty_backs), "Found flashcards with empty back sides" 
\ No newline at end of file
+    assert not any(empty_backs), "Found flashcards with empty back sides"
+
+def test_generate_flashcards_repeat_call_uses_cache(isolated_response_cache):
+    """Test that repeating an identical request is answered without an HTTP call"""
+    with my_vcr.use_cassette('generate_flashcards_basic.yaml', allow_playback_repeats=False) as cassette:
+        first = generate_flashcards("Create 3 flashcards about Python")
+        second = generate_flashcards("Create 3 flashcards about Python")
+
+    assert cassette.play_count == 1, "Expected the repeat call to be served from the cache"
+    assert first == second
+    assert isolated_response_cache.stats()["hits"] == 1
+
+def test_generate_flashcards_sends_budgeted_examples():
+    """Test that existing cards reach the prompt, capped by the context token budget"""
+    existing_cards = [(f"Existing question {i}?", f"Existing answer {i}") for i in range(2000)]
+    completions = flashcard_generator.client.chat.completions
+    with my_vcr.use_cassette('generate_flashcards_basic.yaml'), \
+            patch.object(completions, "create", wraps=completions.create) as create:
+        generate_flashcards("Create 3 flashcards about Python", existing_cards=existing_cards)
+
+    sent = create.call_args.kwargs["messages"]
+    examples = [message["content"] for message in sent if "as an example" in message["content"]]
+    assert len(examples) == 1
+    assert "Existing question" in examples[0]
+    assert examples[0].count("Existing question") < len(existing_cards)
@@ -0,0 +1,79 @@
+import asyncio
+import time
+
+import pytest
+
+import flashcard_generator
+from card_parser import parse_cards
+from flashcard_generator import generate_flashcards_async, generate_many
+
+
+@pytest.fixture
+def stub_options():
+    return {"delay": 0.05}
+
+
+def test_generate_flashcards_async_returns_recorded_cards(stub):
+    """Test that the async generator returns the same CSV shape as the sync one"""
+    result = asyncio.run(generate_flashcards_async("Create 3 flashcards about Python"))
+    assert result.startswith("front,back\n")
+    assert len(parse_cards(result)) == 3
+
+
+def test_generate_many_preserves_order_and_bounds_concurrency(stub):
+    """Test that results come back in input order and never exceed the concurrency limit"""
+    prompts = [f"Topic {i}" for i in range(8)]
+    results = generate_many(prompts, concurrency=3)
+
+    assert [result.prompt for result in results] == prompts
+    for prompt, result in zip(prompts, results):
+        assert result.error is None
+        assert f"about {prompt}" in result.cards_csv
+    assert stub.request_count == 8
+    assert stub.max_in_flight <= 3
+
+
+def test_generate_many_reports_per_item_errors(stub):
+    """Test that one failing prompt does not affect the others"""
+    results = generate_many(["Topic A", "FAIL please", "Topic B"], concurrency=2)
+
+    assert results[0].error is None and results[2].error is None
+    assert results[1].cards_csv is None
+    assert results[1].error is not None
+
+
+def test_generate_many_respects_rate_limit(stub):
+    """Test that the token bucket spaces out request starts beyond the initial burst"""
+    started = time.monotonic()
+    results = generate_many([f"Topic {i}" for i in range(6)], concurrency=2, requests_per_second=10)
+    elapsed = time.monotonic() - started
+
+    assert all(result.error is None for result in results)
+    # Two tokens are available up front, the other four arrive at 10 per second
+    assert elapsed >= 0.35
+
+
+def test_generate_many_limits_fan_out_sub_requests(stub):
+    """Test that sub-requests of large counts share the concurrency and rate limits of the whole batch"""
+    started = time.monotonic()
+    results = generate_many([f"Topic {i}" for i in range(3)], concurrency=3, requests_per_second=20, count=60)
+    elapsed = time.monotonic() - started
+
+    assert all(result.error is None and len(parse_cards(result.cards_csv)) == 60 for result in results)
+    # Per prompt: one planning request, then three shards of 20 cards
+    assert stub.request_count == 12
+    assert stub.max_in_flight <= 3
+    # Three tokens up front, the other nine at 20 per second
+    assert elapsed >= 0.4
+
+
+def test_generate_flashcards_stream_yields_each_card(stub):
+    """Test that streamed cards match the recorded completion"""
+    cards = list(flashcard_generator.generate_flashcards_stream("Create 3 flashcards about Python"))
+
+    assert len(cards) == 3
+    assert cards[0].front == "What is Python?"
+    # The completed stream is cached, so a repeat is served without the server
+    repeat = list(flashcard_generator.generate_flashcards_stream("Create 3 flashcards about Python"))
+    assert repeat == cards
+    assert stub.request_count == 1
@@ -0,0 +1,112 @@
+import threading
+import time
+
+import pytest
+
+from job_scheduler import DONE, QUEUED, RUNNING, JobScheduler, QueueFullError
+
+
+def blocker(gate, publish_items=()):
+    def run(publish):
+        gate.wait(5)
+        for item in publish_items:
+            publish(item)
+        return "done"
+    return run
+
+
+def wait_running(job):
+    deadline = time.monotonic() + 5
+    while job.status != RUNNING and time.monotonic() < deadline:
+        time.sleep(0.005)
+    return job
+
+
+@pytest.fixture
+def scheduler():
+    scheduler = JobScheduler(workers=1, max_queued=8, max_per_user=3)
+    yield scheduler
+    scheduler.close()
+
+
+def test_identical_requests_share_one_call(scheduler):
+    """Test that a second submit with the same key joins the running job and sees every published item"""
+    gate = threading.Event()
+    calls = []
+
+    def run(publish):
+        calls.append(1)
+        gate.wait(5)
+        publish("card 1")
+        publish("card 2")
+        return "result"
+
+    first = scheduler.submit("alice", "python basics", run)
+    second = scheduler.submit("bob", "python basics", run)
+    gate.set()
+
+    assert first is second and first.followers == 2
+    assert first.wait(5) == "result"
+    items = [item for update in second.follow() for item in update.items]
+    assert items == ["card 1", "card 2"]
+    assert calls == [1]
+    # Once finished, the same key runs again
+    assert scheduler.submit("alice", "python basics", lambda publish: "again").wait(5) == "again"
+
+
+def test_users_are_served_in_turn(scheduler):
+    """Test that one user's backlog does not run ahead of another user's first job"""
+    gate = threading.Event()
+    order = []
+    busy = wait_running(scheduler.submit("teacher", "busy", blocker(gate)))
+
+    def record(name):
+        return lambda publish: order.append(name)
+
+    a1 = scheduler.submit("alice", "a1", record("a1"))
+    a2 = scheduler.submit("alice", "a2", record("a2"))
+    b1 = scheduler.submit("bob", "b1", record("b1"))
+
+    assert [a1.position(), b1.position(), a2.position()] == [1, 2, 3]
+    assert a1.status == QUEUED and next(a2.follow()).position == 3
+    gate.set()
+    for job in (busy, a1, a2, b1):
+        job.wait(5)
+    assert order == ["a1", "b1", "a2"]
+    assert a2.status == DONE and a2.position() == 0
+
+
+def test_full_queue_is_rejected_right_away():
+    """Test that submits past the queue or per-user limit fail at once instead of waiting"""
+    scheduler = JobScheduler(workers=1, max_queued=2, max_per_user=2)
+    gate = threading.Event()
+    try:
+        wait_running(scheduler.submit("alice", "running", blocker(gate)))
+        scheduler.submit("alice", "queued", blocker(gate))
+        with pytest.raises(QueueFullError):
+            scheduler.submit("alice", "one too many", blocker(gate))
+        scheduler.submit("bob", "queued too", blocker(gate))
+        with pytest.raises(QueueFullError):
+            scheduler.submit("carol", "queue is full", blocker(gate))
+        # Joining an existing job never counts against the limits
+        assert scheduler.submit("carol", "queued", blocker(gate)).followers == 2
+        assert scheduler.stats() == {"queued": 2, "running": 1, "users": 2}
+    finally:
+        gate.set()
+        scheduler.close()
+
+
+def test_failures_reach_every_follower(scheduler):
+    """Test that a failed job raises its error for every request that joined it"""
+    def run(publish):
+        publish("partial")
+        raise RuntimeError("upstream down")
+
+    job = scheduler.submit("alice", "broken", run)
+    updates = []
+    with pytest.raises(RuntimeError, match="upstream down"):
+        for update in job.follow(poll_interval=0.05):
+            updates.append(update)
+    assert [item for update in updates for item in update.items] == ["partial"]
+    with pytest.raises(RuntimeError):
+        job.wait(5)
@@ -0,0 +1,83 @@
+import json
+import logging
+
+import pytest
+
+import flashcard_generator
+import metrics
+
+
+@pytest.fixture
+def enabled_metrics():
+    metrics.reset()
+    metrics.enable(True)
+    yield
+    metrics.enable(False)
+    metrics.reset()
+
+
+def test_disabled_metrics_record_nothing():
+    metrics.reset()
+    metrics.enable(False)
+    with metrics.GENERATE_SECONDS.time(mode="sync", cache="miss"):
+        pass
+    metrics.TOKENS.inc(10, kind="prompt")
+    assert metrics.GENERATE_SECONDS.count(mode="sync", cache="miss") == 0
+    assert metrics.TOKENS.value(kind="prompt") == 0
+
+
+def test_render_prometheus_text(enabled_metrics):
+    histogram = metrics.Histogram("test_seconds", "Test histogram", buckets=(0.1, 1.0))
+    histogram.observe(0.05, op="a")
+    histogram.observe(0.5, op="a")
+    counter = metrics.Counter("test_total", "Test counter")
+    counter.inc(3, kind='quote"d')
+
+    lines = histogram.render() + counter.render()
+
+    assert "# TYPE test_seconds histogram" in lines
+    assert 'test_seconds_bucket{op="a",le="0.1"} 1' in lines
+    assert 'test_seconds_bucket{op="a",le="1.0"} 2' in lines
+    assert 'test_seconds_bucket{op="a",le="+Inf"} 2' in lines
+    assert 'test_seconds_count{op="a"} 2' in lines
+    assert 'test_total{kind="quote\\"d"} 3' in lines
+
+
+def test_instrument_handler_times_generators_and_counts_errors(enabled_metrics):
+    def stream(n):
+        yield from range(n)
+
+    def broken():
+        raise RuntimeError("boom")
+
+    assert list(metrics.instrument_handler("stream", stream)(3)) == [0, 1, 2]
+    with pytest.raises(RuntimeError):
+        metrics.instrument_handler("broken", broken)()
+
+    assert metrics.HANDLER_SECONDS.count(handler="stream") == 1
+    assert metrics.HANDLER_SECONDS.count(handler="broken", outcome="error") == 1
+    assert metrics.HANDLER_ERRORS.value(handler="broken") == 1
+
+
+def test_generation_records_latency_and_token_usage(enabled_metrics, stub):
+    flashcard_generator.generate_flashcards("Topic")
+    flashcard_generator.generate_flashcards("Topic")
+
+    assert metrics.GENERATE_SECONDS.count(mode="sync", cache="miss") == 1
+    assert metrics.GENERATE_SECONDS.count(mode="sync", cache="hit") == 1
+    assert metrics.UPSTREAM_SECONDS.count(mode="sync") == 1
+    assert metrics.TOKENS.value(kind="prompt") == 100
+    assert metrics.TOKENS.value(kind="completion") == 75
+    assert metrics.CARDS_GENERATED.value() == 6
+    # The local estimate of each prompt is recorded before the cache lookup
+    assert metrics.PROMPT_TOKENS.count(part="total") == 2
+    assert "flashcards_tokens_total{kind=\"prompt\"} 100" in metrics.render()
+
+
+def test_json_formatter_includes_extra_fields():
+    record = logging.LogRecord("flashcards", logging.INFO, __file__, 1, "took %s", ("1s",), None)
+    record.metric = "flashcards_generate_seconds"
+    entry = json.loads(metrics.JsonFormatter().format(record))
+    assert entry["message"] == "took 1s"
+    assert entry["metric"] == "flashcards_generate_seconds"
+    assert entry["level"] == "INFO"
@@ -0,0 +1,157 @@
+import asyncio
+import time
+
+import pytest
+from openai import APIStatusError
+
+from openai_client import (
+    CircuitBreaker,
+    CircuitOpenError,
+    ClientConfig,
+    LatencyTracker,
+    create_async_client,
+    create_client,
+)
+from openai_stub import OpenAIStub
+
+MESSAGES = [{"role": "user", "content": "Topic"}]
+
+# Fast backoff so the tests do not sleep for long
+CONFIG = ClientConfig(backoff_base=0.01, backoff_max=0.05, read_timeout=5.0)
+
+
+def make_client(server, config=CONFIG, **state):
+    client = create_client(base_url=server.base_url, api_key="test-key", config=config)
+    client.breaker = state.get("breaker", CircuitBreaker(config.breaker_failures, config.breaker_reset))
+    client.tracker = state.get("tracker", LatencyTracker())
+    return client
+
+
+def complete(client):
+    return client.chat.completions.create(model="m", messages=MESSAGES)
+
+
+def test_retries_on_429_and_5xx_honoring_retry_after():
+    """Test that transient errors are retried and Retry-After sets the wait"""
+    faults = [{"status": 429, "retry_after": "0.3"}, {"status": 503}]
+    with OpenAIStub(faults=faults) as server:
+        client = make_client(server)
+        start = time.perf_counter()
+        response = complete(client)
+        elapsed = time.perf_counter() - start
+
+    assert response.choices[0].message.content.startswith("front,back")
+    assert server.request_count == 3
+    assert elapsed >= 0.3
+
+
+def test_gives_up_after_max_retries_and_skips_client_errors():
+    """Test that retries stop after max_retries and client errors are not retried"""
+    with OpenAIStub(faults=[{"status": 500}] * 3 + [{"status": 400}]) as server:
+        client = make_client(server, CONFIG._replace(max_retries=2))
+        with pytest.raises(APIStatusError) as error:
+            complete(client)
+        assert error.value.status_code == 500
+        assert server.request_count == 3
+
+        with pytest.raises(APIStatusError) as error:
+            complete(client)
+        assert error.value.status_code == 400
+        assert server.request_count == 4
+
+
+def test_circuit_breaker_fails_fast_then_recovers():
+    """Test that an open circuit rejects requests without calling the API until the reset timeout"""
+    now = [0.0]
+    breaker = CircuitBreaker(failures=2, reset_timeout=10.0, clock=lambda: now[0])
+    with OpenAIStub(faults=[{"status": 503}] * 2) as server:
+        client = make_client(server, CONFIG._replace(max_retries=0), breaker=breaker)
+        for _ in range(2):
+            with pytest.raises(APIStatusError):
+                complete(client)
+        assert breaker.state == "open"
+
+        with pytest.raises(CircuitOpenError):
+            complete(client)
+        assert server.request_count == 2
+
+        now[0] = 10.0
+        assert breaker.state == "half-open"
+        complete(client)
+        assert breaker.state == "closed"
+        assert server.request_count == 3
+
+
+def test_breaker_counts_requests_not_attempts():
+    """Test that one request failing through all its retries counts as a single failure"""
+    breaker = CircuitBreaker(failures=2, reset_timeout=10.0)
+    with OpenAIStub(faults=[{"status": 503}] * 3) as server:
+        client = make_client(server, CONFIG._replace(max_retries=2), breaker=breaker)
+        with pytest.raises(APIStatusError):
+            complete(client)
+        assert server.request_count == 3
+        assert breaker.state == "closed"
+
+
+def test_interrupted_trial_does_not_leave_the_circuit_open():
+    """Test that a half-open trial ended by a BaseException lets the next request try again"""
+    now = [0.0]
+    breaker = CircuitBreaker(failures=1, reset_timeout=10.0, clock=lambda: now[0])
+    breaker.record_failure()
+    now[0] = 10.0
+
+    with OpenAIStub() as server:
+        client = make_client(server, breaker=breaker)
+        send = client._send
+
+        def interrupted(kwargs):
+            raise KeyboardInterrupt
+
+        client._send = interrupted
+        with pytest.raises(KeyboardInterrupt):
+            complete(client)
+
+        client._send = send
+        complete(client)
+        assert breaker.state == "closed"
+
+
+def test_hedged_request_cuts_tail_latency():
+    """Test that a request stalled past the p95 delay is raced by a second copy"""
+    tracker = LatencyTracker()
+    for _ in range(20):
+        tracker.add(0.05)
+    with OpenAIStub(faults=[{"delay": 2.0}]) as server:
+        client = make_client(server, CONFIG._replace(hedge=True), tracker=tracker)
+        start = time.perf_counter()
+        complete(client)
+        elapsed = time.perf_counter() - start
+        client.close()
+
+    assert elapsed < 1.0
+    assert server.request_count == 2
+
+
+def test_async_client_retries_and_hedges():
+    """Test that the async client retries a 429 and then hedges a stalled request"""
+    tracker = LatencyTracker()
+    for _ in range(20):
+        tracker.add(0.05)
+
+    async def run(server):
+        client = create_async_client(base_url=server.base_url, api_key="test-key",
+                                     config=CONFIG._replace(hedge=True))
+        client.breaker = CircuitBreaker()
+        client.tracker = tracker
+        try:
+            start = time.perf_counter()
+            await client.chat.completions.create(model="m", messages=MESSAGES)
+            return time.perf_counter() - start
+        finally:
+            await client.close()
+
+    with OpenAIStub(faults=[{"status": 429, "retry_after": "0"}, {"delay": 2.0}]) as server:
+        elapsed = asyncio.run(run(server))
+
+    assert elapsed < 1.0
+    assert server.request_count == 3
@@ -0,0 +1,30 @@
+from prompt_context import build_context, estimate_tokens
+
+
+def test_context_respects_token_budget():
+    """Test that the selected examples never exceed the budget, however big the deck"""
+    cards = [(f"What is concept {i}?", f"Concept {i} is explained here in a few words.") for i in range(5000)]
+    for budget in (50, 300, 1500):
+        context = build_context(cards, max_tokens=budget)
+        assert 0 < len(context.cards) < len(cards)
+        assert context.tokens <= budget
+        assert estimate_tokens(context.text) <= budget
+
+
+def test_context_drops_duplicates_and_prefers_diverse_cards():
+    """Test that repeated fronts are removed and distinct topics are picked first"""
+    cards = [("What is a list?", "A mutable sequence")] * 20 + [
+        ("What is a list in Python?", "A mutable sequence type"),
+        ("Who was the first Roman emperor?", "Augustus"),
+    ]
+    context = build_context(cards, max_tokens=35)
+
+    fronts = [front for front, _ in context.cards]
+    assert fronts.count("What is a list?") <= 1
+    assert "Who was the first Roman emperor?" in fronts
+
+
+def test_empty_deck_has_no_context():
+    """Test that an empty deck, or one of blank cards, adds no examples to the prompt"""
+    assert build_context([]).cards == []
+    assert build_context([("", "")]).text == ""
@@ -0,0 +1,52 @@
+import time
+
+from response_cache import ResponseCache
+
+MESSAGES = [{"role": "user", "content": "Add flashcards about Python"}]
+
+
+def test_key_depends_on_full_payload():
+    """Test that model, temperature and messages all change the cache key"""
+    key = ResponseCache.make_key(MESSAGES, "gpt-35-turbo-16k", 0.3)
+    assert key == ResponseCache.make_key(list(MESSAGES), "gpt-35-turbo-16k", 0.3)
+    assert key != ResponseCache.make_key(MESSAGES, "gpt-4", 0.3)
+    assert key != ResponseCache.make_key(MESSAGES, "gpt-35-turbo-16k", 0.7)
+    assert key != ResponseCache.make_key([{"role": "user", "content": "Other"}], "gpt-35-turbo-16k", 0.3)
+
+
+def test_disk_tier_survives_new_instance(tmp_path):
+    """Test that responses persist in SQLite across cache instances"""
+    path = str(tmp_path / "cache.sqlite")
+    cache = ResponseCache(path=path)
+    cache.set("k", "front,back\nQ,A")
+    cache.close()
+
+    reopened = ResponseCache(path=path)
+    assert reopened.get("k") == "front,back\nQ,A"
+    assert reopened.stats()["disk_hits"] == 1
+    # Second lookup is served from the in-process LRU
+    assert reopened.get("k") == "front,back\nQ,A"
+    assert reopened.stats()["memory_hits"] == 1
+
+
+def test_expired_entries_are_misses(tmp_path):
+    """Test that entries older than the TTL are not returned"""
+    cache = ResponseCache(path=str(tmp_path / "cache.sqlite"), ttl=0.01)
+    cache.set("k", "value")
+    time.sleep(0.02)
+    assert cache.get("k") is None
+    assert cache.stats()["misses"] == 1
+
+
+def test_size_based_eviction(tmp_path):
+    """Test that both tiers drop least recently used entries when full"""
+    cache = ResponseCache(path=str(tmp_path / "cache.sqlite"), max_memory_entries=2, max_disk_bytes=10)
+    cache.set("a", "aaaa")
+    cache.set("b", "bbbb")
+    cache.get("a")
+    cache.set("c", "cccc")  # 12 bytes on disk, so the least recently used "b" goes
+
+    assert cache.stats()["memory_entries"] == 2
+    assert cache.get("b") is None
+    assert cache.get("a") == "aaaa"
+    assert cache.get("c") == "cccc"
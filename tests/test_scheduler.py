@@ -0,0 +1,120 @@
+import pytest
+
+from scheduler import AGAIN, DAY, EASY, GOOD, HARD, RELEARN_DELAY, Scheduler, review
+
+
+class FakeClock:
+    def __init__(self, now=1_000_000.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+
+def test_review_follows_sm2_intervals():
+    """Test that grades move intervals and ease the way SM-2 does"""
+    now = 0.0
+    first = review(None, GOOD, now)
+    second = review(first, GOOD, now)
+    third = review(second, GOOD, now)
+    assert (first.interval, second.interval) == (1.0, 6.0)
+    assert third.interval == pytest.approx(6.0 * 2.5)
+
+    lapsed = review(third, AGAIN, now)
+    assert lapsed.due == now + RELEARN_DELAY and lapsed.reps == 0 and lapsed.lapses == 1
+    assert lapsed.ease == pytest.approx(2.3)
+
+    assert review(None, EASY, now).interval > review(None, GOOD, now).interval > 0
+    assert review(None, HARD, now).ease < review(None, GOOD, now).ease
+    with pytest.raises(ValueError):
+        review(None, "meh", now)
+
+
+def test_next_due_follows_reviews_per_deck_and_across_decks(tmp_path):
+    """Test that the earliest due card is found in one deck and across decks"""
+    clock = FakeClock()
+    scheduler = Scheduler(str(tmp_path / "reviews.jsonl"), clock=clock)
+    scheduler.sync_deck("python", [1, 2, 3])
+    scheduler.sync_deck("history", ["a"])
+
+    assert scheduler.next_due("python").key == 1
+    scheduler.record("python", 1, GOOD)
+    scheduler.record("python", 2, AGAIN)
+    assert scheduler.next_due("python").key == 3
+    scheduler.record("python", 3, EASY)
+    # Card 2 comes back after the relearning delay, before the others
+    assert scheduler.next_due("python").key == 2
+
+    clock.now += 1
+    scheduler.record("history", "a", GOOD)
+    assert scheduler.next_due().deck == "python" and scheduler.next_due().key == 2
+
+    scheduler.drop_deck("python")
+    assert scheduler.next_due().deck == "history"
+
+
+def test_rebuild_from_log_restores_latest_schedules(tmp_path):
+    """Test that the log replays to the latest schedule per card, torn lines included"""
+    clock = FakeClock()
+    log = str(tmp_path / "reviews.jsonl")
+    scheduler = Scheduler(log, clock=clock)
+    scheduler.sync_deck("deck", list(range(100)))
+    for key in range(100):
+        scheduler.record("deck", key, GOOD if key % 2 else EASY)
+    scheduler.record("deck", 7, AGAIN)
+    with open(log, "a") as f:
+        f.write('{"deck": "deck", "card": 8, "du')  # torn last line
+
+    rebuilt = Scheduler(log, clock=clock)
+
+    assert len(rebuilt) == 100
+    assert rebuilt.schedule("deck", 7) == scheduler.schedule("deck", 7)
+    assert rebuilt.next_due("deck").key == 7
+    assert rebuilt.next_due("deck") == scheduler.next_due("deck")
+
+    rebuilt.compact()
+    with open(log) as f:
+        assert len(f.readlines()) == 100
+    assert Scheduler(log, clock=clock).schedule("deck", 7) == scheduler.schedule("deck", 7)
+
+
+def test_sync_deck_drops_removed_cards(tmp_path):
+    """Test that cards no longer in a deck lose their schedule"""
+    scheduler = Scheduler(None, clock=FakeClock())
+    scheduler.sync_deck("deck", [1, 2])
+    scheduler.record("deck", 1, GOOD)
+    scheduler.sync_deck("deck", [1])
+    assert scheduler.schedule("deck", 2) is None
+    assert scheduler.next_due("deck").key == 1
+    assert scheduler.next_due("deck").due == FakeClock().now + DAY
+
+
+def test_heaps_stay_bounded_under_repeated_reviews():
+    """Test that stale heap entries are dropped once they outnumber the cards"""
+    clock = FakeClock()
+    scheduler = Scheduler(None, clock=clock)
+    scheduler.sync_deck("a", [1, 2, 3])
+    scheduler.sync_deck("b", [4])
+    for i in range(1000):
+        clock.now += 1
+        scheduler.record("a", 1 + i % 3, AGAIN)
+        scheduler.record("b", 4, GOOD)
+        assert len(scheduler._all) <= 2 * len(scheduler)
+        assert len(scheduler._heaps["a"]) <= 2 * 3
+
+    scheduler.drop_deck("b")
+    assert len(scheduler) == 3
+    assert scheduler.next_due().deck == "a"
+    assert scheduler.next_due("a").key == 2
+
+
+def test_append_after_torn_line_starts_a_new_line(tmp_path):
+    """Test that a review written after a crash is not glued onto the torn line"""
+    clock = FakeClock()
+    log = str(tmp_path / "reviews.jsonl")
+    with open(log, "w") as f:
+        f.write('{"deck": "deck", "card": 8, "du')
+
+    Scheduler(log, clock=clock).record("deck", 1, GOOD)
+
+    assert Scheduler(log, clock=clock).schedule("deck", 1).reps == 1
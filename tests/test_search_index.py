@@ -0,0 +1,84 @@
+import time
+
+from search_index import SearchIndex, parse_query
+
+
+BIOLOGY = [
+    (1, ("What is photosynthesis?", "Plants turning light into chemical energy.")),
+    (2, ("What does the cell membrane do?", "It controls what enters and leaves the cell.")),
+    (3, ("Where does photosynthesis happen?", "In the chloroplasts of plant cells, photosynthesis needs light.")),
+]
+HISTORY = [
+    (10, ("Who was the first Roman emperor?", "Augustus, in 27 BC.")),
+    (11, ("When did the Western Roman Empire fall?", "In 476 AD.")),
+]
+
+
+def make_index():
+    index = SearchIndex()
+    index.index_deck("biology", BIOLOGY)
+    index.index_deck("history", HISTORY)
+    return index
+
+
+def keys(hits):
+    return [(hit.deck, hit.key) for hit in hits]
+
+
+def test_words_are_and_ed_and_ranked_by_bm25():
+    """Test that every word must match and the card mentioning the term more often ranks first"""
+    index = make_index()
+    assert keys(index.search("photosynthesis")) == [("biology", 3), ("biology", 1)]
+    assert keys(index.search("photosynthesis light plants")) == [("biology", 1)]
+    assert index.search("photosynthesis augustus") == []
+    assert index.search("   ") == []
+
+
+def test_prefix_and_phrase_queries():
+    """Test that prefix clauses expand to indexed terms and phrases must match in order"""
+    index = make_index()
+    assert set(keys(index.search("photo*"))) == {("biology", 1), ("biology", 3)}
+    assert set(keys(index.search("rom* emp*"))) == {("history", 10), ("history", 11)}
+    assert keys(index.search('"cell membrane"')) == [("biology", 2)]
+    # Both words are in card 3 but not next to each other
+    assert index.search('"plant light"') == []
+    # Phrases do not run from the front of a card into its back
+    assert index.search('"happen in"') == []
+    assert parse_query('don\'t "a b" c*')[0].terms == ("don", "t")
+
+
+def test_incremental_updates_and_deck_filter():
+    index = make_index()
+    index.update_deck("biology", upserted=[(1, ("What is osmosis?", "Water moving across a membrane."))],
+                      deleted=[2])
+    assert keys(index.search("photosynthesis")) == [("biology", 3)]
+    assert keys(index.search("membrane")) == [("biology", 1)]
+    assert index.search("controls") == []
+
+    index.update_deck("history", upserted=[(12, ("What is an osmotic emperor?", "Made up."))])
+    assert keys(index.search("osmo*", deck="history")) == [("history", 12)]
+    assert len(index.search("osmo*")) == 2
+
+    index.remove_deck("history")
+    assert index.decks() == ["biology"]
+    assert index.search("emperor") == [] and index.search("emp*") == []
+    assert len(index) == 2
+
+
+def test_queries_stay_fast_on_a_large_corpus():
+    index = SearchIndex()
+    for deck in range(100):
+        index.index_deck(f"deck {deck}", [
+            (i, (f"Question {i} about topic{deck} term{i % 997}", f"Answer {i} mentions word{i % 4999} here"))
+            for i in range(1000)
+        ])
+    index.search("term1*")  # sorts the terms once after the bulk load
+
+    start = time.perf_counter()
+    hits = index.search('topic42 term7 "mentions word7"')
+    index.update_deck("deck 42", upserted=[(5000, ("New card topic42", "brandnewword"))])
+    assert index.search("brandnew*")[0].key == 5000
+    elapsed = time.perf_counter() - start
+
+    assert [hit.deck for hit in hits] == ["deck 42"] and len(hits) == 1
+    assert elapsed < 0.5
@@ -0,0 +1,59 @@
+from session_store import SessionStore, StudyState
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_sessions_are_independent():
+    """Test that each session keeps its own place in its own deck"""
+    store = SessionStore()
+    store.update("a", deck_name="python", card_index=3)
+    store.update("b", deck_name="history", card_index=1, showing_front=False)
+
+    assert store.get("a") == StudyState("python", 3, True)
+    assert store.get("b") == StudyState("history", 1, False)
+    assert store.get("unknown") == StudyState()
+
+
+def test_idle_sessions_are_evicted():
+    """Test that sessions idle past the timeout are dropped and recent ones kept"""
+    clock = FakeClock()
+    store = SessionStore(idle_timeout=60, clock=clock)
+    store.update("old", card_index=1)
+    clock.now = 30
+    store.update("recent", card_index=2)
+    clock.now = 70
+    store.evict_idle()
+
+    assert "old" not in store
+    assert store.get("recent").card_index == 2
+
+
+def test_least_recently_used_sessions_go_first_over_capacity():
+    """Test that the least recently used session is dropped when the store is full"""
+    store = SessionStore(max_sessions=2)
+    store.update("a", card_index=1)
+    store.update("b", card_index=2)
+    store.get("a")  # touching a session keeps it
+    store.update("c", card_index=3)
+
+    assert len(store) == 2
+    assert "b" not in store
+    assert store.get("a").card_index == 1
+
+
+def test_expired_sessions_are_not_read_back():
+    """Test that a session idle past the timeout reads as new even before anything evicts it"""
+    clock = FakeClock()
+    store = SessionStore(idle_timeout=60, clock=clock)
+    store.update("old", deck_name="python", card_index=4)
+    clock.now = 60
+
+    assert store.get("old") == StudyState()
+    assert "old" not in store
+    assert store.update("old", showing_front=False) == StudyState(showing_front=False)
@@ -0,0 +1,30 @@
+import os
+import subprocess
+import sys
+
+APP_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'app'))
+
+
+def run_python(code):
+    env = dict(os.environ)
+    env.pop("OPENAI_API_KEY", None)
+    result = subprocess.run([sys.executable, "-c", f"import sys; sys.path.insert(0, {APP_DIR!r}); {code}"],
+                            capture_output=True, text=True, env=env)
+    assert result.returncode == 0, result.stderr
+    return result.stdout.strip()
+
+
+def test_importing_the_generator_stays_light():
+    """Test that importing the generator neither builds a client nor loads the openai SDK or pandas"""
+    output = run_python("import flashcard_generator; "
+                        "print('openai' in sys.modules, 'pandas' in sys.modules, "
+                        "'client' in vars(flashcard_generator))")
+    assert output == "False False False"
+
+
+def test_client_is_created_on_first_use_through_the_factory():
+    """Test that both `client` and get_client() build the client on first use through get_openai_client"""
+    output = run_python("import flashcard_generator as fg; "
+                        "fg.get_openai_client = lambda: 'stub client'; "
+                        "print(fg.client, fg.get_client())")
+    assert output == "stub client stub client"